@@ -2,15 +2,11 @@
 """Defines the HBnB console."""
 import cmd
 import re
+from ast import literal_eval
+from itertools import islice
 from shlex import split
 from models import storage
-from models.base_model import BaseModel
-from models.user import User
-from models.state import State
-from models.city import City
-from models.place import Place
-from models.amenity import Amenity
-from models.review import Review
+from models.registry import classes
 
 
 def parse(arg):
@@ -38,15 +34,6 @@ class HBNBCommand(cmd.Cmd):
     """
 
     prompt = "(hbnb) "
-    __classes = {
-        "BaseModel",
-        "User",
-        "State",
-        "City",
-        "Place",
-        "Amenity",
-        "Review"
-    }
 
     def emptyline(self):
         """Do nothing upon receiving an empty line."""
@@ -89,10 +76,10 @@ class HBNBCommand(cmd.Cmd):
         argl = parse(arg)
         if len(argl) == 0:
             print("** class name missing **")
-        elif argl[0] not in HBNBCommand.__classes:
+        elif argl[0] not in classes:
             print("** class doesn't exist **")
         else:
-            print(eval(argl[0])().id)
+            print(classes[argl[0]]().id)
             storage.save()
 
     def do_show(self, arg):
@@ -100,60 +87,87 @@ class HBNBCommand(cmd.Cmd):
         Display the string representation of a class instance of a given id.
         """
         argl = parse(arg)
-        objdict = storage.all()
         if len(argl) == 0:
             print("** class name missing **")
-        elif argl[0] not in HBNBCommand.__classes:
+        elif argl[0] not in classes:
             print("** class doesn't exist **")
         elif len(argl) == 1:
             print("** instance id missing **")
-        elif "{}.{}".format(argl[0], argl[1]) not in objdict:
+        elif storage.get(argl[0], argl[1]) is None:
             print("** no instance found **")
         else:
-            print(objdict["{}.{}".format(argl[0], argl[1])])
+            print(storage.get(argl[0], argl[1]))
 
     def do_destroy(self, arg):
         """Usage: destroy <class> <id> or <class>.destroy(<id>)
         Delete a class instance of a given id."""
         argl = parse(arg)
-        objdict = storage.all()
         if len(argl) == 0:
             print("** class name missing **")
-        elif argl[0] not in HBNBCommand.__classes:
+        elif argl[0] not in classes:
             print("** class doesn't exist **")
         elif len(argl) == 1:
             print("** instance id missing **")
-        elif "{}.{}".format(argl[0], argl[1]) not in objdict.keys():
+        elif storage.get(argl[0], argl[1]) is None:
             print("** no instance found **")
         else:
-            del objdict["{}.{}".format(argl[0], argl[1])]
+            storage.delete(storage.get(argl[0], argl[1]))
             storage.save()
 
     def do_all(self, arg):
         """Usage: all or all <class> or <class>.all()
         Display string representations of all instances of a given class.
-        If no class is specified, displays all instantiated objects."""
+        If no class is specified, displays all instantiated objects.
+        With --limit <n> and --after <cursor>, displays a page of n objects
+        followed by the --after option of the next page, if any.
+        With --stream, displays one object per line as they are read."""
         argl = parse(arg)
-        if len(argl) > 0 and argl[0] not in HBNBCommand.__classes:
+        options = {}
+        args = iter(argl)
+        argl = []
+        for a in args:
+            if a == "--stream":
+                options[a] = True
+            elif a in ["--limit", "--after"]:
+                options[a] = next(args, None)
+            else:
+                argl.append(a)
+        cls = argl[0] if len(argl) > 0 else None
+        limit = options.get("--limit", "20")
+        after = options.get("--after", "")
+        if cls is not None and cls not in classes:
             print("** class doesn't exist **")
+        elif (limit is None or not limit.isascii() or not limit.isdigit() or
+              int(limit) == 0):
+            print("** invalid limit **")
+        elif after is None:
+            print("** cursor missing **")
+        elif "--stream" in options:
+            objs = storage.stream(cls, after or None)
+            if "--limit" in options:
+                objs = islice(objs, int(limit))
+            for obj in objs:
+                print(obj)
+        elif len(options) > 0:
+            objs, cursor = storage.page(cls, int(limit), after or None)
+            print([obj.__str__() for obj in objs])
+            if cursor is not None:
+                print("--after {}".format(cursor))
         else:
             objl = []
-            for obj in storage.all().values():
-                if len(argl) > 0 and argl[0] == obj.__class__.__name__:
-                    objl.append(obj.__str__())
-                elif len(argl) == 0:
-                    objl.append(obj.__str__())
+            if cls is not None:
+                objdict = storage.all(cls)
+            else:
+                objdict = storage.all()
+            for obj in objdict.values():
+                objl.append(obj.__str__())
             print(objl)
 
     def do_count(self, arg):
         """Usage: count <class> or <class>.count()
         Retrieve the number of instances of a given class."""
         argl = parse(arg)
-        count = 0
-        for obj in storage.all().values():
-            if argl[0] == obj.__class__.__name__:
-                count += 1
-        print(count)
+        print(storage.count(argl[0]))
 
     def do_update(self, arg):
         """Usage: update <class> <id> <attribute_name> <attribute_value> or
@@ -162,18 +176,18 @@ class HBNBCommand(cmd.Cmd):
         Update a class instance of a given id by adding or updating
         a given attribute key/value pair or dictionary."""
         argl = parse(arg)
-        objdict = storage.all()
 
         if len(argl) == 0:
             print("** class name missing **")
             return False
-        if argl[0] not in HBNBCommand.__classes:
+        if argl[0] not in classes:
             print("** class doesn't exist **")
             return False
         if len(argl) == 1:
             print("** instance id missing **")
             return False
-        if "{}.{}".format(argl[0], argl[1]) not in objdict.keys():
+        obj = storage.get(argl[0], argl[1])
+        if obj is None:
             print("** no instance found **")
             return False
         if len(argl) == 2:
@@ -181,27 +195,27 @@ class HBNBCommand(cmd.Cmd):
             return False
         if len(argl) == 3:
             try:
-                type(eval(argl[2])) != dict
-            except NameError:
+                attrs = literal_eval(argl[2])
+            except (ValueError, SyntaxError):
+                attrs = None
+            if type(attrs) is not dict:
                 print("** value missing **")
                 return False
 
-        if len(argl) == 4:
-            obj = objdict["{}.{}".format(argl[0], argl[1])]
+        if len(argl) >= 4:
             if argl[2] in obj.__class__.__dict__.keys():
                 valtype = type(obj.__class__.__dict__[argl[2]])
-                obj.__dict__[argl[2]] = valtype(argl[3])
+                setattr(obj, argl[2], valtype(argl[3]))
             else:
-                obj.__dict__[argl[2]] = argl[3]
-        elif type(eval(argl[2])) == dict:
-            obj = objdict["{}.{}".format(argl[0], argl[1])]
-            for k, v in eval(argl[2]).items():
+                setattr(obj, argl[2], argl[3])
+        else:
+            for k, v in attrs.items():
                 if (k in obj.__class__.__dict__.keys() and
                         type(obj.__class__.__dict__[k]) in {str, int, float}):
                     valtype = type(obj.__class__.__dict__[k])
-                    obj.__dict__[k] = valtype(v)
+                    setattr(obj, k, valtype(v))
                 else:
-                    obj.__dict__[k] = v
+                    setattr(obj, k, v)
         storage.save()
 
 
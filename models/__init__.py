@@ -1,7 +1,12 @@
 #!/usr/bin/python3
 """__init__ magic method for models directory"""
-from models.engine.file_storage import FileStorage
+from os import getenv
 
 
-storage = FileStorage()
+if getenv("HBNB_TYPE_STORAGE") == "db":
+    from models.engine.db_storage import DBStorage
+    storage = DBStorage()
+else:
+    from models.engine.file_storage import FileStorage
+    storage = FileStorage()
 storage.reload()
@@ -21,12 +21,20 @@ class BaseModel:
         if len(kwargs) != 0:
             for k, v in kwargs.items():
                 if k == "created_at" or k == "updated_at":
-                    self.__dict__[k] = datetime.strptime(v, tform)
+                    if type(v) is not datetime:
+                        v = datetime.strptime(v, tform)
+                    self.__dict__[k] = v
                 else:
                     self.__dict__[k] = v
         else:
             models.storage.new(self)
 
+    def __setattr__(self, name, value):
+        """Set an attribute and report the change to storage."""
+        models.storage.preserve(self)
+        super().__setattr__(name, value)
+        models.storage.touch(self)
+
     def save(self):
         """Update updated_at with the current datetime."""
         self.updated_at = datetime.today()
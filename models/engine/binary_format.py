@@ -0,0 +1,238 @@
+#!/usr/bin/python3
+"""Defines the binary snapshot format of FileStorage.
+
+A snapshot starts with MAGIC, a version number and one schema table per
+class listing its attribute names. Each object follows as a record
+prefixed with its length, holding the index of its class and one tagged
+value per attribute of the schema. UUID strings and timestamps are packed
+into 16 and 8 bytes.
+"""
+import json
+import struct
+import sys
+import uuid
+from datetime import datetime, timedelta
+from models.engine.json_stream import iter_object
+
+MAGIC = b"\x89HBNB"
+VERSION = 1
+
+_u16 = struct.Struct("<H")
+_u32 = struct.Struct("<I")
+_i64 = struct.Struct("<q")
+_f64 = struct.Struct("<d")
+_record = struct.Struct("<IH")
+_epoch = datetime(1970, 1, 1)
+_timestamps = ("created_at", "updated_at")
+
+_ABSENT, _NONE, _FALSE, _TRUE = 0, 1, 2, 3
+_INT, _FLOAT, _STR, _UUID, _TIME, _JSON = 4, 5, 6, 7, 8, 9
+_absent = bytes((_ABSENT,))
+
+
+def _pack_str(s):
+    """Return the UTF-8 bytes of s prefixed with their length."""
+    b = s.encode("utf-8")
+    return _u32.pack(len(b)) + b
+
+
+def _pack_value(name, v):
+    """Return the tagged bytes of the value v of the attribute name."""
+    if v is None:
+        return bytes((_NONE,))
+    if v is True or v is False:
+        return bytes((_TRUE if v else _FALSE,))
+    t = type(v)
+    if t is int and -2 ** 63 <= v < 2 ** 63:
+        return bytes((_INT,)) + _i64.pack(v)
+    if t is float:
+        return bytes((_FLOAT,)) + _f64.pack(v)
+    if t is str:
+        if len(v) == 36 and v[8] == "-":
+            try:
+                u = uuid.UUID(v)
+                if str(u) == v:
+                    return bytes((_UUID,)) + u.bytes
+            except ValueError:
+                pass
+        if name in _timestamps and len(v) == 26:
+            try:
+                dt = datetime.fromisoformat(v)
+                if dt.tzinfo is None and dt.isoformat() == v:
+                    return _pack_value(name, dt)
+            except ValueError:
+                pass
+        return bytes((_STR,)) + _pack_str(v)
+    if t is datetime and name in _timestamps and v.tzinfo is None:
+        micros = (v - _epoch) // timedelta(microseconds=1)
+        return bytes((_TIME,)) + _i64.pack(micros)
+    return bytes((_JSON,)) + _pack_str(json.dumps(v))
+
+
+def pack_record(schemas, o):
+    """Return the record of the object dictionary o, prefixed with its
+    length. Attributes missing from the schema of its class are appended
+    to it, so records packed earlier with the same schemas stay valid.
+    Args:
+        schemas (dict): The attribute names of each class by class name.
+        o (dict): The dictionary of an object, as returned by to_dict().
+    """
+    cls_name = o["__class__"]
+    fields = schemas.setdefault(cls_name, [])
+    for name in o.keys():
+        if name != "__class__" and name not in fields:
+            fields.append(name)
+    values = [_pack_value(name, o[name]) if name in o else _absent
+              for name in fields]
+    index = list(schemas.keys()).index(cls_name)
+    payload = _record.pack(index, len(values)) + b"".join(values)
+    return _u32.pack(len(payload)) + payload
+
+
+def pack_header(schemas):
+    """Return the header of a snapshot of classes with the given schemas."""
+    parts = [MAGIC, _u16.pack(VERSION), _u32.pack(len(schemas))]
+    for cls_name, fields in schemas.items():
+        parts.append(_pack_str(cls_name))
+        parts.append(_u32.pack(len(fields)))
+        parts.extend(_pack_str(name) for name in fields)
+    return b"".join(parts)
+
+
+def _read(f, size):
+    """Read exactly size bytes from f."""
+    b = f.read(size)
+    if len(b) != size:
+        raise ValueError("Truncated binary snapshot")
+    return b
+
+
+def _read_str(f):
+    """Read a string prefixed with its length from f."""
+    return _read(f, _u32.unpack(_read(f, 4))[0]).decode("utf-8")
+
+
+def read_header(f):
+    """Read the header of the snapshot in the binary file f.
+    Return the schemas of its classes by class name.
+    """
+    if f.read(len(MAGIC)) != MAGIC:
+        raise ValueError("Not a binary snapshot")
+    version = _u16.unpack(_read(f, 2))[0]
+    if version != VERSION:
+        raise ValueError("Unsupported snapshot version {}".format(version))
+    schemas = {}
+    for i in range(_u32.unpack(_read(f, 4))[0]):
+        cls_name = _read_str(f)
+        count = _u32.unpack(_read(f, 4))[0]
+        schemas[cls_name] = [_read_str(f) for j in range(count)]
+    return schemas
+
+
+def iter_packed(f):
+    """Yield the records following the header of the binary file f,
+    with their length prefix, one at a time."""
+    while True:
+        prefix = f.read(4)
+        if len(prefix) == 0:
+            return
+        if len(prefix) != 4:
+            raise ValueError("Truncated binary snapshot")
+        yield prefix + _read(f, _u32.unpack(prefix)[0])
+
+
+def unpack_record(schemas, record):
+    """Return the key and object dictionary stored in record.
+    Timestamps are returned as datetime objects.
+    Args:
+        schemas (dict): The schemas read from the header.
+        record (bytes): A record with its length prefix.
+    """
+    names = list(schemas.keys())
+    index, count = _record.unpack_from(record, 4)
+    cls_name = names[index]
+    fields = schemas[cls_name]
+    o = {}
+    pos = 4 + _record.size
+    for i in range(count):
+        tag = record[pos]
+        pos += 1
+        if tag == _ABSENT:
+            continue
+        if tag == _NONE:
+            v = None
+        elif tag == _FALSE or tag == _TRUE:
+            v = tag == _TRUE
+        elif tag == _INT:
+            v = _i64.unpack_from(record, pos)[0]
+            pos += 8
+        elif tag == _FLOAT:
+            v = _f64.unpack_from(record, pos)[0]
+            pos += 8
+        elif tag == _UUID:
+            v = str(uuid.UUID(bytes=bytes(record[pos:pos + 16])))
+            pos += 16
+        elif tag == _TIME:
+            micros = _i64.unpack_from(record, pos)[0]
+            v = _epoch + timedelta(microseconds=micros)
+            pos += 8
+        elif tag == _STR or tag == _JSON:
+            size = _u32.unpack_from(record, pos)[0]
+            v = bytes(record[pos + 4:pos + 4 + size]).decode("utf-8")
+            if tag == _JSON:
+                v = json.loads(v)
+            pos += 4 + size
+        else:
+            raise ValueError("Unknown value tag {}".format(tag))
+        o[fields[i]] = v
+    o["__class__"] = cls_name
+    return "{}.{}".format(cls_name, o["id"]), o
+
+
+def iter_records(f):
+    """Yield the key and object dictionary of each record of the binary
+    snapshot f, one at a time."""
+    schemas = read_header(f)
+    for record in iter_packed(f):
+        yield unpack_record(schemas, record)
+
+
+def json_to_binary(src, dst):
+    """Convert the JSON snapshot at path src to a binary one at path dst.
+    The source is read twice, once to build the schemas, so that memory
+    use does not grow with its size.
+    """
+    schemas = {}
+    with open(src, "r") as f:
+        for key, o in iter_object(f):
+            pack_record(schemas, o)
+    with open(src, "r") as f, open(dst, "wb") as out:
+        out.write(pack_header(schemas))
+        for key, o in iter_object(f):
+            out.write(pack_record(schemas, o))
+
+
+def binary_to_json(src, dst):
+    """Convert the binary snapshot at path src to a JSON one at path dst,
+    with one object per line."""
+    with open(src, "rb") as f, open(dst, "w") as out:
+        out.write("{")
+        sep = "\n"
+        for key, o in iter_records(f):
+            for name in _timestamps:
+                if type(o.get(name)) is datetime:
+                    o[name] = o[name].isoformat()
+            out.write("{}{}:{}".format(sep, json.dumps(key),
+                                       json.dumps(o, separators=(",", ":"))))
+            sep = ",\n"
+        out.write("\n}\n")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4 or sys.argv[1] not in ("to-binary", "to-json"):
+        print("Usage: {} to-binary|to-json <src> <dst>".format(sys.argv[0]))
+        sys.exit(2)
+    if sys.argv[1] == "to-binary":
+        json_to_binary(sys.argv[2], sys.argv[3])
+    else:
+        binary_to_json(sys.argv[2], sys.argv[3])
@@ -0,0 +1,86 @@
+#!/usr/bin/python3
+"""Defines the compression of FileStorage snapshots.
+Snapshots are compressed as a whole with zlib, bz2 or lzma. The codec of
+a file is recognized from the header each of them starts its output with.
+"""
+import bz2
+import io
+import lzma
+import zlib
+
+codecs = ("zlib", "bz2", "lzma")
+"""tuple: The names of the supported codecs."""
+
+
+def compress(data, codec, level=None):
+    """Return data compressed with codec.
+    Args:
+        data (bytes): The data to compress.
+        codec (str): One of codecs.
+        level (int): The compression level, 0 to 9, or None for the
+            default level of the codec.
+    """
+    if codec == "zlib":
+        return zlib.compress(data, -1 if level is None else level)
+    if codec == "bz2":
+        return bz2.compress(data, 9 if level is None else max(level, 1))
+    if codec == "lzma":
+        return lzma.compress(data, preset=level)
+    raise ValueError("Unknown compression codec: {}".format(codec))
+
+
+def detect(head):
+    """Return the codec of a file starting with the bytes head, or None
+    if it is not compressed."""
+    if head.startswith(b"BZh"):
+        return "bz2"
+    if head.startswith(b"\xfd7zXZ\x00"):
+        return "lzma"
+    if len(head) < 2 or head[0] & 0x0f != 8:
+        return None
+    return "zlib" if (head[0] << 8 | head[1]) % 31 == 0 else None
+
+
+class _ZlibReader(io.RawIOBase):
+    """Represent the decompressed content of a zlib stream."""
+
+    def __init__(self, f):
+        """Initialize a new _ZlibReader.
+        Args:
+            f (file): The binary file holding the zlib stream.
+        """
+        self.__f = f
+        self.__decompressor = zlib.decompressobj()
+        self.__buf = memoryview(b"")
+
+    def readable(self):
+        """Return True."""
+        return True
+
+    def readinto(self, b):
+        """Read decompressed bytes into b, return how many."""
+        while len(self.__buf) == 0:
+            if self.__decompressor.eof:
+                return 0
+            chunk = self.__f.read(io.DEFAULT_BUFFER_SIZE * 8)
+            if len(chunk) == 0:
+                raise EOFError("Compressed file ended before the "
+                               "end-of-stream marker was reached")
+            self.__buf = memoryview(self.__decompressor.decompress(chunk))
+        n = min(len(b), len(self.__buf))
+        b[:n] = self.__buf[:n]
+        self.__buf = self.__buf[n:]
+        return n
+
+
+def open_reader(f):
+    """Return a binary file reading the decompressed content of the binary
+    file f, or f itself if it is not compressed. Both support peek."""
+    codec = detect(f.peek(8)[:8])
+    if codec == "zlib":
+        return io.BufferedReader(_ZlibReader(f))
+    if codec == "bz2":
+        return bz2.BZ2File(f)
+    if codec == "lzma":
+        return lzma.LZMAFile(f)
+    return f
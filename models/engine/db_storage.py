@@ -0,0 +1,446 @@
+#!/usr/bin/python3
+"""Defines the DBStorage class."""
+import json
+import math
+import os
+import sqlite3
+import threading
+import weakref
+from types import MappingProxyType
+from models.registry import classes
+from models.engine.indexes import GeoIndex, bounding_box, earth_radius
+from models.engine.indexes import foreign_keys, spatial_keys, text_keys
+from models.engine.indexes import tokenize
+from models.engine.query import Query
+
+
+class DBStorage:
+    """Represent a storage engine backed by a SQLite database.
+    Each class is stored in its own table, one row per object.
+    Attributes:
+        __db_path (str): The path of the SQLite database file.
+    """
+    __db_path = os.getenv("HBNB_SQLITE_DB", "hbnb.db")
+
+    def __init__(self):
+        """Initialize a new DBStorage.
+        Objects read from the database are kept in a weak identity map so
+        that a row is hydrated once while it is in use. Objects created,
+        changed or deleted since the last save are held in __pending.
+        """
+        self.__local = threading.local()
+        self.__objects = weakref.WeakValueDictionary()
+        self.__pending = {}
+
+    def __conn(self):
+        """Return the connection of the current thread, opening it once."""
+        conn = getattr(self.__local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(DBStorage.__db_path)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.__local.conn = conn
+        return conn
+
+    def __hydrate(self, cls_name, data):
+        """Return the object stored as the JSON text data.
+        The object already in the identity map is returned if there is one.
+        """
+        o = json.loads(data)
+        key = "{}.{}".format(cls_name, o["id"])
+        obj = self.__objects.get(key)
+        if obj is None:
+            del o["__class__"]
+            obj = classes[cls_name](**o)
+            self.__objects[key] = obj
+        return obj
+
+    def all(self, cls=None):
+        """Return a dictionary of all stored objects by <class name>.id,
+        or of the objects of class cls if it is given.
+        Args:
+            cls (type or str): The class of the objects or its name.
+        """
+        if cls is None:
+            names = list(classes.keys())
+        else:
+            names = [cls if type(cls) is str else cls.__name__]
+        names = [n for n in names if n in classes]
+        conn = self.__conn()
+        objdict = {}
+        for cls_name in names:
+            rows = conn.execute('SELECT data FROM "{}"'.format(cls_name))
+            for row in rows:
+                obj = self.__hydrate(cls_name, row[0])
+                objdict["{}.{}".format(cls_name, obj.id)] = obj
+        for key, obj in self.__pending.items():
+            if key.split(".", 1)[0] not in names:
+                continue
+            if obj is None:
+                objdict.pop(key, None)
+            else:
+                objdict[key] = obj
+        return objdict
+
+    def count(self, cls=None):
+        """Return the number of objects, or of objects of class cls.
+        Args:
+            cls (type or str): The class of the objects or its name.
+        """
+        if cls is None:
+            return sum(self.count(n) for n in classes.keys())
+        cls_name = cls if type(cls) is str else cls.__name__
+        if cls_name not in classes:
+            return 0
+        for key in self.__pending.keys():
+            if key.split(".", 1)[0] == cls_name:
+                return len(self.all(cls_name))
+        return self.__conn().execute(
+            'SELECT COUNT(*) FROM "{}"'.format(cls_name)).fetchone()[0]
+
+    def page(self, cls=None, limit=20, after=None):
+        """Return a page of at most limit objects, or of objects of class
+        cls, in order of <class name>.id, and the cursor of the next page.
+        Only the rows of the page are read, in order of their primary key.
+        Args:
+            cls (type or str): The class of the objects or its name.
+            limit (int): The number of objects in a page.
+            after (str): The cursor returned with the previous page, or
+                None for the first page.
+        Return:
+            A tuple of the list of objects and the cursor to pass as after
+            for the next page, or None if this is the last one.
+        """
+        if type(limit) is not int or limit <= 0:
+            raise ValueError("limit must be a positive int")
+        if after is not None and type(after) is not str:
+            raise ValueError("after must be a cursor string")
+        if cls is None:
+            names = sorted(classes.keys())
+        else:
+            names = [cls if type(cls) is str else cls.__name__]
+        conn = self.__conn()
+        found = {}
+        for cls_name in names:
+            if cls_name not in classes or len(found) > limit:
+                continue
+            prefix = cls_name + "."
+            lo = ""
+            if after is not None:
+                if after >= cls_name + "/":
+                    continue
+                if after.startswith(prefix):
+                    lo = after[len(prefix):]
+            pending = {key: obj for key, obj in self.__pending.items()
+                       if key.startswith(prefix) and key > prefix + lo}
+            rows = conn.execute(
+                'SELECT data FROM "{}" WHERE id > ? ORDER BY id LIMIT ?'
+                .format(cls_name), (lo, limit + 1 + len(pending)))
+            objdict = {}
+            for row in rows:
+                obj = self.__hydrate(cls_name, row[0])
+                objdict[prefix + obj.id] = obj
+            for key, obj in pending.items():
+                if obj is None:
+                    objdict.pop(key, None)
+                else:
+                    objdict[key] = obj
+            for key in sorted(objdict)[:limit + 1 - len(found)]:
+                found[key] = objdict[key]
+        keys = list(found)[:limit]
+        more = len(found) > limit
+        return [found[key] for key in keys], keys[-1] if more else None
+
+    def stream(self, cls=None, after=None, batch=1000):
+        """Yield the objects, or the objects of class cls, in order of
+        <class name>.id, a page of batch objects at a time, so that only
+        one page of rows is read at once. Objects created or deleted
+        meanwhile are seen if they come after the current page.
+        Args:
+            cls (type or str): The class of the objects or its name.
+            after (str): A cursor returned by page() to start after.
+            batch (int): The number of objects read at a time.
+        """
+        while True:
+            objs, after = self.page(cls, batch, after)
+            for obj in objs:
+                yield obj
+            if after is None:
+                return
+
+    def lookup(self, cls, attr, value):
+        """Return a dictionary of the objects of class cls whose attribute
+        attr equals value, such as the cities of a state.
+        Args:
+            cls (type or str): The class of the objects or its name.
+            attr (str): The name of the attribute, e.g. "state_id".
+            value (any): The value to look up.
+        """
+        cls_name = cls if type(cls) is str else cls.__name__
+        if cls_name not in classes:
+            return {}
+        if not attr.isidentifier():
+            raise ValueError("invalid attribute name: {}".format(attr))
+        rows = self.__conn().execute(
+            'SELECT data FROM "{}" WHERE json_extract(data, \'$.{}\') = ?'
+            .format(cls_name, attr), (value,))
+        objdict = {}
+        for row in rows:
+            obj = self.__hydrate(cls_name, row[0])
+            objdict["{}.{}".format(cls_name, obj.id)] = obj
+        for key, obj in self.__pending.items():
+            if key.split(".", 1)[0] != cls_name:
+                continue
+            if obj is not None and getattr(obj, attr, None) == value:
+                objdict[key] = obj
+            else:
+                objdict.pop(key, None)
+        return objdict
+
+    def query(self, cls):
+        """Return a Query over the objects of class cls.
+        Args:
+            cls (type or str): The class of the objects or its name.
+        """
+        cls_name = cls if type(cls) is str else cls.__name__
+        return Query(cls_name, self.__plan)
+
+    def __plan(self, cls_name, filters, order, limit):
+        """Return the plan of a query: its description, the candidate
+        objects and whether they are in order. An equality filter on a
+        foreign key is looked up through its index."""
+        for attr, op, value in filters:
+            if op == "eq" and attr in foreign_keys.get(cls_name, []):
+                return ("index {}.{} = {!r}".format(cls_name, attr, value),
+                        list(self.lookup(cls_name, attr, value).values()),
+                        False)
+        return ("scan {}".format(cls_name),
+                list(self.all(cls_name).values()), False)
+
+    def within(self, cls, south, west, north, east):
+        """Return a dictionary of the objects of class cls lying between
+        the latitudes south and north and the longitudes west and east, in
+        degrees. The box crosses the antimeridian if west > east.
+        Args:
+            cls (type or str): The class of the objects or its name.
+        """
+        index = self.__geo_index(cls, south, west, north, east)
+        return index.within(south, west, north, east)
+
+    def near(self, cls, lat, lon, radius):
+        """Return a list of the objects of class cls at most radius
+        kilometers away from lat, lon, nearest first.
+        Args:
+            cls (type or str): The class of the objects or its name.
+        """
+        index = self.__geo_index(cls, *bounding_box(lat, lon, radius))
+        return [obj for d, key, obj in index.near(lat, lon, radius)]
+
+    def nearest(self, cls, lat, lon, k=1):
+        """Return a list of the k objects of class cls nearest to lat, lon,
+        nearest first. The search radius starts at 10 kilometers and grows
+        fourfold until it holds k objects.
+        Args:
+            cls (type or str): The class of the objects or its name.
+        """
+        radius = 10.0
+        while True:
+            index = self.__geo_index(cls, *bounding_box(lat, lon, radius))
+            found = index.near(lat, lon, radius)
+            if len(found) >= k or radius >= math.pi * earth_radius:
+                return [obj for d, key, obj in found[:k]]
+            radius *= 4
+
+    def __geo_index(self, cls, south, west, north, east):
+        """Return a spatial index of the objects of class cls not saved
+        yet and of those whose row lies in the box south, west, north,
+        east. Only these rows are read, through the index on the position
+        of the objects."""
+        cls_name = cls if type(cls) is str else cls.__name__
+        lat, lon = spatial_keys.get(cls_name, ("latitude", "longitude"))
+        index = GeoIndex(lat, lon)
+        if cls_name not in classes:
+            return index
+        lat = "json_extract(data, '$.{}')".format(lat)
+        lon = "json_extract(data, '$.{}')".format(lon)
+        if west <= east:
+            where = "{0} BETWEEN ? AND ? AND {1} BETWEEN ? AND ?"
+        else:
+            where = "{0} BETWEEN ? AND ? AND ({1} >= ? OR {1} <= ?)"
+        rows = self.__conn().execute(
+            'SELECT data FROM "{}" WHERE '.format(cls_name) +
+            where.format(lat, lon), (south, north, west, east))
+        objdict = {}
+        for row in rows:
+            obj = self.__hydrate(cls_name, row[0])
+            objdict["{}.{}".format(cls_name, obj.id)] = obj
+        for key, obj in self.__pending.items():
+            if key.split(".", 1)[0] != cls_name:
+                continue
+            if obj is None:
+                objdict.pop(key, None)
+            else:
+                objdict[key] = obj
+        for key, obj in objdict.items():
+            index.add(key, obj)
+        return index
+
+    def search(self, cls, text, k=10):
+        """Return a list of the k objects of class cls whose text ranks
+        best for the words of text, best first. The words of each object
+        are kept in a full-text table of the class as of its last save,
+        and ranked there with BM25; objects deleted since are left out.
+        Args:
+            cls (type or str): The class of the objects or its name.
+            text (str): The words to search for.
+            k (int): The number of objects to return, or None for all the
+                objects holding any of the words.
+        """
+        cls_name = cls if type(cls) is str else cls.__name__
+        words = set(tokenize(text))
+        if cls_name not in text_keys or len(words) == 0:
+            return []
+        deleted = {key for key, obj in self.__pending.items()
+                   if obj is None and key.split(".", 1)[0] == cls_name}
+        rows = self.__conn().execute(
+            'SELECT c.data FROM "{0}_text" JOIN "{0}" AS c '
+            'ON c.rowid = "{0}_text".rowid WHERE "{0}_text" MATCH ? '
+            'ORDER BY bm25("{0}_text"), c.id LIMIT ?'.format(cls_name),
+            (" OR ".join('"{}"'.format(w) for w in sorted(words)),
+             -1 if k is None else k + len(deleted)))
+        found = []
+        for row in rows:
+            obj = self.__hydrate(cls_name, row[0])
+            if "{}.{}".format(cls_name, obj.id) not in deleted:
+                found.append(obj)
+        return found if k is None else found[:k]
+
+    def __words(self, cls_name, o):
+        """Return the words of the text attributes of the object
+        dictionary o of class cls_name, separated by spaces, as they are
+        kept in its full-text table."""
+        values = [o.get(attr) for attr in text_keys[cls_name]]
+        return " ".join(tokenize("\n".join(v for v in values
+                                           if type(v) is str)))
+
+    def get(self, cls, id):
+        """Return the object of class cls with the given id, or None.
+        Args:
+            cls (type or str): The class of the object or its name.
+            id (str): The id of the object.
+        """
+        cls_name = cls if type(cls) is str else cls.__name__
+        if cls_name not in classes:
+            return None
+        key = "{}.{}".format(cls_name, id)
+        if key in self.__pending:
+            return self.__pending[key]
+        obj = self.__objects.get(key)
+        if obj is None:
+            row = self.__conn().execute(
+                'SELECT data FROM "{}" WHERE id = ?'.format(cls_name),
+                (id,)).fetchone()
+            if row is not None:
+                obj = self.__hydrate(cls_name, row[0])
+        return obj
+
+    def new(self, obj):
+        """Add obj to the objects to insert on the next save."""
+        key = "{}.{}".format(obj.__class__.__name__, obj.id)
+        self.__objects[key] = obj
+        self.__pending[key] = obj
+
+    def delete(self, obj=None):
+        """Add obj to the objects to delete on the next save."""
+        if obj is None:
+            return
+        key = "{}.{}".format(obj.__class__.__name__, obj.id)
+        self.__objects.pop(key, None)
+        self.__pending[key] = None
+
+    def touch(self, obj):
+        """Add a stored obj that had an attribute changed to the objects
+        to write on the next save."""
+        key = "{}.{}".format(obj.__class__.__name__, obj.__dict__.get("id"))
+        if self.__objects.get(key) is obj:
+            self.__pending[key] = obj
+
+    def preserve(self, obj):
+        """Do nothing: the database does not keep snapshots."""
+
+    def snapshot(self):
+        """Return a read-only mapping of the objects by <class name>.id.
+        Stored objects that change afterwards change in it as well.
+        """
+        return MappingProxyType(self.all())
+
+    def save(self):
+        """Write the objects created, changed or deleted since the last
+        save in a single transaction."""
+        conn = self.__conn()
+        with conn:
+            for key, obj in self.__pending.items():
+                cls_name, id = key.split(".", 1)
+                if cls_name in text_keys:
+                    conn.execute('DELETE FROM "{0}_text" WHERE rowid = '
+                                 '(SELECT rowid FROM "{0}" WHERE id = ?)'
+                                 .format(cls_name), (id,))
+                if obj is None:
+                    conn.execute('DELETE FROM "{}" WHERE id = ?'
+                                 .format(cls_name), (id,))
+                    continue
+                o = obj.to_dict()
+                conn.execute('INSERT OR REPLACE INTO "{}" (id, data) '
+                             'VALUES (?, ?)'.format(cls_name),
+                             (id, json.dumps(o)))
+                if cls_name in text_keys:
+                    conn.execute('INSERT INTO "{0}_text" (rowid, words) '
+                                 'SELECT rowid, ? FROM "{0}" WHERE id = ?'
+                                 .format(cls_name),
+                                 (self.__words(cls_name, o), id))
+        self.__pending.clear()
+
+    def reload(self):
+        """Create the tables if needed and drop unsaved changes.
+        The positions of the classes of spatial_keys are indexed, and the
+        words of the classes of text_keys kept in a full-text table, which
+        is filled from the stored objects when it is created."""
+        conn = self.__conn()
+        with conn:
+            for cls_name in classes.keys():
+                conn.execute('CREATE TABLE IF NOT EXISTS "{}" '
+                             '(id TEXT PRIMARY KEY, data TEXT NOT NULL)'
+                             .format(cls_name))
+            for cls_name, attrs in foreign_keys.items():
+                for attr in attrs:
+                    conn.execute('CREATE INDEX IF NOT EXISTS "{0}_{1}" ON '
+                                 '"{0}" (json_extract(data, \'$.{1}\'))'
+                                 .format(cls_name, attr))
+            for cls_name, (lat, lon) in spatial_keys.items():
+                conn.execute('CREATE INDEX IF NOT EXISTS "{0}_{1}_{2}" ON '
+                             '"{0}" (json_extract(data, \'$.{1}\'), '
+                             'json_extract(data, \'$.{2}\'))'
+                             .format(cls_name, lat, lon))
+            for cls_name in text_keys.keys():
+                if conn.execute('SELECT 1 FROM sqlite_master WHERE name = ?',
+                                (cls_name + "_text",)).fetchone():
+                    continue
+                conn.execute('CREATE VIRTUAL TABLE "{}_text" USING '
+                             'fts5(words, tokenize="ascii tokenchars \'_\'")'
+                             .format(cls_name))
+                rows = conn.execute('SELECT rowid, data FROM "{}"'
+                                    .format(cls_name)).fetchall()
+                conn.executemany(
+                    'INSERT INTO "{}_text" (rowid, words) VALUES (?, ?)'
+                    .format(cls_name),
+                    [(rowid, self.__words(cls_name, json.loads(data)))
+                     for rowid, data in rows])
+        self.__objects = weakref.WeakValueDictionary()
+        self.__pending = {}
+
+    def close(self):
+        """Close the connection of the current thread."""
+        conn = getattr(self.__local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self.__local.conn = None
@@ -1,13 +1,33 @@
 #!/usr/bin/python3
 """Defines the FileStorage class."""
+import atexit
+import copy
+import io
 import json
-from models.base_model import BaseModel
-from models.user import User
-from models.state import State
-from models.city import City
-from models.place import Place
-from models.amenity import Amenity
-from models.review import Review
+import marshal
+import mmap
+import os
+import threading
+import time
+import uuid
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+from models.registry import classes
+from models.engine.indexes import ColumnStore, GeoIndex, RangeIndex
+from models.engine.indexes import SortedList
+from models.engine.indexes import TextIndex
+from models.engine.indexes import is_number, new_indexes
+from models.engine.json_stream import iter_object
+from models.engine.rwlock import RWLock
+from models.engine.snapshot import Snapshot, missing
+from models.engine.query import Query
+from models.engine import binary_format, compression
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
 
 
 class FileStorage:
@@ -15,34 +35,1416 @@ class FileStorage:
     Attributes:
         __file_path (str): The name of the file to save objects to.
         __objects (dict): A dictionary of instantiated objects.
+        __journal (bool): Append changes to a log next to __file_path
+            on save instead of rewriting the whole file.
+        __changed (set): Keys created, changed or deleted since last save.
+        __cache (dict): The JSON text of every object as of its last save.
+        __by_class (dict): The objects of __objects by class name.
+        __indexes (dict): The foreign key, range, spatial and text indexes
+            of each class by name.
+        __built (set): The names of the classes whose indexes were built
+            from their objects, which are kept up to date from then on.
+        __indexed (dict): The dictionary __by_class and __keys were built
+            from.
+        __keys (SortedList): The keys of all objects, decoded or not, in
+            order, for pagination.
+        __lazy (bool): Memory-map __file_path on reload and decode each
+            object only when it is first accessed.
+        __unloaded (dict): The (offset, length) in __mmap of the objects
+            not decoded yet, or their JSON text as bytes if they were
+            evicted, by class name then key.
+        __mmap (mmap): The memory map of __file_path.
+        __sync (bool): Flush written files to disk before returning.
+        __window (float): The number of seconds a save waits for other
+            saves to write together with them.
+        __commit (Condition): Guards the group commit counters below.
+        __requested (int): The number of saves requested so far.
+        __committed (int): The number of saves requested so far that
+            were written.
+        __committing (bool): Whether a save is gathering or writing.
+        __delay (float): The number of seconds a background thread waits
+            after a save before writing, or 0 to write in save itself.
+        __flusher (Thread): The background thread writing saves.
+        __unflushed (Event): Set when a save is waiting for the flusher.
+        __flush_lock (Lock): Held while a flush writes, so that the flush
+            at exit waits for the one the flusher began.
+        __lock (RWLock): Guards __objects and the bookkeeping above it.
+            Readers share it, writers hold it alone.
+        __frozen (bool): Whether __objects was returned by all(), in which
+            case it is copied before it is changed.
+        __snapshots (WeakValueDictionary): The snapshots still in use by
+            id, which keep the prior value of what changes.
+        __write_lock (Lock): Serializes writes to __file_path.
+        __depth (int): The number of threads inside a transaction block.
+        __local (local): The transaction of each thread: its depth of
+            nested blocks, whether a write was put off, the keys changed
+            before it began, and the JSON text of the objects it changed
+            as they were before, None for those it created.
+        __writes (int): The number of writes made, to tell whether one
+            was made during a transaction.
+        __format (str): The format of the snapshots written to
+            __file_path, "json" or "binary". Both are read.
+        __schemas (dict): The attribute names of each class in the
+            binary records of __packed.
+        __packed (dict): The binary record of every object as of its
+            last save or reload.
+        __codec (str): The codec snapshots are compressed with, one of
+            compression.codecs, or "" to leave them uncompressed.
+        __level (int): The compression level, or None for the default.
+        __compact_size (int): The size in bytes the log must reach before
+            it is folded into a new snapshot.
+        __compact_ratio (float): How many times larger than __file_path
+            the log must also be before it is folded into a new snapshot.
+        __compactor (Thread): The background thread compacting the log.
+        __compact_lock (Lock): Serializes compactions.
+        __generation (int): The number of times __file_path was replaced.
+        __shared (bool): Coordinate with other processes using the same
+            __file_path, taking turns through a lock file.
+        __seen (tuple): The signature of __file_path and its log when
+            __objects was last brought up to date with them.
+        __searched (dict): The version of each text index by class name
+            when it was last written next to __file_path or read from it.
+        __capacity (int): The number of decoded objects kept in __objects
+            beyond which the least recently used are evicted, or 0.
+        __recent (OrderedDict): The keys of __objects, least recently used
+            first, when __capacity is set.
+        __evicted (WeakValueDictionary): The evicted objects still in use
+            elsewhere by key, which are put back if they are accessed or
+            changed.
     """
     __file_path = "file.json"
     __objects = {}
+    __journal = os.getenv("HBNB_STORAGE_JOURNAL") == "1"
+    __changed = set()
+    __cache = {}
+    __by_class = {}
+    __indexes = new_indexes()
+    __built = set()
+    __indexed = __objects
+    __keys = SortedList()
+    __lazy = os.getenv("HBNB_STORAGE_LAZY") == "1"
+    __unloaded = {}
+    __mmap = None
+    __sync = os.getenv("HBNB_STORAGE_SYNC") == "1"
+    __window = float(os.getenv("HBNB_STORAGE_WINDOW", "0"))
+    __commit = threading.Condition()
+    __requested = 0
+    __committed = 0
+    __committing = False
+    __delay = float(os.getenv("HBNB_STORAGE_DELAY", "0"))
+    __flusher = None
+    __unflushed = threading.Event()
+    __flush_lock = threading.Lock()
+    __lock = RWLock()
+    __frozen = False
+    __snapshots = weakref.WeakValueDictionary()
+    __write_lock = threading.Lock()
+    __depth = 0
+    __local = threading.local()
+    __writes = 0
+    __format = os.getenv("HBNB_STORAGE_FORMAT", "json")
+    __schemas = {}
+    __packed = {}
+    __codec = os.getenv("HBNB_STORAGE_CODEC", "")
+    __level = (int(os.environ["HBNB_STORAGE_LEVEL"])
+               if "HBNB_STORAGE_LEVEL" in os.environ else None)
+    __compact_size = int(os.getenv("HBNB_STORAGE_COMPACT_SIZE", "1048576"))
+    __compact_ratio = float(os.getenv("HBNB_STORAGE_COMPACT_RATIO", "1"))
+    __compactor = None
+    __compact_lock = threading.Lock()
+    __generation = 0
+    __shared = os.getenv("HBNB_STORAGE_SHARED") == "1"
+    __seen = None
+    __searched = {}
+    __capacity = int(os.getenv("HBNB_STORAGE_CACHE", "0"))
+    __recent = OrderedDict()
+    __evicted = weakref.WeakValueDictionary()
 
-    def all(self):
-        """Return the dictionary __objects."""
-        return FileStorage.__objects
+    def all(self, cls=None):
+        """Return the dictionary __objects, or a dictionary of the objects
+        of class cls if it is given.
+        The dictionary returned is not changed afterwards, as __objects is
+        copied on the next write, so it can be iterated safely while other
+        threads write.
+        Args:
+            cls (type or str): The class of the objects or its name.
+        """
+        self.__refresh()
+        if cls is None:
+            for cls_name in list(FileStorage.__unloaded.keys()):
+                self.__hydrate(cls_name)
+            with FileStorage.__lock.read():
+                FileStorage.__frozen = True
+                return FileStorage.__objects
+        cls_name = cls if type(cls) is str else cls.__name__
+        self.__hydrate(cls_name)
+        self.__class_index()
+        with FileStorage.__lock.read():
+            return dict(FileStorage.__by_class.get(cls_name, {}))
+
+    def count(self, cls=None):
+        """Return the number of objects, or of objects of class cls.
+        Args:
+            cls (type or str): The class of the objects or its name.
+        """
+        self.__refresh()
+        self.__class_index()
+        with FileStorage.__lock.read():
+            unloaded = FileStorage.__unloaded
+            if cls is None:
+                return (len(FileStorage.__objects) +
+                        sum(len(entries) for entries in unloaded.values()))
+            cls_name = cls if type(cls) is str else cls.__name__
+            return (len(FileStorage.__by_class.get(cls_name, {})) +
+                    len(unloaded.get(cls_name, {})))
+
+    def page(self, cls=None, limit=20, after=None):
+        """Return a page of at most limit objects, or of objects of class
+        cls, in order of <class name>.id, and the cursor of the next page.
+        Only the objects of the page are decoded in lazy mode.
+        Args:
+            cls (type or str): The class of the objects or its name.
+            limit (int): The number of objects in a page.
+            after (str): The cursor returned with the previous page, or
+                None for the first page.
+        Return:
+            A tuple of the list of objects and the cursor to pass as after
+            for the next page, or None if this is the last one.
+        """
+        if type(limit) is not int or limit <= 0:
+            raise ValueError("limit must be a positive int")
+        if after is not None and type(after) is not str:
+            raise ValueError("after must be a cursor string")
+        self.__refresh()
+        self.__class_index()
+        with FileStorage.__lock.read():
+            keys = FileStorage.__keys
+            start, stop = 0, len(keys)
+            if cls is not None:
+                cls_name = cls if type(cls) is str else cls.__name__
+                start = keys.position(cls_name + ".")
+                stop = keys.position(cls_name + "/")
+            if after is not None:
+                start = max(start, keys.position(after + "\0"))
+            page = keys.slice(start, min(stop, start + limit))
+            more = start + limit < stop
+        objs = []
+        for key in page:
+            self.__hydrate(key.split(".")[0], key)
+            obj = FileStorage.__objects.get(key)
+            if obj is not None:
+                objs.append(obj)
+        return objs, page[-1] if more and len(page) > 0 else None
+
+    def stream(self, cls=None, after=None, batch=1000):
+        """Yield the objects, or the objects of class cls, in order of
+        <class name>.id, a page of batch objects at a time, so that the
+        lock is not held in between and only the objects reached are
+        decoded in lazy mode. Objects created or deleted meanwhile are seen
+        if they come after the current page.
+        Args:
+            cls (type or str): The class of the objects or its name.
+            after (str): A cursor returned by page() to start after.
+            batch (int): The number of objects read at a time.
+        """
+        while True:
+            objs, after = self.page(cls, batch, after)
+            for obj in objs:
+                yield obj
+            if after is None:
+                return
+
+    def lookup(self, cls, attr, value):
+        """Return a dictionary of the objects of class cls whose attribute
+        attr equals value, such as the cities of a state.
+        Args:
+            cls (type or str): The class of the objects or its name.
+            attr (str): The name of the attribute, e.g. "state_id".
+            value (any): The value to look up.
+        """
+        self.__refresh()
+        cls_name = cls if type(cls) is str else cls.__name__
+        self.__hydrate(cls_name)
+        indexes = self.__class_indexes(cls_name)
+        with FileStorage.__lock.read():
+            for index in indexes:
+                if index.attr == attr:
+                    return index.lookup(value)
+            objs = FileStorage.__by_class.get(cls_name, {})
+            return {key: obj for key, obj in objs.items()
+                    if getattr(obj, attr, None) == value}
+
+    def query(self, cls):
+        """Return a Query over the objects of class cls, e.g.
+        storage.query(Place).where(city_id=id, max_guest__ge=4).
+        Args:
+            cls (type or str): The class of the objects or its name.
+        """
+        cls_name = cls if type(cls) is str else cls.__name__
+        return Query(cls_name, self.__plan, self.__aggregate)
+
+    def __aggregate(self, cls_name, filters, fn, attr, by, edges):
+        """Return an aggregate or a histogram of the objects of class
+        cls_name meeting filters, computed over the columns of its
+        ColumnStore, or NotImplemented if the store cannot run filters or
+        does not hold attr and by."""
+        self.__refresh()
+        self.__hydrate(cls_name)
+        indexes = self.__class_indexes(cls_name)
+        with FileStorage.__lock.read():
+            for index in indexes:
+                if not isinstance(index, ColumnStore):
+                    continue
+                if attr is not None and attr not in index.attrs:
+                    return NotImplemented
+                if by is not None and by not in index.groups:
+                    return NotImplemented
+                if not index.supports(filters, [attr, by]):
+                    return NotImplemented
+                rows = index.select(filters)
+                if fn == "histogram":
+                    return index.histogram(rows, attr, edges)
+                return index.aggregate(rows, fn, attr, by)
+        return NotImplemented
+
+    def __plan(self, cls_name, filters, order, limit):
+        """Return the plan of a query: its description, the candidate
+        objects and whether they are in order. The index that yields the
+        fewest candidates for an equality, membership or range filter is
+        used, or else every object of the class is a candidate. A query
+        sorted by one attribute with a range index and limited walks the
+        index in order instead, until enough objects met the filters, if
+        it is expected to read fewer objects than there are candidates:
+        about limit times the objects in range over the candidates.
+        """
+        self.__refresh()
+        self.__hydrate(cls_name)
+        indexes = self.__class_indexes(cls_name)
+        bounds = self.__bounds(filters)
+        with FileStorage.__lock.read():
+            objs = FileStorage.__by_class.get(cls_name, {})
+            best, values = None, None
+            size = len(objs)
+            for index in indexes:
+                for attr, op, value in filters:
+                    if attr != index.attr or op not in ("eq", "in"):
+                        continue
+                    candidates = [value] if op == "eq" else list(value)
+                    n = sum(index.count(v) for v in set(candidates))
+                    if n < size:
+                        best, values, size = index, set(candidates), n
+                if isinstance(index, RangeIndex) and index.attr in bounds:
+                    n = index.count_range(*bounds[index.attr])
+                    if n < size:
+                        best, values, size = index, None, n
+            if limit is not None and len(order) == 1:
+                attr, reverse = order[0]
+                for index in indexes:
+                    if not isinstance(index, RangeIndex) or index.attr != attr:
+                        continue
+                    walked = len(objs)
+                    if attr in bounds:
+                        walked = index.count_range(*bounds[attr])
+                    if limit * walked < size * size:
+                        plan = "walk {}.{} {}{}".format(
+                            cls_name, attr, self.__interval(bounds.get(attr)),
+                            " descending" if reverse else "")
+                        return plan, self.__walk(index, bounds.get(attr),
+                                                 reverse), True
+            if best is None:
+                return ("scan {} ({} objects)".format(cls_name, size),
+                        list(objs.values()), False)
+            if values is None:
+                plan = "range {}.{} {} ({} objects)".format(
+                    cls_name, best.attr, self.__interval(bounds[best.attr]),
+                    size)
+                return (plan, [obj for entry, obj in
+                               best.page(*bounds[best.attr])], False)
+            objs = {}
+            for value in values:
+                objs.update(best.lookup(value))
+        plan = "index {}.{} in {!r} ({} objects)".format(
+            cls_name, best.attr, sorted(values, key=repr), size)
+        return plan, list(objs.values()), False
+
+    @staticmethod
+    def __bounds(filters):
+        """Return the bounds (lo, hi, lo_open, hi_open) set on each
+        attribute by the numeric comparisons of filters, by name."""
+        bounds = {}
+        for attr, op, value in filters:
+            if op == "in" or op == "ne" or not is_number(value):
+                continue
+            lo, hi, lo_open, hi_open = bounds.get(attr,
+                                                  (None, None, False, False))
+            if op in ("eq", "gt", "ge"):
+                if lo is None or value > lo or (value == lo and op == "gt"):
+                    lo, lo_open = value, op == "gt"
+            if op in ("eq", "lt", "le"):
+                if hi is None or value < hi or (value == hi and op == "lt"):
+                    hi, hi_open = value, op == "lt"
+            bounds[attr] = (lo, hi, lo_open, hi_open)
+        return bounds
+
+    @staticmethod
+    def __interval(bounds):
+        """Return bounds (lo, hi, lo_open, hi_open) written as an interval,
+        e.g. [4, inf)."""
+        lo, hi, lo_open, hi_open = bounds or (None, None, False, False)
+        return "{}{}, {}{}".format("(" if lo_open or lo is None else "[",
+                                   "-inf" if lo is None else lo,
+                                   "inf" if hi is None else hi,
+                                   ")" if hi_open or hi is None else "]")
+
+    def __walk(self, index, bounds, reverse):
+        """Yield the objects of the range index in order within bounds,
+        followed by those whose value is not a number if unbounded. Each
+        page of objects is read under the lock, so that writers may go on
+        between them."""
+        after = None
+        while True:
+            with FileStorage.__lock.read():
+                page = index.page(*(bounds or ()), reverse=reverse,
+                                  after=after, n=64)
+            if len(page) == 0:
+                break
+            for entry, obj in page:
+                yield obj
+            after = page[-1][0]
+        if bounds is None:
+            with FileStorage.__lock.read():
+                others = index.others()
+            for obj in others.values():
+                yield obj
+
+    def within(self, cls, south, west, north, east):
+        """Return a dictionary of the objects of class cls lying between
+        the latitudes south and north and the longitudes west and east, in
+        degrees. The box crosses the antimeridian if west > east.
+        Args:
+            cls (type or str): The class of the objects or its name.
+        """
+        with self.__geo_index(cls) as index:
+            return index.within(south, west, north, east)
+
+    def near(self, cls, lat, lon, radius):
+        """Return a list of the objects of class cls at most radius
+        kilometers away from lat, lon, nearest first.
+        Args:
+            cls (type or str): The class of the objects or its name.
+        """
+        with self.__geo_index(cls) as index:
+            return [obj for d, key, obj in index.near(lat, lon, radius)]
+
+    def nearest(self, cls, lat, lon, k=1):
+        """Return a list of the k objects of class cls nearest to lat, lon,
+        nearest first.
+        Args:
+            cls (type or str): The class of the objects or its name.
+        """
+        with self.__geo_index(cls) as index:
+            return [obj for d, key, obj in index.nearest(lat, lon, k)]
+
+    @contextmanager
+    def __geo_index(self, cls):
+        """Hold the lock for reading and yield the spatial index of the
+        class cls, or one built for the occasion from the latitude and
+        longitude of its objects if it has none."""
+        self.__refresh()
+        cls_name = cls if type(cls) is str else cls.__name__
+        self.__hydrate(cls_name)
+        indexes = self.__class_indexes(cls_name)
+        with FileStorage.__lock.read():
+            for index in indexes:
+                if isinstance(index, GeoIndex):
+                    yield index
+                    return
+            index = GeoIndex("latitude", "longitude")
+            for key, obj in FileStorage.__by_class.get(cls_name, {}).items():
+                index.add(key, obj)
+            yield index
+
+    def search(self, cls, text, k=10):
+        """Return a list of the k objects of class cls whose text ranks
+        best for the words of text, best first, e.g. the reviews of
+        storage.search(Review, "quiet garden"). Only the classes of
+        text_keys have a text to search.
+        Args:
+            cls (type or str): The class of the objects or its name.
+            text (str): The words to search for.
+            k (int): The number of objects to return, or None for all the
+                objects holding any of the words.
+        """
+        self.__refresh()
+        cls_name = cls if type(cls) is str else cls.__name__
+        self.__hydrate(cls_name)
+        indexes = self.__class_indexes(cls_name)
+        with FileStorage.__lock.read():
+            for index in indexes:
+                if isinstance(index, TextIndex):
+                    return [obj for s, key, obj in index.search(text, k)]
+        return []
+
+    def get(self, cls, id):
+        """Return the object of class cls with the given id, or None.
+        Args:
+            cls (type or str): The class of the object or its name.
+            id (str): The id of the object.
+        """
+        self.__refresh()
+        cls_name = cls if type(cls) is str else cls.__name__
+        key = "{}.{}".format(cls_name, id)
+        self.__hydrate(cls_name, key)
+        if FileStorage.__capacity > 0 and key in FileStorage.__recent:
+            with FileStorage.__lock.write():
+                if key in FileStorage.__recent:
+                    FileStorage.__recent.move_to_end(key)
+        return FileStorage.__objects.get(key)
+
+    def snapshot(self):
+        """Return a read-only mapping of the objects by <class name>.id
+        as they are now, which stays the same while they change.
+        Taking it copies nothing: afterwards, the prior value of each
+        object created, replaced, deleted or changed is kept in it.
+        """
+        self.__refresh()
+        for cls_name in list(FileStorage.__unloaded.keys()):
+            self.__hydrate(cls_name)
+        with FileStorage.__lock.write():
+            view = Snapshot(lambda: FileStorage.__objects, FileStorage.__lock)
+            FileStorage.__snapshots[id(view)] = view
+        return view
+
+    def preserve(self, obj):
+        """Keep a copy of a stored obj in the snapshots that have none yet,
+        and in the transaction of this thread, before one of its
+        attributes changes."""
+        key = "{}.{}".format(obj.__class__.__name__, obj.__dict__.get("id"))
+        if (getattr(FileStorage.__local, "depth", 0) > 0 and
+                FileStorage.__objects.get(key) is obj):
+            self.__remember(key)
+        if len(FileStorage.__snapshots) == 0:
+            return
+        with FileStorage.__lock.write():
+            if FileStorage.__objects.get(key) is not obj:
+                return
+            prior = None
+            for view in list(FileStorage.__snapshots.values()):
+                if not view.keeps(key):
+                    if prior is None:
+                        prior = copy.copy(obj)
+                    view.keep(key, prior)
 
     def new(self, obj):
         """Set in __objects obj with key <obj_class_name>.id"""
         ocname = obj.__class__.__name__
-        FileStorage.__objects["{}.{}".format(ocname, obj.id)] = obj
+        key = "{}.{}".format(ocname, obj.id)
+        self.__remember(key)
+        with FileStorage.__lock.write():
+            self.__put(key, obj)
+            FileStorage.__changed.add(key)
+
+    def delete(self, obj=None):
+        """Delete obj from __objects if it's inside."""
+        if obj is None:
+            return
+        key = "{}.{}".format(obj.__class__.__name__, obj.id)
+        self.__hydrate(obj.__class__.__name__, key)
+        self.__remember(key)
+        with FileStorage.__lock.write():
+            if self.__put(key, None) is not None:
+                FileStorage.__changed.add(key)
+
+    def touch(self, obj):
+        """Record that a stored obj had one of its attributes changed."""
+        key = "{}.{}".format(obj.__class__.__name__, obj.__dict__.get("id"))
+        if FileStorage.__objects.get(key) is not obj:
+            if FileStorage.__evicted.get(key) is not obj:
+                return
+            self.__hydrate(key.split(".")[0], key)
+            if FileStorage.__objects.get(key) is not obj:
+                return
+        with FileStorage.__lock.write():
+            FileStorage.__changed.add(key)
+            if FileStorage.__capacity > 0 and key in FileStorage.__recent:
+                FileStorage.__recent.move_to_end(key)
+            cls_name = key.split(".")[0]
+            if (FileStorage.__indexed is FileStorage.__objects and
+                    cls_name in FileStorage.__built):
+                for index in FileStorage.__indexes[cls_name]:
+                    index.add(key, obj)
 
     def save(self):
-        """Serialize __objects to the JSON file __file_path."""
-        odict = FileStorage.__objects
-        objdict = {obj: odict[obj].to_dict() for obj in odict.keys()}
-        with open(FileStorage.__file_path, "w") as f:
-            json.dump(objdict, f)
+        """Serialize __objects to the JSON file __file_path.
+        Saves requested within __window seconds of each other are
+        written at once by the first of them. With a __delay, save returns
+        at once and a background thread writes __delay seconds later.
+        """
+        state = FileStorage.__local
+        if getattr(state, "depth", 0) > 0:
+            state.deferred = True
+            return
+        if FileStorage.__delay > 0:
+            self.__write_behind()
+        elif FileStorage.__window > 0:
+            self.__group_commit()
+        else:
+            self.__write()
+        self.__evict()
+
+    @contextmanager
+    def transaction(self):
+        """Put off the saves of this thread until the block exits, then
+        write once. If the block raises, the objects this thread created,
+        changed or deleted in it are restored to their state before the
+        block. Nested blocks are part of the outermost one. Other threads
+        are not held up, and their changes are kept.
+        """
+        state = FileStorage.__local
+        if getattr(state, "depth", 0) == 0:
+            with FileStorage.__lock.write():
+                FileStorage.__depth += 1
+                state.dirty = set(FileStorage.__changed)
+                state.writes = FileStorage.__writes
+            state.before = {}
+            state.deferred = False
+        state.depth = getattr(state, "depth", 0) + 1
+        try:
+            yield self
+        except BaseException:
+            state.depth -= 1
+            if state.depth == 0:
+                self.__end_transaction()
+                self.__rollback(state)
+            raise
+        state.depth -= 1
+        if state.depth == 0:
+            self.__end_transaction()
+            if state.deferred:
+                self.save()
+
+    def __end_transaction(self):
+        """Count the transaction of this thread as closed."""
+        with FileStorage.__lock.write():
+            FileStorage.__depth -= 1
+
+    def __remember(self, key):
+        """Keep the JSON text of the object stored under key, or None if
+        there is none, the first time the transaction of this thread
+        changes it."""
+        state = FileStorage.__local
+        if getattr(state, "depth", 0) == 0 or key in state.before:
+            return
+        self.__hydrate(key.split(".")[0], key)
+        with FileStorage.__lock.read():
+            obj = FileStorage.__objects.get(key)
+            text = None if obj is None else json.dumps(obj.to_dict())
+        state.before[key] = text
+
+    def __rollback(self, state):
+        """Restore the objects the transaction of this thread changed.
+        Args:
+            state (local): The transaction of this thread.
+        Those changed since the last save only in the transaction are no
+        longer counted as changed, unless another thread wrote during the
+        transaction, in which case they are written again.
+        """
+        with FileStorage.__lock.write():
+            for key, text in state.before.items():
+                self.__restore(key, None if text is None else json.loads(text))
+            restored = set(state.before.keys())
+            written = FileStorage.__writes != state.writes
+            if written:
+                FileStorage.__changed |= restored
+            else:
+                FileStorage.__changed -= restored - state.dirty
+        state.before = {}
+        if written:
+            self.save()
+
+    def __iter_stored(self):
+        """Yield the key and dictionary of each object of the snapshot in
+        __file_path, whatever its format."""
+        try:
+            with open(FileStorage.__file_path, "rb") as f:
+                f = compression.open_reader(f)
+                if self.__is_binary(f):
+                    yield from binary_format.iter_records(f)
+                else:
+                    yield from iter_object(io.TextIOWrapper(f))
+        except FileNotFoundError:
+            return
+
+    def __restore(self, key, o):
+        """Give the object stored under key the attributes in o, keeping
+        the same instance when possible. A None o deletes the object."""
+        if o is None:
+            self.__put(key, None)
+            return
+        cls = classes[o.pop("__class__")]
+        restored = cls(**o)
+        obj = FileStorage.__objects.get(key)
+        if type(obj) is cls:
+            self.preserve(obj)
+            obj.__dict__.clear()
+            obj.__dict__.update(restored.__dict__)
+            restored = obj
+        self.__put(key, restored)
+
+    def flush(self):
+        """Write the changes of a save still waiting for the background
+        thread, if any. It is called at interpreter exit, and waits for
+        the background thread to finish a write it began."""
+        with FileStorage.__flush_lock:
+            if FileStorage.__unflushed.is_set():
+                FileStorage.__unflushed.clear()
+                self.__write()
+
+    def __write_behind(self):
+        """Hand the save over to the background thread, starting it once."""
+        FileStorage.__unflushed.set()
+        with FileStorage.__lock.write():
+            if FileStorage.__flusher is None:
+                atexit.register(self.flush)
+            flusher = FileStorage.__flusher
+            if flusher is None or not flusher.is_alive():
+                FileStorage.__flusher = threading.Thread(
+                    target=self.__flush_loop, name="FileStorage-flusher",
+                    daemon=True)
+                FileStorage.__flusher.start()
+
+    def __flush_loop(self):
+        """Write the saves handed over to the background thread, at most
+        once every __delay seconds."""
+        while True:
+            FileStorage.__unflushed.wait()
+            time.sleep(FileStorage.__delay)
+            self.flush()
+
+    def __group_commit(self):
+        """Write the objects once for every save requested while the
+        first of them waits __window seconds, then return to all of them.
+        """
+        commit = FileStorage.__commit
+        with commit:
+            FileStorage.__requested += 1
+            ticket = FileStorage.__requested
+            while FileStorage.__committed < ticket:
+                if not FileStorage.__committing:
+                    FileStorage.__committing = True
+                    break
+                commit.wait()
+            else:
+                return
+        written = FileStorage.__committed
+        try:
+            time.sleep(FileStorage.__window)
+            with commit:
+                batch = FileStorage.__requested
+            self.__write()
+            written = batch
+        finally:
+            with commit:
+                FileStorage.__committed = written
+                FileStorage.__committing = False
+                commit.notify_all()
+
+    def __write(self):
+        """Write the objects changed since the last save.
+        Only they are encoded again. In journal mode they are appended to
+        the log, otherwise __file_path is replaced as a whole with one
+        object per line, or one binary record each, then compressed with
+        __codec. Objects may change again once they are encoded.
+        """
+        with FileStorage.__write_lock, self.__file_lock(True):
+            self.__catch_up()
+            with FileStorage.__lock.write():
+                changed = FileStorage.__changed
+                FileStorage.__changed = set()
+                for key in changed:
+                    FileStorage.__cache.pop(key, None)
+                    FileStorage.__packed.pop(key, None)
+                if FileStorage.__journal:
+                    text = self.__log_text(changed)
+                elif FileStorage.__format == "binary":
+                    text = self.__snapshot_bytes()
+                else:
+                    text = self.__snapshot_text()
+            try:
+                if FileStorage.__journal:
+                    self.__append_log(text)
+                else:
+                    if FileStorage.__codec != "":
+                        if type(text) is str:
+                            text = text.encode("utf-8")
+                        text = compression.compress(
+                            text, FileStorage.__codec, FileStorage.__level)
+                    self.__replace(text)
+                    for suffix in [".log", ".log.1"]:
+                        try:
+                            os.remove(FileStorage.__file_path + suffix)
+                        except FileNotFoundError:
+                            pass
+            except BaseException:
+                with FileStorage.__lock.write():
+                    FileStorage.__changed |= changed
+                raise
+            FileStorage.__writes += 1
+            if not FileStorage.__journal:
+                self.__write_search()
+            if FileStorage.__shared:
+                FileStorage.__seen = self.__signature()
+
+    def __snapshot_text(self):
+        """Return the JSON text of all objects, one object per line."""
+        parts = ["{}:{}".format(json.dumps(key), self.__encode(key))
+                 for key in FileStorage.__objects.keys()]
+        for entries in FileStorage.__unloaded.values():
+            for key, entry in entries.items():
+                parts.append("{}:{}".format(json.dumps(key),
+                                            self.__raw(entry).decode("utf-8")))
+        return "{\n" + ",\n".join(parts) + "\n}\n"
+
+    def __snapshot_bytes(self):
+        """Return the binary snapshot of all objects.
+        The record of each object is kept until it changes, and the schema
+        of a class only grows, so unchanged records are not packed again.
+        """
+        schemas = FileStorage.__schemas
+        packed = FileStorage.__packed
+        records = []
+        for key, obj in FileStorage.__objects.items():
+            record = packed.get(key)
+            if record is None:
+                record = binary_format.pack_record(schemas, obj.to_dict())
+                packed[key] = record
+            records.append(record)
+        for entries in FileStorage.__unloaded.values():
+            for entry in entries.values():
+                o = json.loads(self.__raw(entry))
+                records.append(binary_format.pack_record(schemas, o))
+        return binary_format.pack_header(schemas) + b"".join(records)
 
     def reload(self):
-        """Deserialize the JSON file __file_path to __objects, if it exists."""
-        try:
-            with open(FileStorage.__file_path) as f:
-                objdict = json.load(f)
-                for o in objdict.values():
-                    cls_name = o["__class__"]
-                    del o["__class__"]
-                    self.new(eval(cls_name)(**o))
+        """Deserialize the JSON or binary file __file_path to __objects, if
+        it exists, then replay the changes appended to its log.
+        Objects are decoded one at a time to keep memory use bounded.
+        In lazy mode only their position in a JSON file is read.
+        """
+        with self.__file_lock(False), FileStorage.__lock.write():
+            self.__drop_unloaded()
+            FileStorage.__schemas = {}
+            FileStorage.__packed = {}
+            if FileStorage.__mmap is not None:
+                FileStorage.__mmap.close()
+                FileStorage.__mmap = None
+            try:
+                with open(FileStorage.__file_path, "rb") as raw:
+                    f = compression.open_reader(raw)
+                    if self.__is_binary(f):
+                        self.__unpack(f)
+                    else:
+                        lazy = FileStorage.__lazy and f is raw
+                        f = io.TextIOWrapper(f)
+                        if not (lazy and self.__map(f)):
+                            for key, o in iter_object(f):
+                                self.__load(key, o)
+            except FileNotFoundError:
+                pass
+            self.__replay_log(suffix=".log.1")
+            self.__replay_log()
+            if FileStorage.__shared:
+                FileStorage.__seen = self.__signature()
+
+    @contextmanager
+    def __file_lock(self, exclusive):
+        """Hold the lock file of __file_path, shared with other processes
+        or exclusive, for the duration of the block. A lock file is opened
+        each time so that threads exclude each other as well.
+        Does nothing unless __shared is set and fcntl is available.
+        """
+        if not FileStorage.__shared or fcntl is None:
+            yield
+            return
+        fd = os.open(FileStorage.__file_path + ".lock",
+                     os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            yield
+        finally:
+            os.close(fd)
+
+    def __stat(self, suffix):
+        """Return the inode, size and modification time of __file_path
+        followed by suffix, or None if it does not exist."""
+        try:
+            st = os.stat(FileStorage.__file_path + suffix)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+    def __signature(self):
+        """Return the signature of __file_path, the inode of its log and
+        the size of its log."""
+        log = self.__stat(".log")
+        if log is None:
+            return (self.__stat(""), None, 0)
+        return (self.__stat(""), log[0], log[1])
+
+    def __refresh(self):
+        """Evict the objects beyond __capacity, then bring __objects up to
+        date with the changes other processes saved, if the signature of
+        the files changed since last time."""
+        self.__evict()
+        if not FileStorage.__shared:
+            return
+        if self.__signature() == FileStorage.__seen:
+            return
+        with self.__file_lock(False):
+            self.__catch_up()
+
+    def __catch_up(self):
+        """Load the changes other processes saved since __seen.
+        If only the log grew, its new records are replayed. Otherwise
+        __file_path was replaced and is read again as a whole.
+        Objects this process changed and did not save yet are kept.
+        The caller holds the lock file.
+        """
+        if not FileStorage.__shared:
+            return
+        seen = FileStorage.__seen
+        now = self.__signature()
+        with FileStorage.__lock.write():
+            if (seen is not None and now[0] == seen[0] and
+                    seen[1] in (None, now[1]) and now[2] >= seen[2]):
+                self.__replay_log(self.__merge, ".log", seen[2])
+            else:
+                self.__merge_all()
+        FileStorage.__seen = self.__signature()
+
+    def __merge(self, key, o):
+        """Load the dictionary o saved by another process under key, or
+        delete the object if o is None, unless this process changed it
+        since its last save. Stored instances are updated in place."""
+        if key in FileStorage.__changed:
+            return
+        if o is None:
+            self.__put(key, None)
+        else:
+            self.__restore(key, o)
+        FileStorage.__cache.pop(key, None)
+        FileStorage.__packed.pop(key, None)
+
+    def __merge_all(self):
+        """Merge every object stored in __file_path and its logs, and drop
+        the objects no longer stored there."""
+        self.__drop_unloaded()
+        if FileStorage.__mmap is not None:
+            FileStorage.__mmap.close()
+            FileStorage.__mmap = None
+        stored = set()
+
+        def merge(key, o):
+            if o is None:
+                stored.discard(key)
+            else:
+                stored.add(key)
+            self.__merge(key, o)
+        for key, o in self.__iter_stored():
+            merge(key, o)
+        self.__replay_log(merge, ".log.1")
+        self.__replay_log(merge)
+        for key in list(FileStorage.__objects.keys()):
+            if key not in stored:
+                self.__merge(key, None)
+
+    def __is_binary(self, f):
+        """Return whether the file f opened in binary mode holds a binary
+        snapshot, leaving it at its start."""
+        magic = binary_format.MAGIC
+        return f.peek(len(magic))[:len(magic)] == magic
+
+    def __unpack(self, f):
+        """Load the objects of the binary snapshot f, keeping the record
+        of each so that saving it again does not pack it."""
+        schemas = binary_format.read_header(f)
+        FileStorage.__schemas = schemas
+        for record in binary_format.iter_packed(f):
+            key, o = binary_format.unpack_record(schemas, record)
+            self.__load(key, o)
+            FileStorage.__packed[key] = record
+
+    def __load(self, key, o):
+        """Put the object described by the dictionary o in __objects.
+        A None o means the object was deleted.
+        """
+        if o is None:
+            self.__put(key, None)
+        else:
+            cls_name = o["__class__"]
+            del o["__class__"]
+            self.__put(key, classes[cls_name](**o))
+        FileStorage.__changed.discard(key)
+        FileStorage.__cache.pop(key, None)
+        FileStorage.__packed.pop(key, None)
+
+    def __put(self, key, obj):
+        """Store obj under key in __objects and __by_class, or remove the
+        object stored under key if obj is None.
+        Return the object previously stored under key.
+        """
+        odict = FileStorage.__objects
+        for view in list(FileStorage.__snapshots.values()):
+            view.keep(key, odict.get(key, missing))
+        if FileStorage.__frozen:
+            odict = dict(odict)
+            if FileStorage.__indexed is FileStorage.__objects:
+                FileStorage.__indexed = odict
+            FileStorage.__objects = odict
+            FileStorage.__frozen = False
+        indexed = FileStorage.__indexed is odict
+        entries = FileStorage.__unloaded.get(key.split(".")[0])
+        unloaded = entries is not None and entries.pop(key, None) is not None
+        old = odict.get(key)
+        if old is not None and indexed:
+            ocname = old.__class__.__name__
+            FileStorage.__by_class[ocname].pop(key, None)
+            if ocname in FileStorage.__built:
+                for index in FileStorage.__indexes[ocname]:
+                    index.remove(key)
+        stored = old is not None or unloaded
+        if FileStorage.__capacity > 0:
+            FileStorage.__recent.pop(key, None)
+            if obj is not None:
+                FileStorage.__recent[key] = None
+        if obj is None:
+            odict.pop(key, None)
+            if indexed and stored:
+                FileStorage.__keys.remove(key)
+        else:
+            odict[key] = obj
+            if indexed:
+                ocname = obj.__class__.__name__
+                FileStorage.__by_class.setdefault(ocname, {})[key] = obj
+                if ocname in FileStorage.__built:
+                    for index in FileStorage.__indexes[ocname]:
+                        index.add(key, obj)
+                if not stored:
+                    FileStorage.__keys.add(key)
+        return old
+
+    def __class_index(self):
+        """Return __by_class, rebuilding it and __keys if __objects was
+        replaced. The indexes are then built again on demand."""
+        if FileStorage.__indexed is FileStorage.__objects:
+            return FileStorage.__by_class
+        with FileStorage.__lock.write():
+            by_class = {}
+            for key, obj in FileStorage.__objects.items():
+                ocname = obj.__class__.__name__
+                by_class.setdefault(ocname, {})[key] = obj
+            keys = list(FileStorage.__objects.keys())
+            for entries in FileStorage.__unloaded.values():
+                keys.extend(entries.keys())
+            FileStorage.__keys.clear()
+            for key in sorted(keys):
+                FileStorage.__keys.add(key)
+            FileStorage.__by_class = by_class
+            FileStorage.__built = set()
+            FileStorage.__indexed = FileStorage.__objects
+        return FileStorage.__by_class
+
+    def __class_indexes(self, cls_name):
+        """Return the indexes of the class cls_name, building them from
+        its objects the first time they are needed, so that only the
+        classes queried pay for theirs. A text index starts from the state
+        written next to __file_path, so that only the objects that changed
+        since are tokenized again, and is written there if it changed."""
+        self.__class_index()
+        indexes = FileStorage.__indexes.get(cls_name, [])
+        if cls_name in FileStorage.__built:
+            return indexes
+        saved = None
+        if any(isinstance(index, TextIndex) for index in indexes):
+            saved = self.__read_search(cls_name)
+        written, write = None, False
+        with FileStorage.__lock.write():
+            if cls_name in FileStorage.__built:
+                return indexes
+            for index in indexes:
+                if isinstance(index, TextIndex) and saved is not None:
+                    index.restore(saved)
+                    written = index.version
+                else:
+                    index.clear()
+            for key, obj in FileStorage.__by_class.get(cls_name, {}).items():
+                for index in indexes:
+                    index.add(key, obj)
+            for index in indexes:
+                if isinstance(index, TextIndex):
+                    index.prune()
+                    if index.version == written:
+                        FileStorage.__searched[cls_name] = written
+                    else:
+                        write = True
+            FileStorage.__built.add(cls_name)
+        if write:
+            self.__write_search()
+        return indexes
+
+    def __read_search(self, cls_name=None):
+        """Return the state of the text index of the class cls_name written
+        next to __file_path, or None. Without cls_name, return the states
+        of all the classes by name, each still marshaled."""
+        try:
+            with open(FileStorage.__file_path + ".search", "rb") as f:
+                version, saved = marshal.loads(f.read())
+            if version != marshal.version or type(saved) is not dict:
+                saved = {}
+            if cls_name is None:
+                return saved
+            return marshal.loads(saved[cls_name])
+        except (FileNotFoundError, KeyError, EOFError, ValueError,
+                TypeError):
+            return {} if cls_name is None else None
+
+    def __write_search(self):
+        """Write the text indexes built next to __file_path if they changed
+        since they were last written, so that the objects do not all have
+        to be tokenized again after a reload. The states of the classes
+        whose index was not built are kept from the file, and each state
+        is marshaled on its own so that one class is restored without
+        loading the others. The file is removed if it would be empty.
+        It is written with marshal, which loads several times faster than
+        JSON, and ignored by other versions of Python.
+        """
+        search_path = FileStorage.__file_path + ".search"
+        with FileStorage.__lock.read():
+            if FileStorage.__indexed is not FileStorage.__objects:
+                return
+            indexes = {cls_name: index
+                       for cls_name in FileStorage.__built
+                       for index in FileStorage.__indexes.get(cls_name, [])
+                       if isinstance(index, TextIndex) and
+                       index.version != FileStorage.__searched.get(cls_name)}
+            if len(indexes) == 0:
+                return
+            versions = {cls_name: index.version
+                        for cls_name, index in indexes.items()}
+            states = {cls_name: marshal.dumps(index.dump())
+                      for cls_name, index in indexes.items()
+                      if len(index) > 0}
+        saved = self.__read_search()
+        for cls_name in indexes:
+            saved.pop(cls_name, None)
+        saved.update(states)
+        if len(saved) == 0:
+            try:
+                os.remove(search_path)
+            except FileNotFoundError:
+                pass
+        else:
+            self.__write_file(search_path,
+                              marshal.dumps((marshal.version, saved)))
+        FileStorage.__searched.update(versions)
+
+    def __map(self, f):
+        """Memory-map the file f and record the position of each object
+        without decoding it. Objects already in __objects are decoded.
+        Return False if f does not hold one object per line.
+        """
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            return False
+        unloaded = {}
+        pos = 2
+        eol = 1 if mm[:2] == b"{\n" else -1
+        while eol != -1:
+            eol = mm.find(b"\n", pos)
+            line = mm[pos:eol].rstrip(b",")
+            if line == b"}":
+                break
+            sep = line.find(b'":')
+            if (sep == -1 or not line.startswith(b'"') or
+                    not line.endswith(b"}") or b"\\" in line[:sep]):
+                eol = -1
+            else:
+                key = line[1:sep].decode("utf-8")
+                entries = unloaded.setdefault(key.split(".")[0], {})
+                entries[key] = (pos + sep + 2, len(line) - sep - 2)
+                pos = eol + 1
+        if eol == -1:
+            mm.close()
+            return False
+        FileStorage.__mmap = mm
+        FileStorage.__unloaded = unloaded
+        if FileStorage.__indexed is FileStorage.__objects:
+            for entries in unloaded.values():
+                for key in entries.keys():
+                    if key not in FileStorage.__objects:
+                        FileStorage.__keys.add(key)
+        for key in list(FileStorage.__objects.keys()):
+            self.__hydrate(key.split(".")[0], key)
+        return True
+
+    def __hydrate(self, cls_name, key=None):
+        """Decode the objects of class cls_name still held in the memory
+        map, or only the one stored under key if it is given."""
+        if cls_name not in FileStorage.__unloaded:
+            return
+        with FileStorage.__lock.write():
+            entries = FileStorage.__unloaded.get(cls_name)
+            if entries is None:
+                return
+            if key is None:
+                keys = list(entries.keys())
+            else:
+                keys = [key] if key in entries else []
+            for k in keys:
+                text = self.__raw(entries[k]).decode("utf-8")
+                obj = FileStorage.__evicted.pop(k, None)
+                if obj is None:
+                    self.__load(k, json.loads(text))
+                else:
+                    self.__put(k, obj)
+                FileStorage.__cache[k] = text
+            if len(entries) == 0:
+                del FileStorage.__unloaded[cls_name]
+
+    def __drop_unloaded(self):
+        """Forget the objects not decoded yet, before __file_path is read
+        again."""
+        if FileStorage.__indexed is FileStorage.__objects:
+            for entries in FileStorage.__unloaded.values():
+                for key in entries.keys():
+                    FileStorage.__keys.remove(key)
+        FileStorage.__unloaded = {}
+
+    def __raw(self, entry):
+        """Return the JSON text, as bytes, of an object not decoded yet
+        from its entry in __unloaded."""
+        if type(entry) is bytes:
+            return entry
+        offset, length = entry
+        return FileStorage.__mmap[offset:offset + length]
+
+    def __evict(self):
+        """Evict the least recently used objects of __objects beyond
+        __capacity: each is replaced by its JSON text in __unloaded and
+        decoded again when it is accessed. Objects changed since the last
+        save are kept, and nothing is evicted inside a transaction.
+        """
+        capacity = FileStorage.__capacity
+        if capacity == 0 or len(FileStorage.__recent) <= capacity:
+            return
+        with FileStorage.__lock.write():
+            if FileStorage.__depth > 0:
+                return
+            recent = FileStorage.__recent
+            excess = len(recent) - capacity
+            kept = []
+            for i in range(len(recent)):
+                if excess <= 0:
+                    break
+                key = next(iter(recent))
+                del recent[key]
+                obj = FileStorage.__objects.get(key)
+                if obj is None:
+                    continue
+                if key in FileStorage.__changed:
+                    kept.append(key)
+                    continue
+                text = self.__encode(key).encode("utf-8")
+                self.preserve(obj)
+                self.__put(key, None)
+                FileStorage.__cache.pop(key, None)
+                FileStorage.__packed.pop(key, None)
+                cls_name = key.split(".")[0]
+                FileStorage.__unloaded.setdefault(cls_name, {})[key] = text
+                if FileStorage.__indexed is FileStorage.__objects:
+                    FileStorage.__keys.add(key)
+                FileStorage.__evicted[key] = obj
+                excess -= 1
+            for key in kept:
+                recent[key] = None
+
+    def __encode(self, key):
+        """Return the JSON text of the object stored under key.
+        The text is cached until the object changes.
+        """
+        text = FileStorage.__cache.get(key)
+        if text is None:
+            text = json.dumps(FileStorage.__objects[key].to_dict(),
+                              separators=(",", ":"))
+            FileStorage.__cache[key] = text
+        return text
+
+    def __log_text(self, changed):
+        """Return the log records of the changed keys, one per line."""
+        lines = []
+        for key in changed:
+            if key in FileStorage.__objects:
+                text = self.__encode(key)
+            else:
+                text = "null"
+            lines.append("{{{}:{}}}\n".format(json.dumps(key), text))
+        return "".join(lines)
+
+    def __append_log(self, text):
+        """Append text to the log of __file_path, then compact it in the
+        background if it grew past __compact_size and __compact_ratio
+        times the size of __file_path."""
+        if len(text) == 0:
+            return
+        with open(FileStorage.__file_path + ".log", "a") as f:
+            f.write(text)
+            if FileStorage.__sync:
+                f.flush()
+                os.fsync(f.fileno())
+        if not self.__log_too_large():
+            return
+        compactor = FileStorage.__compactor
+        if compactor is None or not compactor.is_alive():
+            FileStorage.__compactor = threading.Thread(
+                target=self.__compact_loop, name="FileStorage-compactor",
+                daemon=True)
+            FileStorage.__compactor.start()
+
+    def __log_too_large(self):
+        """Return whether the log of __file_path is at least __compact_size
+        bytes and __compact_ratio times the size of __file_path."""
+        try:
+            size = os.path.getsize(FileStorage.__file_path + ".log")
+        except FileNotFoundError:
+            return False
+        try:
+            stored = os.path.getsize(FileStorage.__file_path)
+        except FileNotFoundError:
+            stored = 0
+        return (size >= FileStorage.__compact_size and
+                size >= FileStorage.__compact_ratio * stored)
+
+    def __compact_loop(self):
+        """Compact the log until it no longer grows past the thresholds
+        while being compacted."""
+        while self.compact() and self.__log_too_large():
+            pass
+
+    def compact(self):
+        """Fold the log of __file_path into a new snapshot.
+        The log is renamed with a .log.1 suffix so that saves go on
+        appending to a new one, then the snapshot and the renamed log are
+        read back from disk, merged and written to a new snapshot that
+        replaces __file_path atomically. The renamed log is replayed
+        before the new one on reload until it is removed.
+        Return False if there was nothing to compact, or if a full save
+        replaced __file_path in the meantime.
+        """
+        log_path = FileStorage.__file_path + ".log"
+        with FileStorage.__compact_lock:
+            with FileStorage.__write_lock, self.__file_lock(True):
+                generation = FileStorage.__generation
+                snapshot = self.__stat("")
+                if not os.path.exists(log_path + ".1"):
+                    try:
+                        os.replace(log_path, log_path + ".1")
+                    except FileNotFoundError:
+                        return False
+            merged = dict(self.__iter_stored())
+
+            def merge(key, o):
+                if o is None:
+                    merged.pop(key, None)
+                else:
+                    merged[key] = o
+            self.__replay_log(merge, ".log.1")
+            data = self.__compacted(merged)
+            with FileStorage.__write_lock, self.__file_lock(True):
+                if (FileStorage.__generation != generation or
+                        self.__stat("") != snapshot):
+                    return False
+                self.__replace(data)
+                os.remove(log_path + ".1")
+            self.__write_search()
+            return True
+
+    def __compacted(self, objdict):
+        """Return the snapshot of the object dictionaries of objdict in
+        the format and with the codec of the saves."""
+        if FileStorage.__format == "binary":
+            schemas = {}
+            records = [binary_format.pack_record(schemas, o)
+                       for o in objdict.values()]
+            data = binary_format.pack_header(schemas) + b"".join(records)
+        else:
+            parts = ["{}:{}".format(json.dumps(key), json.dumps(
+                o, separators=(",", ":"), default=datetime.isoformat))
+                for key, o in objdict.items()]
+            data = ("{\n" + ",\n".join(parts) + "\n}\n").encode("utf-8")
+        if FileStorage.__codec != "":
+            data = compression.compress(data, FileStorage.__codec,
+                                        FileStorage.__level)
+        return data
+
+    def __replace(self, text):
+        """Replace the content of __file_path with text, or bytes.
+        The text is written to a temporary file that is renamed over
+        __file_path, so a crash leaves either the old or the new file.
+        """
+        self.__write_file(FileStorage.__file_path, text)
+        FileStorage.__generation += 1
+        if FileStorage.__sync:
+            fd = os.open(os.path.dirname(FileStorage.__file_path) or ".",
+                         os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    def __write_file(self, path, text):
+        """Write text, or bytes, to a temporary file of a unique name next
+        to path, then rename it over path. The temporary file is removed
+        if the write fails."""
+        tmp_path = "{}.{}.tmp".format(path, uuid.uuid4().hex)
+        try:
+            with open(tmp_path, "xb" if type(text) is bytes else "x") as f:
+                f.write(text)
+                if FileStorage.__sync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def __replay_log(self, load=None, suffix=".log", offset=0):
+        """Apply the records of the log of __file_path to __objects, or
+        pass them to load if it is given. The log is __file_path followed
+        by suffix, read from offset.
+        A torn record left by an interrupted append is cut off the log.
+        """
+        if load is None:
+            load = self.__load
+        log_path = FileStorage.__file_path + suffix
+        try:
+            with open(log_path, "rb") as f:
+                f.seek(offset)
+                for line in f:
+                    try:
+                        if not line.endswith(b"\n"):
+                            raise ValueError("unterminated record")
+                        entry = json.loads(line)
+                    except ValueError:
+                        break
+                    for key, o in entry.items():
+                        load(key, o)
+                    offset += len(line)
+                else:
+                    return
         except FileNotFoundError:
             return
+        os.truncate(log_path, offset)
@@ -0,0 +1,962 @@
+#!/usr/bin/python3
+"""Defines the secondary indexes kept by the storage engines."""
+import bisect
+import hashlib
+import heapq
+import math
+import operator
+import re
+import sys
+from array import array
+from collections import Counter
+from itertools import compress, repeat
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+foreign_keys = {
+    "City": ["state_id"],
+    "Place": ["city_id", "user_id"],
+    "Review": ["place_id", "user_id"]
+}
+"""dict: The foreign key attributes of each class, by class name."""
+
+range_keys = {
+    "Place": ["price_by_night", "max_guest", "number_rooms",
+              "number_bathrooms", "latitude", "longitude"]
+}
+"""dict: The numeric attributes with a range index, by class name."""
+
+spatial_keys = {
+    "Place": ("latitude", "longitude")
+}
+"""dict: The latitude and longitude attributes of each class with a
+spatial index, by class name."""
+
+text_keys = {
+    "Place": ["name", "description"],
+    "Review": ["text"]
+}
+"""dict: The text attributes of each class with a full-text index, by
+class name."""
+
+earth_radius = 6371.0088
+"""float: The mean radius of the Earth in kilometers."""
+
+
+class ForeignKeyIndex:
+    """Represent a reverse index from the values of one attribute to the
+    objects holding them.
+    Attributes:
+        attr (str): The name of the indexed attribute.
+    """
+
+    def __init__(self, attr):
+        """Initialize a new ForeignKeyIndex.
+        Args:
+            attr (str): The name of the indexed attribute.
+        """
+        self.attr = attr
+        self.__keys = {}
+        self.__values = {}
+
+    def add(self, key, obj):
+        """Index obj under key, moving it if its attribute changed."""
+        value = getattr(obj, self.attr, None)
+        if key in self.__values:
+            if self.__values[key] == value:
+                self.__keys[value][key] = obj
+                return
+            self.remove(key)
+        self.__values[key] = value
+        self.__keys.setdefault(value, {})[key] = obj
+
+    def remove(self, key):
+        """Remove the object indexed under key, if any."""
+        if key not in self.__values:
+            return
+        value = self.__values.pop(key)
+        bucket = self.__keys[value]
+        del bucket[key]
+        if len(bucket) == 0:
+            del self.__keys[value]
+
+    def clear(self):
+        """Remove every object from the index."""
+        self.__keys = {}
+        self.__values = {}
+
+    def count(self, value):
+        """Return the number of objects whose attribute equals value."""
+        return len(self.__keys.get(value, ()))
+
+    def lookup(self, value):
+        """Return a dictionary of the objects whose attribute equals value."""
+        return dict(self.__keys.get(value, {}))
+
+
+_load = 512
+
+_exact = 2 ** 53
+"""int: The largest magnitude of the numbers a column holds exactly."""
+
+_compare = {
+    "eq": operator.eq,
+    "ne": operator.ne,
+    "lt": operator.lt,
+    "le": operator.le,
+    "gt": operator.gt,
+    "ge": operator.ge
+}
+
+
+def is_number(value):
+    """Return whether value is an int or float a range index can hold."""
+    return type(value) in (int, float) and value == value
+
+
+class _Top:
+    """Represent a key greater than any other, to bound index entries."""
+
+    def __gt__(self, other):
+        return True
+
+    def __lt__(self, other):
+        return False
+
+
+_top = _Top()
+
+
+class SortedList:
+    """Represent a list of distinct items kept in sorted order.
+    The items are kept in sorted blocks of at most twice _load items, so
+    that adding or removing one costs O(log n + _load) and finding the
+    position of an item O(log n + n / _load).
+    """
+
+    def __init__(self):
+        """Initialize a new, empty SortedList."""
+        self.clear()
+
+    def clear(self):
+        """Remove every item."""
+        self.__blocks = []
+        self.__maxes = []
+        self.__len = 0
+
+    def __len__(self):
+        """Return the number of items."""
+        return self.__len
+
+    def add(self, item):
+        """Insert item in its block, splitting the block if it is full."""
+        self.__len += 1
+        if len(self.__blocks) == 0:
+            self.__blocks.append([item])
+            self.__maxes.append(item)
+            return
+        i = bisect.bisect_left(self.__maxes, item)
+        if i == len(self.__blocks):
+            i -= 1
+            self.__blocks[i].append(item)
+            self.__maxes[i] = item
+        else:
+            bisect.insort(self.__blocks[i], item)
+        block = self.__blocks[i]
+        if len(block) > 2 * _load:
+            self.__blocks[i:i + 1] = [block[:_load], block[_load:]]
+            self.__maxes[i:i + 1] = [block[_load - 1], block[-1]]
+
+    def remove(self, item):
+        """Remove item, dropping its block if it becomes empty."""
+        i = bisect.bisect_left(self.__maxes, item)
+        block = self.__blocks[i]
+        del block[bisect.bisect_left(block, item)]
+        self.__len -= 1
+        if len(block) == 0:
+            del self.__blocks[i]
+            del self.__maxes[i]
+        else:
+            self.__maxes[i] = block[-1]
+
+    def position(self, item):
+        """Return the number of items lower than item."""
+        i = bisect.bisect_left(self.__maxes, item)
+        position = sum(len(block) for block in self.__blocks[:i])
+        if i < len(self.__blocks):
+            position += bisect.bisect_left(self.__blocks[i], item)
+        return position
+
+    def slice(self, start, stop):
+        """Return the items from position start up to position stop."""
+        items = []
+        offset = 0
+        for block in self.__blocks:
+            if offset >= stop:
+                break
+            if offset + len(block) > start:
+                items.extend(block[max(start - offset, 0):stop - offset])
+            offset += len(block)
+        return items
+
+
+class RangeIndex:
+    """Represent a sorted index of the numeric values of one attribute,
+    for range queries and walks in order.
+    Entries (value, key) are kept in a SortedList. Objects whose value is
+    not a number are kept apart, unsorted.
+    Attributes:
+        attr (str): The name of the indexed attribute.
+    """
+
+    def __init__(self, attr):
+        """Initialize a new RangeIndex.
+        Args:
+            attr (str): The name of the indexed attribute.
+        """
+        self.attr = attr
+        self.__entries = SortedList()
+        self.clear()
+
+    def clear(self):
+        """Remove every object from the index."""
+        self.__entries.clear()
+        self.__values = {}
+        self.__objs = {}
+        self.__others = {}
+
+    def add(self, key, obj):
+        """Index obj under key, moving it if its attribute changed."""
+        value = getattr(obj, self.attr, None)
+        if not is_number(value):
+            self.remove(key)
+            self.__others[key] = obj
+            return
+        if key in self.__values:
+            if self.__values[key] == value:
+                self.__objs[key] = obj
+                return
+            self.remove(key)
+        self.__others.pop(key, None)
+        self.__entries.add((value, key))
+        self.__values[key] = value
+        self.__objs[key] = obj
+
+    def remove(self, key):
+        """Remove the object indexed under key, if any."""
+        self.__others.pop(key, None)
+        if key not in self.__values:
+            return
+        self.__entries.remove((self.__values.pop(key), key))
+        del self.__objs[key]
+
+    def __bounds(self, lo, hi, lo_open, hi_open):
+        """Return the positions of the first entry in the range and of the
+        first entry after it."""
+        start = 0
+        if lo is not None:
+            start = self.__entries.position(
+                (lo, _top) if lo_open else (lo, ""))
+        if hi is None:
+            stop = len(self.__values)
+        else:
+            stop = self.__entries.position(
+                (hi, "") if hi_open else (hi, _top))
+        return start, max(start, stop)
+
+    def count_range(self, lo=None, hi=None, lo_open=False, hi_open=False):
+        """Return the number of objects whose value is between lo and hi,
+        which are excluded if lo_open or hi_open. None is unbounded."""
+        start, stop = self.__bounds(lo, hi, lo_open, hi_open)
+        return stop - start
+
+    def page(self, lo=None, hi=None, lo_open=False, hi_open=False,
+             reverse=False, after=None, n=None):
+        """Return the (value, key) entries and objects of at most n objects
+        whose value is between lo and hi, in order of value then key, or
+        in reverse order. Only entries following after, in that order,
+        are returned, so that a walk can go on from the last one even if
+        the index changed in the meantime.
+        """
+        start, stop = self.__bounds(lo, hi, lo_open, hi_open)
+        if after is not None:
+            if reverse:
+                stop = min(stop, self.__entries.position(after))
+            else:
+                start = max(start, self.__entries.position(after) + (
+                    after[1] in self.__values and
+                    self.__values[after[1]] == after[0]))
+        if n is not None:
+            if reverse:
+                start = max(start, stop - n)
+            else:
+                stop = min(stop, start + n)
+        entries = self.__entries.slice(start, stop)
+        if reverse:
+            entries.reverse()
+        return [(entry, self.__objs[entry[1]]) for entry in entries]
+
+    def others(self):
+        """Return a dictionary of the objects whose value is not a number.
+        """
+        return dict(self.__others)
+
+    def count(self, value):
+        """Return the number of objects whose value may equal value."""
+        if not is_number(value):
+            return len(self.__others)
+        return self.count_range(value, value)
+
+    def lookup(self, value):
+        """Return a dictionary of the objects whose attribute equals value."""
+        if not is_number(value):
+            return {key: obj for key, obj in self.__others.items()
+                    if getattr(obj, self.attr, None) == value}
+        return {entry[1]: obj for entry, obj in self.page(value, value)}
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """Return the great-circle distance in kilometers between two points
+    given by their latitude and longitude in degrees."""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2 +
+         math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * earth_radius * math.asin(min(1, math.sqrt(a)))
+
+
+def bounding_box(lat, lon, radius):
+    """Return the smallest (south, west, north, east) box, in degrees,
+    holding every point at most radius kilometers away from lat, lon.
+    The box crosses the antimeridian if west is greater than east."""
+    angle = radius / earth_radius
+    south = lat - math.degrees(angle)
+    north = lat + math.degrees(angle)
+    if south <= -90 or north >= 90 or angle >= math.pi / 2:
+        ratio = 1
+    else:
+        ratio = math.sin(angle) / math.cos(math.radians(lat))
+    if ratio >= 1:
+        west, east = -180, 180
+    else:
+        delta = math.degrees(math.asin(ratio))
+        west, east = lon - delta, lon + delta
+        if west < -180:
+            west += 360
+        if east > 180:
+            east -= 360
+    return max(south, -90), west, min(north, 90), east
+
+
+class GeoIndex:
+    """Represent a grid index of the positions of objects on the globe,
+    for bounding box, radius and nearest neighbour searches.
+    The globe is cut into cells of cell degrees on a side, and a search
+    only reads the cells it overlaps. Objects without a valid latitude and
+    longitude are not indexed.
+    Attributes:
+        attr (None): The index covers two attributes, so that no filter on
+            a single one looks it up.
+        lat (str): The name of the latitude attribute.
+        lon (str): The name of the longitude attribute.
+        cell (float): The size of a cell in degrees.
+    """
+    attr = None
+
+    def __init__(self, lat, lon, cell=0.1):
+        """Initialize a new GeoIndex.
+        Args:
+            lat (str): The name of the latitude attribute.
+            lon (str): The name of the longitude attribute.
+            cell (float): The size of a cell in degrees.
+        """
+        self.lat = lat
+        self.lon = lon
+        self.cell = cell
+        self.clear()
+
+    def clear(self):
+        """Remove every object from the index."""
+        self.__cells = {}
+        self.__points = {}
+
+    def __len__(self):
+        """Return the number of indexed objects."""
+        return len(self.__points)
+
+    def __position(self, obj):
+        """Return the latitude and longitude of obj, or None."""
+        lat = getattr(obj, self.lat, None)
+        lon = getattr(obj, self.lon, None)
+        if not is_number(lat) or not is_number(lon):
+            return None
+        if not -90 <= lat <= 90 or not -180 <= lon <= 180:
+            return None
+        return lat, lon
+
+    def __cell(self, lat, lon):
+        """Return the row and column of the cell holding lat, lon."""
+        return math.floor(lat / self.cell), math.floor(lon / self.cell)
+
+    def add(self, key, obj):
+        """Index obj under key, moving it if its position changed."""
+        position = self.__position(obj)
+        point = self.__points.get(key)
+        if point is not None:
+            if point[:2] == position:
+                self.__cells[point[2]][key] = obj
+                return
+            self.remove(key)
+        if position is None:
+            return
+        cell = self.__cell(*position)
+        self.__cells.setdefault(cell, {})[key] = obj
+        self.__points[key] = position + (cell,)
+
+    def remove(self, key):
+        """Remove the object indexed under key, if any."""
+        point = self.__points.pop(key, None)
+        if point is None:
+            return
+        bucket = self.__cells[point[2]]
+        del bucket[key]
+        if len(bucket) == 0:
+            del self.__cells[point[2]]
+
+    def within(self, south, west, north, east):
+        """Return a dictionary of the objects lying between the latitudes
+        south and north and the longitudes west and east, in degrees. The
+        box crosses the antimeridian if west is greater than east."""
+        if west > east:
+            objs = self.within(south, west, north, 180)
+            objs.update(self.within(south, -180, north, east))
+            return objs
+        if south > north:
+            return {}
+        rows = range(math.floor(south / self.cell),
+                     math.floor(north / self.cell) + 1)
+        cols = range(math.floor(west / self.cell),
+                     math.floor(east / self.cell) + 1)
+        if len(rows) * len(cols) > len(self.__cells):
+            cells = [c for c in self.__cells if c[0] in rows and c[1] in cols]
+        else:
+            cells = [(i, j) for i in rows for j in cols
+                     if (i, j) in self.__cells]
+        objs = {}
+        for cell in cells:
+            inner = (rows[0] < cell[0] < rows[-1] and
+                     cols[0] < cell[1] < cols[-1])
+            for key, obj in self.__cells[cell].items():
+                lat, lon = self.__points[key][:2]
+                if inner or (south <= lat <= north and west <= lon <= east):
+                    objs[key] = obj
+        return objs
+
+    def near(self, lat, lon, radius):
+        """Return a list of (distance, key, obj) for the objects at most
+        radius kilometers away from lat, lon, nearest first."""
+        found = []
+        box = bounding_box(lat, lon, radius)
+        for key, obj in self.within(*box).items():
+            point = self.__points[key]
+            distance = haversine(lat, lon, point[0], point[1])
+            if distance <= radius:
+                found.append((distance, key, obj))
+        found.sort(key=lambda item: item[:2])
+        return found
+
+    def nearest(self, lat, lon, k):
+        """Return a list of (distance, key, obj) for the k objects nearest
+        to lat, lon, nearest first. The search radius starts at the size
+        of a cell, shrunk to hold about k of the objects of the cell of
+        lat, lon, and doubles until it holds k objects."""
+        radius = math.radians(self.cell) * earth_radius
+        crowd = len(self.__cells.get(self.__cell(lat, lon), ()))
+        if crowd > k:
+            radius *= math.sqrt(k / crowd)
+        while True:
+            found = self.near(lat, lon, radius)
+            if len(found) >= k or radius >= math.pi * earth_radius:
+                return found[:k]
+            radius *= 2
+
+
+def tokenize(text):
+    """Return the list of the lowercase words of text."""
+    return re.findall(r"\w+", text.lower())
+
+
+class TextIndex:
+    """Represent an inverted index of the words of some text attributes of
+    objects, ranking them for a search with BM25.
+    Each indexed object is a document holding the words of all of its
+    attributes, known in the postings by a number. A digest of its text
+    tells when it has to be tokenized again, so the index can be saved
+    and restored with dump() and restore() and only the objects that
+    changed meanwhile are tokenized.
+    Attributes:
+        attr (None): The index covers whole texts, so that no filter looks
+            it up.
+        attrs (list): The names of the indexed attributes.
+        version (int): Changes whenever the index does.
+        k1 (float): How fast the score of a word saturates with the number
+            of times it occurs in a document.
+        b (float): How much the score is lowered in longer documents.
+    """
+    attr = None
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self, attrs):
+        """Initialize a new TextIndex.
+        Args:
+            attrs (list): The names of the indexed attributes.
+        """
+        self.attrs = attrs
+        self.version = 0
+        self.clear()
+
+    def clear(self):
+        """Remove every object from the index."""
+        self.__postings = {}
+        self.__keys = []
+        self.__docs = []
+        self.__numbers = {}
+        self.__free = []
+        self.__objs = {}
+        self.__total = 0
+        self.__stale = set()
+        self.version += 1
+
+    def __len__(self):
+        """Return the number of indexed objects."""
+        return len(self.__numbers)
+
+    def __text(self, obj):
+        """Return the text of the indexed attributes of obj."""
+        values = [getattr(obj, attr, None) for attr in self.attrs]
+        return "\n".join(v for v in values if type(v) is str)
+
+    def add(self, key, obj):
+        """Index obj under key, tokenizing its text again if it changed."""
+        text = self.__text(obj)
+        digest = hashlib.blake2b(text.encode("utf-8"),
+                                 digest_size=8).hexdigest()
+        number = self.__numbers.get(key)
+        if number is not None and self.__docs[number][0] == digest:
+            self.__objs[key] = obj
+            self.__stale.discard(key)
+            return
+        self.remove(key)
+        counts = Counter(tokenize(text))
+        if len(counts) == 0:
+            return
+        if len(self.__free) > 0:
+            number = self.__free.pop()
+        else:
+            number = len(self.__keys)
+            self.__keys.append(None)
+            self.__docs.append(None)
+        length = sum(counts.values())
+        terms = []
+        for term, n in counts.items():
+            term = sys.intern(term)
+            self.__postings.setdefault(term, {})[number] = n
+            terms.append(term)
+        self.__keys[number] = key
+        self.__docs[number] = (digest, length, tuple(terms))
+        self.__numbers[key] = number
+        self.__total += length
+        self.__objs[key] = obj
+        self.version += 1
+
+    def remove(self, key):
+        """Remove the object indexed under key, if any."""
+        number = self.__numbers.pop(key, None)
+        self.__objs.pop(key, None)
+        self.__stale.discard(key)
+        if number is None:
+            return
+        digest, length, terms = self.__docs[number]
+        for term in terms:
+            postings = self.__postings[term]
+            del postings[number]
+            if len(postings) == 0:
+                del self.__postings[term]
+        self.__keys[number] = None
+        self.__docs[number] = None
+        self.__free.append(number)
+        self.__total -= length
+        self.version += 1
+
+    def dump(self):
+        """Return the state of the index as a dictionary of plain values,
+        which it shares until the index changes."""
+        return {"keys": self.__keys, "docs": self.__docs,
+                "postings": self.__postings}
+
+    def restore(self, state):
+        """Replace the content of the index with a state returned by dump(),
+        which it takes over. Its documents are stale until their object is
+        added again with the same text, and prune() removes those that
+        were not."""
+        self.clear()
+        self.__keys = state["keys"]
+        self.__docs = state["docs"]
+        self.__postings = state["postings"]
+        for number, key in enumerate(self.__keys):
+            if key is None:
+                self.__free.append(number)
+            else:
+                self.__numbers[key] = number
+                self.__total += self.__docs[number][1]
+        self.__stale = set(self.__numbers)
+
+    def prune(self):
+        """Remove the documents restored but not added again."""
+        for key in list(self.__stale):
+            self.remove(key)
+
+    def search(self, text, k=None):
+        """Return a list of (score, key, obj) for the k objects ranking
+        best for the words of text, or for all objects holding any of
+        them, best first."""
+        n = len(self.__numbers)
+        scores = {}
+        for term in set(tokenize(text)):
+            postings = self.__postings.get(term)
+            if postings is None:
+                continue
+            df = len(postings)
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for number, tf in postings.items():
+                norm = self.b * self.__docs[number][1] * n / self.__total
+                score = idf * tf * (self.k1 + 1) / (
+                    tf + self.k1 * (1 - self.b + norm))
+                scores[number] = scores.get(number, 0) + score
+        keys = self.__keys
+
+        def order(item):
+            return -item[1], keys[item[0]]
+
+        if k is None:
+            ranked = sorted(scores.items(), key=order)
+        else:
+            ranked = heapq.nsmallest(k, scores.items(), key=order)
+        return [(score, keys[number], self.__objs[keys[number]])
+                for number, score in ranked]
+
+
+class ColumnStore:
+    """Represent the numeric attributes of the objects of one class kept
+    in columns, for filters and aggregates over all of them at once.
+    Each attribute is a typed array of floats holding the value of the
+    object of row i at index i, and the rows of removed objects are
+    reused. Group attributes, such as foreign keys, are held as integer
+    codes. With NumPy the arrays are filtered and aggregated in place.
+    Objects whose value is not a number, or not hashable for a group
+    attribute, are counted apart so that callers fall back to them.
+    Attributes:
+        attr (None): No single attribute is looked up in the store.
+        attrs (list): The names of the numeric attributes.
+        groups (list): The names of the group attributes.
+    """
+
+    attr = None
+
+    def __init__(self, attrs, groups):
+        """Initialize a new ColumnStore.
+        Args:
+            attrs (list): The names of the numeric attributes.
+            groups (list): The names of the group attributes.
+        """
+        self.attrs = list(attrs)
+        self.groups = list(groups)
+        self.clear()
+
+    def clear(self):
+        """Remove every object from the store."""
+        self.__rows = {}
+        self.__keys = []
+        self.__free = []
+        self.__live = array("b")
+        self.__columns = {attr: array("d") for attr in self.attrs}
+        self.__codes = {attr: array("q") for attr in self.groups}
+        self.__values = {attr: {} for attr in self.groups}
+        self.__names = {attr: [] for attr in self.groups}
+        self.__others = {attr: set() for attr in self.attrs + self.groups}
+
+    def __len__(self):
+        """Return the number of objects in the store."""
+        return len(self.__rows)
+
+    def add(self, key, obj):
+        """Write the attributes of obj in the row of key, taking a free row
+        if it has none."""
+        row = self.__rows.get(key)
+        if row is None:
+            if len(self.__free) > 0:
+                row = self.__free.pop()
+                self.__keys[row] = key
+                self.__live[row] = 1
+            else:
+                row = len(self.__keys)
+                self.__keys.append(key)
+                self.__live.append(1)
+                for column in self.__columns.values():
+                    column.append(math.nan)
+                for codes in self.__codes.values():
+                    codes.append(-1)
+            self.__rows[key] = row
+        for attr, column in self.__columns.items():
+            value = getattr(obj, attr, None)
+            if is_number(value) and abs(value) <= _exact:
+                column[row] = value
+                self.__others[attr].discard(key)
+            else:
+                column[row] = math.nan
+                self.__others[attr].add(key)
+        for attr, codes in self.__codes.items():
+            code = self.__code(attr, getattr(obj, attr, None), True)
+            codes[row] = code
+            if code == -1:
+                self.__others[attr].add(key)
+            else:
+                self.__others[attr].discard(key)
+
+    def remove(self, key):
+        """Free the row of key, if it has one."""
+        row = self.__rows.pop(key, None)
+        if row is None:
+            return
+        self.__keys[row] = None
+        self.__live[row] = 0
+        for column in self.__columns.values():
+            column[row] = math.nan
+        for codes in self.__codes.values():
+            codes[row] = -1
+        for others in self.__others.values():
+            others.discard(key)
+        self.__free.append(row)
+
+    def __code(self, attr, value, new=False):
+        """Return the code of value for the group attribute attr, a new one
+        if new, or -1 if it has none or is not hashable."""
+        values = self.__values[attr]
+        try:
+            code = values.get(value, -1)
+        except TypeError:
+            return -1
+        if code == -1 and new:
+            code = len(values)
+            values[value] = code
+            self.__names[attr].append(value)
+        return code
+
+    def __holds(self, attr):
+        """Return whether every object has a number, or a hashable group
+        value, for attr in the store."""
+        others = self.__others.get(attr)
+        return others is not None and len(others) == 0
+
+    def __numbers(self, values):
+        """Return values as a list of numbers a column holds exactly, or
+        None if one of them is not."""
+        try:
+            values = list(values)
+        except TypeError:
+            return None
+        for value in values:
+            if not is_number(value) or abs(value) > _exact:
+                return None
+        return values
+
+    def supports(self, filters, attrs):
+        """Return whether the store can run filters, a list of (attr, op,
+        value), and read every attribute of attrs, by itself."""
+        for attr in attrs:
+            if attr is not None and not self.__holds(attr):
+                return False
+        for attr, op, value in filters:
+            if not self.__holds(attr):
+                return False
+            if attr in self.__columns:
+                if op == "in":
+                    if self.__numbers(value) is None:
+                        return False
+                elif (op not in _compare or not is_number(value) or
+                      abs(value) > _exact):
+                    return False
+            elif op == "in":
+                if isinstance(value, (str, bytes)):
+                    return False
+                try:
+                    for v in value:
+                        hash(v)
+                except TypeError:
+                    return False
+            elif op not in ["eq", "ne"]:
+                return False
+            else:
+                try:
+                    hash(value)
+                except TypeError:
+                    return False
+        return True
+
+    def select(self, filters):
+        """Return the rows of the objects meeting every filter, as a
+        boolean mask with NumPy, or else a list of row numbers.
+        The filters must be supported by the store.
+        """
+        if numpy is not None and len(self.__keys) > 0:
+            mask = numpy.frombuffer(self.__live, numpy.int8) == 1
+            for attr, op, value in filters:
+                if attr in self.__columns:
+                    column = numpy.frombuffer(self.__columns[attr])
+                    if op == "in":
+                        mask &= numpy.isin(column, self.__numbers(value))
+                    else:
+                        mask &= _compare[op](column, value)
+                    continue
+                codes = numpy.frombuffer(self.__codes[attr], numpy.int64)
+                if op == "in":
+                    wanted = [self.__code(attr, v) for v in value]
+                    mask &= numpy.isin(codes, wanted)
+                else:
+                    mask &= _compare[op](codes, self.__code(attr, value))
+            return mask
+        rows = list(self.__rows.values())
+        for attr, op, value in filters:
+            if attr in self.__columns:
+                cells = map(self.__columns[attr].__getitem__, rows)
+                if op == "in":
+                    wanted = set(self.__numbers(value))
+                    rows = list(compress(rows, map(wanted.__contains__,
+                                                   cells)))
+                else:
+                    rows = list(compress(rows, map(_compare[op], cells,
+                                                   repeat(value))))
+                continue
+            cells = map(self.__codes[attr].__getitem__, rows)
+            if op == "in":
+                wanted = set(self.__code(attr, v) for v in value)
+                rows = list(compress(rows, map(wanted.__contains__, cells)))
+            else:
+                rows = list(compress(rows, map(
+                    _compare[op], cells, repeat(self.__code(attr, value)))))
+        return rows
+
+    def aggregate(self, rows, fn, attr=None, by=None):
+        """Return fn, one of "count", "sum", "avg", "min" or "max", of
+        attr over rows, as returned by select(). Grouped by the group
+        attribute by, return a dictionary of the results by group value.
+        Sums, averages and extremes are floats, None over no objects.
+        """
+        if numpy is not None and not isinstance(rows, list):
+            return self.__aggregate_numpy(rows, fn, attr, by)
+        if by is None:
+            groups = {None: rows}
+        else:
+            groups = {}
+            codes = self.__codes[by]
+            for row in rows:
+                groups.setdefault(codes[row], []).append(row)
+        results = {}
+        for code, members in groups.items():
+            if fn == "count":
+                results[code] = len(members)
+                continue
+            values = list(map(self.__columns[attr].__getitem__, members))
+            results[code] = summarize(fn, values)
+        if by is None:
+            return results[None]
+        names = self.__names[by]
+        return {names[code]: result for code, result in results.items()}
+
+    def __aggregate_numpy(self, mask, fn, attr, by):
+        """Return aggregate() of the rows of a NumPy mask."""
+        if fn != "count":
+            values = numpy.frombuffer(self.__columns[attr])[mask]
+        if by is None:
+            if fn == "count":
+                return int(numpy.count_nonzero(mask))
+            if len(values) == 0:
+                return 0.0 if fn == "sum" else None
+            if fn == "sum":
+                return float(values.sum())
+            if fn == "avg":
+                return float(values.mean())
+            return float(values.min() if fn == "min" else values.max())
+        codes = numpy.frombuffer(self.__codes[by], numpy.int64)[mask]
+        size = len(self.__names[by])
+        counts = numpy.bincount(codes, minlength=size)
+        if fn == "count":
+            results = counts
+        elif fn in ["sum", "avg"]:
+            results = numpy.bincount(codes, values, minlength=size)
+            if fn == "avg":
+                results = results / numpy.maximum(counts, 1)
+        else:
+            results = numpy.full(size, math.inf if fn == "min" else -math.inf)
+            if fn == "min":
+                numpy.minimum.at(results, codes, values)
+            else:
+                numpy.maximum.at(results, codes, values)
+        names = self.__names[by]
+        cast = int if fn == "count" else float
+        return {names[code]: cast(results[code])
+                for code in numpy.flatnonzero(counts)}
+
+    def histogram(self, rows, attr, edges):
+        """Return the number of objects of rows, as returned by select(),
+        whose attr falls in each bin between consecutive edges.
+        Bins include their lower edge, and the last one its upper edge.
+        """
+        if numpy is not None and not isinstance(rows, list):
+            values = numpy.frombuffer(self.__columns[attr])[rows]
+            return [int(n) for n in numpy.histogram(values, edges)[0]]
+        return histogram(map(self.__columns[attr].__getitem__, rows), edges)
+
+
+def summarize(fn, values):
+    """Return fn, one of "sum", "avg", "min" or "max", of a list of
+    numbers as a float, None for the last three over no numbers."""
+    if len(values) == 0:
+        return 0.0 if fn == "sum" else None
+    if fn == "sum":
+        return float(sum(values))
+    if fn == "avg":
+        return sum(values) / len(values)
+    return float(min(values) if fn == "min" else max(values))
+
+
+def histogram(values, edges):
+    """Return the number of values in each bin between consecutive
+    edges, which must increase. Bins include their lower edge, and the
+    last one its upper edge."""
+    values = list(values)
+    bins = Counter(map(bisect.bisect_right, repeat(edges), values))
+    counts = [bins[i] for i in range(1, len(edges))]
+    counts[-1] += values.count(edges[-1])
+    return counts
+
+
+def new_indexes():
+    """Return new empty indexes of every indexed class, by class name."""
+    indexes = {}
+    for cls_name, attrs in foreign_keys.items():
+        indexes.setdefault(cls_name, []).extend(
+            ForeignKeyIndex(attr) for attr in attrs)
+    for cls_name, attrs in range_keys.items():
+        indexes.setdefault(cls_name, []).extend(
+            RangeIndex(attr) for attr in attrs)
+    for cls_name, (lat, lon) in spatial_keys.items():
+        indexes.setdefault(cls_name, []).append(GeoIndex(lat, lon))
+    for cls_name, attrs in text_keys.items():
+        indexes.setdefault(cls_name, []).append(TextIndex(attrs))
+    for cls_name, attrs in range_keys.items():
+        indexes.setdefault(cls_name, []).append(
+            ColumnStore(attrs, foreign_keys.get(cls_name, [])))
+    return indexes
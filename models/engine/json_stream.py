@@ -0,0 +1,95 @@
+#!/usr/bin/python3
+"""Defines an incremental reader for large JSON objects."""
+import json
+import re
+
+_whitespace = re.compile(r"[ \t\n\r]*")
+_decoder = json.JSONDecoder()
+
+
+class _Buffer:
+    """Represent a window over a text file being decoded.
+    Attributes:
+        text (str): The part of the file read but not yet consumed.
+        pos (int): The position of the next character to decode in text.
+        eof (bool): Whether the whole file was read.
+    """
+
+    def __init__(self, f, chunk_size):
+        """Initialize a new _Buffer.
+        Args:
+            f (file): The text file to read.
+            chunk_size (int): The number of characters to read at once.
+        """
+        self.__f = f
+        self.__chunk_size = chunk_size
+        self.text = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        """Read one more chunk, dropping the consumed text.
+        Return False if the end of the file was reached.
+        """
+        if self.eof:
+            return False
+        chunk = self.__f.read(self.__chunk_size)
+        self.text = self.text[self.pos:] + chunk
+        self.pos = 0
+        self.eof = len(chunk) == 0
+        return not self.eof
+
+    def peek(self):
+        """Return the next non-whitespace character, or "" at the end."""
+        while True:
+            self.pos = _whitespace.match(self.text, self.pos).end()
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self.fill():
+                return ""
+
+    def expect(self, chars):
+        """Consume the next non-whitespace character if it is in chars."""
+        c = self.peek()
+        if c == "" or c not in chars:
+            raise ValueError("Expecting one of {!r} at {!r}".format(
+                chars, self.text[self.pos:self.pos + 20]))
+        self.pos += 1
+        return c
+
+    def decode(self):
+        """Consume and return the next JSON value."""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.text, self.pos)
+                if end < len(self.text) or self.eof:
+                    self.pos = end
+                    return value
+            except ValueError:
+                if self.eof:
+                    raise
+            self.fill()
+
+
+def iter_object(f, chunk_size=65536):
+    """Yield the key/value pairs of the JSON object stored in f one at a
+    time, so that memory use is bounded by the largest value rather than
+    the size of the file.
+    Args:
+        f (file): A text file holding a JSON object.
+        chunk_size (int): The number of characters to read at once.
+    """
+    buf = _Buffer(f, chunk_size)
+    buf.expect("{")
+    if buf.peek() == "}":
+        buf.expect("}")
+        return
+    while True:
+        key = buf.decode()
+        if type(key) is not str:
+            raise ValueError("Expecting a string key, got {!r}".format(key))
+        buf.expect(":")
+        yield key, buf.decode()
+        if buf.expect(",}") == "}":
+            return
@@ -0,0 +1,200 @@
+#!/usr/bin/python3
+"""Defines the Query class."""
+import operator
+from models.engine.indexes import histogram, is_number, summarize
+
+operators = {
+    "eq": operator.eq,
+    "ne": operator.ne,
+    "lt": operator.lt,
+    "le": operator.le,
+    "gt": operator.gt,
+    "ge": operator.ge,
+    "in": lambda a, b: a in b
+}
+"""dict: The comparisons available to where(), by suffix."""
+
+aggregates = ("count", "sum", "avg", "min", "max")
+"""tuple: The functions available to aggregate()."""
+
+
+class Query:
+    """Represent a query over the objects of one class of a storage engine.
+    Queries are built by chaining where(), order_by() and limit(), each of
+    which returns a new Query, and run by all(), first(), count() or by
+    iterating over them. The engine plans how to find candidate objects,
+    e.g. through an index, and the query checks every filter on them.
+    Queries are summarized by aggregate() and histogram(), which the
+    engine may compute without going through the objects.
+    """
+
+    def __init__(self, cls_name, planner, aggregator=None):
+        """Initialize a new Query.
+        Args:
+            cls_name (str): The name of the class of the objects.
+            planner (callable): Called with cls_name, the filters, the
+                order and the limit, return a description of the plan,
+                the candidate objects and whether they come in the
+                requested order.
+            aggregator (callable): Called with cls_name, the filters, the
+                function, the attribute, the group attribute and the
+                histogram edges, return the result, or NotImplemented to
+                compute it from the objects.
+        """
+        self.__cls_name = cls_name
+        self.__planner = planner
+        self.__aggregator = aggregator
+        self.__filters = []
+        self.__order = []
+        self.__limit = None
+
+    def __copy(self):
+        """Return a copy of the query to build on."""
+        query = Query(self.__cls_name, self.__planner, self.__aggregator)
+        query.__filters = list(self.__filters)
+        query.__order = list(self.__order)
+        query.__limit = self.__limit
+        return query
+
+    def where(self, **conditions):
+        """Return the query restricted to objects meeting all conditions.
+        Each keyword is an attribute name, optionally followed by two
+        underscores and one of the operators, e.g. city_id=id,
+        price_by_night__lt=100 or max_guest__ge=4. Without an operator the
+        attribute must equal the value.
+        """
+        query = self.__copy()
+        for name, value in conditions.items():
+            attr, sep, op = name.rpartition("__")
+            if sep == "" or attr == "":
+                attr, op = name, "eq"
+            if op not in operators:
+                raise ValueError("Unknown operator: {}".format(op))
+            query.__filters.append((attr, op, value))
+        return query
+
+    def order_by(self, *attrs):
+        """Return the query sorted by the attributes attrs, in descending
+        order for those starting with "-". Objects lacking an attribute
+        come last."""
+        query = self.__copy()
+        for attr in attrs:
+            if attr.startswith("-"):
+                query.__order.append((attr[1:], True))
+            else:
+                query.__order.append((attr, False))
+        return query
+
+    def limit(self, n):
+        """Return the query stopping after n objects."""
+        if type(n) is not int or n < 0:
+            raise ValueError("limit must be a non-negative int")
+        query = self.__copy()
+        query.__limit = n
+        return query
+
+    def matches(self, obj):
+        """Return whether obj meets every filter of the query."""
+        for attr, op, value in self.__filters:
+            try:
+                if not operators[op](getattr(obj, attr, None), value):
+                    return False
+            except TypeError:
+                return False
+        return True
+
+    def __sorted(self, objs):
+        """Return objs sorted by the order of the query."""
+        objs = list(objs)
+        for attr, reverse in reversed(self.__order):
+            present = [o for o in objs if getattr(o, attr, None) is not None]
+            absent = [o for o in objs if getattr(o, attr, None) is None]
+            present.sort(key=lambda o: getattr(o, attr), reverse=reverse)
+            objs = present + absent
+        return objs
+
+    def explain(self):
+        """Return a description of how the engine finds the objects."""
+        return self.__planner(self.__cls_name, self.__filters,
+                              self.__order, self.__limit)[0]
+
+    def __iter__(self):
+        """Iterate over the objects of the query."""
+        plan, objs, ordered = self.__planner(self.__cls_name, self.__filters,
+                                             self.__order, self.__limit)
+        objs = (o for o in objs if self.matches(o))
+        if len(self.__order) != 0 and not ordered:
+            objs = iter(self.__sorted(objs))
+        for i, obj in enumerate(objs):
+            if i == self.__limit:
+                return
+            yield obj
+
+    def all(self):
+        """Return a list of the objects of the query."""
+        return list(self)
+
+    def first(self):
+        """Return the first object of the query, or None."""
+        for obj in self.limit(1):
+            return obj
+        return None
+
+    def count(self):
+        """Return the number of objects of the query."""
+        return sum(1 for obj in self)
+
+    def __summarize(self, fn, attr, by, edges):
+        """Return the result of the aggregator, or NotImplemented."""
+        if self.__aggregator is None or self.__limit is not None:
+            return NotImplemented
+        return self.__aggregator(self.__cls_name, self.__filters, fn, attr,
+                                 by, edges)
+
+    def aggregate(self, fn, attr=None, by=None):
+        """Return fn, one of "count", "sum", "avg", "min" or "max", of the
+        attribute attr over the objects of the query. Sums, averages and
+        extremes are floats of the objects whose attr is a number, and
+        None over no numbers but for sums. Grouped by the attribute by,
+        return a dictionary of the results by value of by, e.g.
+        query.aggregate("avg", "price_by_night", by="city_id").
+        """
+        if fn not in aggregates:
+            raise ValueError("Unknown aggregate: {}".format(fn))
+        if fn != "count" and attr is None:
+            raise ValueError("{} needs an attribute".format(fn))
+        result = self.__summarize(fn, attr, by, None)
+        if result is not NotImplemented:
+            return result
+        groups = {}
+        for obj in self:
+            group = groups.setdefault(
+                getattr(obj, by, None) if by is not None else None, [])
+            value = getattr(obj, attr, None) if attr is not None else 0
+            if is_number(value):
+                group.append(value)
+        results = {}
+        for value, numbers in groups.items():
+            if fn == "count":
+                results[value] = len(numbers)
+            else:
+                results[value] = summarize(fn, numbers)
+        if by is not None:
+            return results
+        return results.get(None, 0 if fn == "count" else summarize(fn, []))
+
+    def histogram(self, attr, edges):
+        """Return the number of objects of the query whose attribute attr
+        falls in each bin between consecutive edges, e.g.
+        query.histogram("max_guest", [1, 2, 4, 8, 16]). Bins include their
+        lower edge, and the last one its upper edge.
+        """
+        edges = list(edges)
+        if (len(edges) < 2 or not all(is_number(e) for e in edges) or
+                any(a >= b for a, b in zip(edges, edges[1:]))):
+            raise ValueError("edges must be at least two increasing numbers")
+        result = self.__summarize("histogram", attr, None, edges)
+        if result is not NotImplemented:
+            return result
+        values = (getattr(obj, attr, None) for obj in self)
+        return histogram([v for v in values if is_number(v)], edges)
@@ -0,0 +1,75 @@
+#!/usr/bin/python3
+"""Defines the RWLock class."""
+import threading
+from contextlib import contextmanager
+
+
+class RWLock:
+    """Represent a lock held by any number of readers or by one writer.
+    Waiting writers go before new readers so that they are not starved.
+    The writer may take the lock again, to read or to write, and a reader
+    may take it again to read, but not to write.
+    """
+
+    def __init__(self):
+        """Initialize a new RWLock."""
+        self.__cond = threading.Condition(threading.Lock())
+        self.__readers = 0
+        self.__writer = None
+        self.__depth = 0
+        self.__waiting = 0
+        self.__local = threading.local()
+
+    @contextmanager
+    def read(self):
+        """Hold the lock for reading for the duration of the block."""
+        me = threading.get_ident()
+        depth = getattr(self.__local, "depth", 0)
+        if self.__writer == me or depth > 0:
+            self.__local.depth = depth + 1
+            try:
+                yield
+            finally:
+                self.__local.depth = depth
+            return
+        with self.__cond:
+            while self.__writer is not None or self.__waiting > 0:
+                self.__cond.wait()
+            self.__readers += 1
+        self.__local.depth = 1
+        try:
+            yield
+        finally:
+            self.__local.depth = 0
+            with self.__cond:
+                self.__readers -= 1
+                if self.__readers == 0:
+                    self.__cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        """Hold the lock for writing for the duration of the block.
+        Raise RuntimeError if the thread only holds it for reading.
+        """
+        me = threading.get_ident()
+        with self.__cond:
+            if self.__writer != me:
+                if getattr(self.__local, "depth", 0) > 0:
+                    raise RuntimeError("cannot write while holding the "
+                                       "lock for reading")
+                self.__waiting += 1
+                try:
+                    while self.__writer is not None or self.__readers > 0:
+                        self.__cond.wait()
+                finally:
+                    self.__waiting -= 1
+                self.__writer = me
+            self.__depth += 1
+        try:
+            yield
+        finally:
+            with self.__cond:
+                self.__depth -= 1
+                if self.__depth == 0:
+                    self.__writer = None
+                    self.__cond.notify_all()
@@ -0,0 +1,65 @@
+#!/usr/bin/python3
+"""Defines the Snapshot class."""
+from collections.abc import Mapping
+
+missing = object()
+"""object: Kept for the keys that did not exist when a snapshot was taken."""
+
+
+class Snapshot(Mapping):
+    """Represent a read-only view of the objects of a storage engine by
+    <class name>.id, as they were when the snapshot was taken.
+    The view shares the live dictionary of the engine and only keeps the
+    prior value of the keys changed since, which the engine hands over
+    with keep() before each change. Objects are kept as shallow copies, so
+    lists held by an object must be replaced rather than changed in place.
+    """
+
+    def __init__(self, source, lock):
+        """Initialize a new Snapshot.
+        Args:
+            source (callable): Return the live dictionary of objects.
+            lock (RWLock): The lock the engine changes source under.
+        """
+        self.__source = source
+        self.__lock = lock
+        self.__kept = {}
+        self.__len = len(source())
+
+    def keeps(self, key):
+        """Return whether the prior value of key was kept already."""
+        return key in self.__kept
+
+    def keep(self, key, value):
+        """Keep value as the one key had when the snapshot was taken, or
+        missing if it had none, unless one was kept already."""
+        if key not in self.__kept:
+            self.__kept[key] = value
+
+    def __getitem__(self, key):
+        """Return the object stored under key when the snapshot was taken."""
+        with self.__lock.read():
+            if key in self.__kept:
+                value = self.__kept[key]
+            else:
+                value = self.__source().get(key, missing)
+        if value is missing:
+            raise KeyError(key)
+        return value
+
+    def __iter__(self):
+        """Iterate over the keys stored when the snapshot was taken."""
+        with self.__lock.read():
+            live = list(self.__source().keys())
+            kept = dict(self.__kept)
+        for key in live:
+            if kept.get(key) is not missing:
+                yield key
+        live = set(live)
+        for key, value in kept.items():
+            if value is not missing and key not in live:
+                yield key
+
+    def __len__(self):
+        """Return the number of objects in the snapshot."""
+        return self.__len
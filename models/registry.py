@@ -0,0 +1,20 @@
+#!/usr/bin/python3
+"""Defines the registry of model classes by name."""
+from models.base_model import BaseModel
+from models.user import User
+from models.state import State
+from models.city import City
+from models.place import Place
+from models.amenity import Amenity
+from models.review import Review
+
+classes = {
+    "BaseModel": BaseModel,
+    "User": User,
+    "State": State,
+    "City": City,
+    "Place": Place,
+    "Amenity": Amenity,
+    "Review": Review
+}
+"""dict: The model classes the storage engines and console know by name."""
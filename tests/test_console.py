@@ -9,10 +9,12 @@ Unittest classes:
     TestHBNBCommand_all
     TestHBNBCommand_destroy
     TestHBNBCommand_update
+    TestHBNBCommand_update_literals
 """
 import os
 import sys
 import unittest
+from ast import literal_eval
 from models import storage
 from models.engine.file_storage import FileStorage
 from console import HBNBCommand
@@ -73,7 +75,10 @@ class TestHBNBCommand_help(unittest.TestCase):
         h = ("Usage: all or all <class> or <class>.all()\n        "
              "Display string representations of all instances of a given class"
              ".\n        If no class is specified, displays all instantiated "
-             "objects.")
+             "objects.\n        With --limit <n> and --after <cursor>, "
+             "displays a page of n objects\n        followed by the --after "
+             "option of the next page, if any.\n        With --stream, "
+             "displays one object per line as they are read.")
         with patch("sys.stdout", new=StringIO()) as output:
             self.assertFalse(HBNBCommand().onecmd("help all"))
             self.assertEqual(h, output.getvalue().strip())
@@ -850,6 +855,61 @@ class TestHBNBCommand_all(unittest.TestCase):
             self.assertIn("Review", output.getvalue().strip())
             self.assertNotIn("BaseModel", output.getvalue().strip())
 
+    def test_all_pages(self):
+        for i in range(3):
+            with patch("sys.stdout", new=StringIO()) as output:
+                self.assertFalse(HBNBCommand().onecmd("create State"))
+        ids = []
+        command = "all State --limit 2"
+        while True:
+            with patch("sys.stdout", new=StringIO()) as output:
+                self.assertFalse(HBNBCommand().onecmd(command))
+                lines = output.getvalue().strip().split("\n")
+            page = literal_eval(lines[0])
+            self.assertLessEqual(len(page), 2)
+            ids.extend(s.split()[1][1:-1] for s in page)
+            if len(lines) == 1:
+                break
+            self.assertTrue(lines[1].startswith("--after State."))
+            command = "State.all(--limit 2 {})".format(lines[1])
+        self.assertEqual(sorted(obj.id for obj in
+                                storage.all("State").values()), ids)
+
+    def test_all_page_all_classes(self):
+        with patch("sys.stdout", new=StringIO()) as output:
+            self.assertFalse(HBNBCommand().onecmd("create User"))
+        with patch("sys.stdout", new=StringIO()) as output:
+            self.assertFalse(HBNBCommand().onecmd("all --limit 1"))
+            lines = output.getvalue().strip().split("\n")
+        self.assertEqual(1, len(literal_eval(lines[0])))
+
+    def test_all_stream(self):
+        with patch("sys.stdout", new=StringIO()) as output:
+            self.assertFalse(HBNBCommand().onecmd("create Amenity"))
+            testID = output.getvalue().strip()
+        with patch("sys.stdout", new=StringIO()) as output:
+            self.assertFalse(HBNBCommand().onecmd("all Amenity --stream"))
+            lines = output.getvalue().strip().split("\n")
+        self.assertEqual(sorted(str(obj) for obj in
+                                storage.all("Amenity").values()), lines)
+        self.assertIn("[Amenity] ({})".format(testID), "\n".join(lines))
+        with patch("sys.stdout", new=StringIO()) as output:
+            self.assertFalse(HBNBCommand().onecmd("Amenity.all(--stream "
+                                                  "--limit 1)"))
+            self.assertEqual(lines[0], output.getvalue().strip())
+
+    def test_all_invalid_page(self):
+        for command in ["all State --limit 0", "all State --limit x",
+                        "all --limit", "all --limit \u00b2"]:
+            with patch("sys.stdout", new=StringIO()) as output:
+                self.assertFalse(HBNBCommand().onecmd(command))
+                self.assertEqual("** invalid limit **",
+                                 output.getvalue().strip())
+        with patch("sys.stdout", new=StringIO()) as output:
+            self.assertFalse(HBNBCommand().onecmd("all State --after"))
+            self.assertEqual("** cursor missing **",
+                             output.getvalue().strip())
+
 
 class TestHBNBCommand_update(unittest.TestCase):
     """Unittests for testing update from the HBNB command interpreter."""
@@ -1565,5 +1625,63 @@ class TestHBNBCommand_count(unittest.TestCase):
             self.assertEqual("1", output.getvalue().strip())
 
 
+class TestHBNBCommand_update_literals(unittest.TestCase):
+    """Unittests for testing that update only accepts literal values."""
+
+    @classmethod
+    def setUp(self):
+        try:
+            os.rename("file.json", "tmp")
+        except IOError:
+            pass
+
+    @classmethod
+    def tearDown(self):
+        try:
+            os.remove("file.json")
+        except IOError:
+            pass
+        try:
+            os.rename("tmp", "file.json")
+        except IOError:
+            pass
+
+    def create(self, cls_name):
+        with patch("sys.stdout", new=StringIO()) as output:
+            HBNBCommand().onecmd("create {}".format(cls_name))
+            return output.getvalue().strip()
+
+    def test_update_expression_is_not_evaluated(self):
+        testId = self.create("User")
+        testCmd = "update User {} \"print('evaluated')\"".format(testId)
+        with patch("sys.stdout", new=StringIO()) as output:
+            self.assertFalse(HBNBCommand().onecmd(testCmd))
+            self.assertEqual("** value missing **", output.getvalue().strip())
+
+    def test_update_builtin_name_is_value_missing(self):
+        testId = self.create("User")
+        testCmd = "update User {} id".format(testId)
+        with patch("sys.stdout", new=StringIO()) as output:
+            self.assertFalse(HBNBCommand().onecmd(testCmd))
+            self.assertEqual("** value missing **", output.getvalue().strip())
+
+    def test_update_dictionary_with_nested_literals(self):
+        testId = self.create("Place")
+        testCmd = "Place.update({}, ".format(testId)
+        testCmd += "{'amenity_ids': ['a', 'b'], 'max_guest': 4})"
+        HBNBCommand().onecmd(testCmd)
+        pl = storage.get("Place", testId)
+        self.assertEqual(['a', 'b'], pl.amenity_ids)
+        self.assertEqual(4, pl.max_guest)
+
+    def test_update_extra_arguments_ignored(self):
+        testId = self.create("City")
+        testCmd = "update City {} name Reno extra".format(testId)
+        with patch("sys.stdout", new=StringIO()) as output:
+            self.assertFalse(HBNBCommand().onecmd(testCmd))
+            self.assertEqual("", output.getvalue().strip())
+        self.assertEqual("Reno", storage.get("City", testId).name)
+
+
 if __name__ == "__main__":
     unittest.main()
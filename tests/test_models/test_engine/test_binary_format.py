@@ -0,0 +1,126 @@
+#!/usr/bin/python3
+"""Defines unittests for models/engine/binary_format.py.
+Unittest classes:
+    TestBinaryFormat
+    TestBinaryFormat_conversion
+"""
+import json
+import os
+import unittest
+from datetime import datetime
+from io import BytesIO
+from models.engine import binary_format
+
+
+class TestBinaryFormat(unittest.TestCase):
+    """Unittests for packing and unpacking binary snapshots."""
+
+    place = {"id": "0c2ee7a4-0f42-4a73-9d2f-4a0a3f3e8c11",
+             "created_at": "2017-09-28T21:05:54.119427",
+             "updated_at": "2017-09-28T21:05:54.119572",
+             "city_id": "0c2ee7a4-0f42-4a73-9d2f-4a0a3f3e8c12",
+             "name": "Loft", "number_rooms": 3, "latitude": 37.77,
+             "amenity_ids": ["a", "b"], "description": None,
+             "big": 2 ** 70, "__class__": "Place"}
+    user = {"id": "1", "created_at": "2017-09-28T21:05:54",
+            "updated_at": "2017", "first_name": "Betty",
+            "__class__": "User"}
+
+    def snapshot(self, *objs):
+        schemas = {}
+        records = [binary_format.pack_record(schemas, o) for o in objs]
+        return BytesIO(binary_format.pack_header(schemas) + b"".join(records))
+
+    def test_round_trip(self):
+        f = self.snapshot(self.place, self.user)
+        records = list(binary_format.iter_records(f))
+        self.assertEqual(["Place." + self.place["id"], "User.1"],
+                         [key for key, o in records])
+        place = records[0][1]
+        self.assertEqual(datetime(2017, 9, 28, 21, 5, 54, 119427),
+                         place["created_at"])
+        place["created_at"] = place["created_at"].isoformat()
+        place["updated_at"] = place["updated_at"].isoformat()
+        self.assertEqual(self.place, place)
+
+    def test_unparsed_timestamps_stay_strings(self):
+        f = self.snapshot(self.user)
+        self.assertEqual(self.user, next(binary_format.iter_records(f))[1])
+
+    def test_schema_grows(self):
+        schemas = {}
+        short = {"id": "1", "__class__": "User"}
+        binary_format.pack_record(schemas, short)
+        record = binary_format.pack_record(schemas, self.user)
+        self.assertEqual(["id", "created_at", "updated_at", "first_name"],
+                         schemas["User"])
+        key, o = binary_format.unpack_record(schemas, record)
+        self.assertEqual(self.user, o)
+
+    def test_absent_attribute(self):
+        schemas = {}
+        binary_format.pack_record(schemas, self.user)
+        record = binary_format.pack_record(schemas, {"id": "2",
+                                                     "__class__": "User"})
+        key, o = binary_format.unpack_record(schemas, record)
+        self.assertEqual({"id": "2", "__class__": "User"}, o)
+
+    def test_smaller_than_json(self):
+        packed = binary_format.pack_record({}, self.place)
+        self.assertLess(len(packed), len(json.dumps(self.place)) * 3 / 4)
+
+    def test_not_binary(self):
+        with self.assertRaises(ValueError):
+            binary_format.read_header(BytesIO(b"{}"))
+
+    def test_unsupported_version(self):
+        f = BytesIO(binary_format.MAGIC + b"\x02\x00\x00\x00\x00\x00")
+        with self.assertRaises(ValueError):
+            binary_format.read_header(f)
+
+    def test_truncated(self):
+        data = self.snapshot(self.place).getvalue()
+        with self.assertRaises(ValueError):
+            list(binary_format.iter_records(BytesIO(data[:-3])))
+
+
+class TestBinaryFormat_conversion(unittest.TestCase):
+    """Unittests for converting snapshots between JSON and binary."""
+
+    objdict = {
+        "User.1": {"id": "1", "first_name": "Betty",
+                   "created_at": "2017-09-28T21:05:54.119427",
+                   "updated_at": "2017-09-28T21:05:54.119572",
+                   "__class__": "User"},
+        "Place.2": {"id": "2", "name": "Loft", "amenity_ids": ["a"],
+                    "latitude": 37.77, "__class__": "Place"}
+    }
+
+    def tearDown(self):
+        for name in ["test.json", "test.bin", "test2.json"]:
+            try:
+                os.remove(name)
+            except IOError:
+                pass
+
+    def test_round_trip(self):
+        with open("test.json", "w") as f:
+            json.dump(self.objdict, f)
+        binary_format.json_to_binary("test.json", "test.bin")
+        with open("test.bin", "rb") as f:
+            self.assertEqual(binary_format.MAGIC, f.read(5))
+        binary_format.binary_to_json("test.bin", "test2.json")
+        with open("test2.json", "r") as f:
+            self.assertEqual(self.objdict, json.load(f))
+
+    def test_empty(self):
+        with open("test.json", "w") as f:
+            f.write("{}")
+        binary_format.json_to_binary("test.json", "test.bin")
+        binary_format.binary_to_json("test.bin", "test2.json")
+        with open("test2.json", "r") as f:
+            self.assertEqual({}, json.load(f))
+
+
+if __name__ == "__main__":
+    unittest.main()
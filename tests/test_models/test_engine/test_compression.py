@@ -0,0 +1,68 @@
+#!/usr/bin/python3
+"""Defines unittests for models/engine/compression.py.
+Unittest classes:
+    TestCompression
+"""
+import io
+import unittest
+from models.engine import compression
+
+
+class TestCompression(unittest.TestCase):
+    """Unittests for compressing and decompressing snapshots."""
+
+    data = b"".join(b'"User.%d":{"id":"%d","__class__":"User"},\n' % (i, i)
+                    for i in range(5000))
+
+    def reader(self, data):
+        return compression.open_reader(io.BufferedReader(io.BytesIO(data)))
+
+    def test_round_trip(self):
+        for codec in compression.codecs:
+            packed = compression.compress(self.data, codec)
+            self.assertLess(len(packed), len(self.data) / 5)
+            self.assertEqual(codec, compression.detect(packed[:8]))
+            self.assertEqual(self.data, self.reader(packed).read())
+
+    def test_levels(self):
+        for codec in compression.codecs:
+            for level in [0, 1, 9]:
+                packed = compression.compress(self.data, codec, level)
+                self.assertEqual(self.data, self.reader(packed).read())
+
+    def test_small_reads(self):
+        packed = compression.compress(self.data, "zlib")
+        f = self.reader(packed)
+        chunks = []
+        while True:
+            chunk = f.read(7)
+            if len(chunk) == 0:
+                break
+            chunks.append(chunk)
+        self.assertEqual(self.data, b"".join(chunks))
+
+    def test_peek(self):
+        for codec in compression.codecs:
+            f = self.reader(compression.compress(self.data, codec))
+            self.assertEqual(b'"User', f.peek(5)[:5])
+            self.assertEqual(self.data, f.read())
+
+    def test_uncompressed(self):
+        for head in [b"{}", b"\x89HBNB", b"", b"x"]:
+            self.assertIsNone(compression.detect(head))
+        f = io.BufferedReader(io.BytesIO(b"{}"))
+        self.assertIs(f, compression.open_reader(f))
+
+    def test_truncated(self):
+        for codec in compression.codecs:
+            packed = compression.compress(self.data, codec)
+            with self.assertRaises(EOFError):
+                self.reader(packed[:len(packed) // 2]).read()
+
+    def test_unknown_codec(self):
+        with self.assertRaises(ValueError):
+            compression.compress(self.data, "zip")
+
+
+if __name__ == "__main__":
+    unittest.main()
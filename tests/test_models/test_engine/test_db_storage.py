@@ -0,0 +1,321 @@
+#!/usr/bin/python3
+"""Defines unittests for models/engine/db_storage.py.
+Unittest classes:
+    TestDBStorage_instantiation
+    TestDBStorage_methods
+"""
+import os
+import sqlite3
+import unittest
+from unittest.mock import patch
+from models.engine.db_storage import DBStorage
+from models.user import User
+from models.state import State
+from models.place import Place
+from models.city import City
+from models.review import Review
+
+
+class TestDBStorage_instantiation(unittest.TestCase):
+    """Unittests for testing instantiation of the DBStorage class."""
+
+    def test_DBStorage_instantiation_no_args(self):
+        self.assertEqual(type(DBStorage()), DBStorage)
+
+    def test_DBStorage_instantiation_with_arg(self):
+        with self.assertRaises(TypeError):
+            DBStorage(None)
+
+    def test_DBStorage_db_path_is_private_str(self):
+        self.assertEqual(str, type(DBStorage._DBStorage__db_path))
+
+
+class TestDBStorage_methods(unittest.TestCase):
+    """Unittests for testing methods of the DBStorage class."""
+
+    def setUp(self):
+        self.db_path = DBStorage._DBStorage__db_path
+        DBStorage._DBStorage__db_path = "test_hbnb.db"
+        self.storage = DBStorage()
+        self.storage.reload()
+
+    def tearDown(self):
+        self.storage.close()
+        DBStorage._DBStorage__db_path = self.db_path
+        for suffix in ["", "-wal", "-shm"]:
+            try:
+                os.remove("test_hbnb.db" + suffix)
+            except IOError:
+                pass
+
+    def reopen(self):
+        self.storage.close()
+        self.storage = DBStorage()
+        self.storage.reload()
+        return self.storage
+
+    def test_reload_creates_one_table_per_class(self):
+        conn = sqlite3.connect("test_hbnb.db")
+        tables = {row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table'")}
+        conn.close()
+        for name in ["BaseModel", "User", "State", "City", "Place",
+                     "Amenity", "Review"]:
+            self.assertIn(name, tables)
+
+    def test_wal_mode(self):
+        conn = self.storage._DBStorage__conn()
+        mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+        self.assertEqual("wal", mode)
+
+    def test_connection_is_reused(self):
+        conn = self.storage._DBStorage__conn()
+        self.assertIs(conn, self.storage._DBStorage__conn())
+
+    def test_new_and_save(self):
+        us = User()
+        us.email = "betty@holberton.com"
+        self.storage.new(us)
+        self.storage.save()
+        stored = self.reopen().get(User, us.id)
+        self.assertEqual(us.id, stored.id)
+        self.assertEqual("betty@holberton.com", stored.email)
+        self.assertEqual(us.created_at, stored.created_at)
+
+    def test_get_by_class_name(self):
+        st = State()
+        self.storage.new(st)
+        self.storage.save()
+        self.assertIs(st, self.storage.get("State", st.id))
+
+    def test_get_missing(self):
+        self.assertIsNone(self.storage.get(User, "1234"))
+        self.assertIsNone(self.storage.get("MyModel", "1234"))
+
+    def test_get_hydrates_once(self):
+        cy = City()
+        self.storage.new(cy)
+        self.storage.save()
+        storage = self.reopen()
+        self.assertIs(storage.get(City, cy.id), storage.get(City, cy.id))
+
+    def test_all(self):
+        pl = Place()
+        rv = Review()
+        self.storage.new(pl)
+        self.storage.new(rv)
+        self.storage.save()
+        objs = self.reopen().all()
+        self.assertEqual(dict, type(objs))
+        self.assertIn("Place." + pl.id, objs)
+        self.assertIn("Review." + rv.id, objs)
+
+    def test_all_with_class(self):
+        pl = Place()
+        rv = Review()
+        self.storage.new(pl)
+        self.storage.new(rv)
+        self.storage.save()
+        objs = self.reopen().all(Place)
+        self.assertEqual(["Place." + pl.id], list(objs.keys()))
+        self.assertEqual({}, self.storage.all("MyModel"))
+
+    def test_count(self):
+        for obj in [User(), User(), State()]:
+            self.storage.new(obj)
+        self.assertEqual(2, self.storage.count(User))
+        self.storage.save()
+        self.assertEqual(2, self.storage.count("User"))
+        self.assertEqual(3, self.storage.count())
+        self.assertEqual(0, self.storage.count("MyModel"))
+
+    def test_lookup(self):
+        cy = City()
+        cy.state_id = "1234"
+        self.storage.new(cy)
+        self.storage.save()
+        storage = self.reopen()
+        objs = storage.lookup(City, "state_id", "1234")
+        self.assertEqual(["City." + cy.id], list(objs.keys()))
+        self.assertEqual({}, storage.lookup(City, "state_id", "5678"))
+
+    def test_lookup_includes_unsaved(self):
+        rv = Review()
+        rv.place_id = "1234"
+        self.storage.new(rv)
+        self.assertIn("Review." + rv.id,
+                      self.storage.lookup(Review, "place_id", "1234"))
+
+    def test_lookup_uses_index(self):
+        conn = self.storage._DBStorage__conn()
+        plan = conn.execute(
+            "EXPLAIN QUERY PLAN SELECT data FROM \"Review\" WHERE "
+            "json_extract(data, '$.place_id') = ?", ("1234",)).fetchall()
+        self.assertIn("Review_place_id", str(plan))
+
+    def test_lookup_invalid_attribute(self):
+        with self.assertRaises(ValueError):
+            self.storage.lookup(City, "state_id') OR 1 --", "1")
+
+    def test_all_includes_unsaved(self):
+        pl = Place()
+        self.storage.new(pl)
+        self.assertIn("Place." + pl.id, self.storage.all())
+
+    def test_touch_saves_changes(self):
+        pl = Place()
+        self.storage.new(pl)
+        self.storage.save()
+        with patch("models.storage", self.storage):
+            pl.name = "Loft"
+        self.storage.save()
+        self.assertEqual("Loft", self.reopen().get(Place, pl.id).name)
+
+    def test_delete(self):
+        us = User()
+        self.storage.new(us)
+        self.storage.save()
+        self.storage.delete(us)
+        self.assertIsNone(self.storage.get(User, us.id))
+        self.assertNotIn("User." + us.id, self.storage.all())
+        self.storage.save()
+        self.assertIsNone(self.reopen().get(User, us.id))
+
+    def test_reload_drops_unsaved(self):
+        us = User()
+        self.storage.new(us)
+        self.storage.reload()
+        self.assertIsNone(self.storage.get(User, us.id))
+
+    def test_query(self):
+        for i in range(3):
+            pl = Place()
+            pl.city_id = "1234" if i < 2 else "5678"
+            pl.max_guest = i
+            self.storage.new(pl)
+        self.storage.save()
+        q = self.reopen().query(Place).where(city_id="1234", max_guest__ge=1)
+        self.assertEqual("index Place.city_id = '1234'", q.explain())
+        self.assertEqual([1], [pl.max_guest for pl in q])
+        self.assertEqual("scan Place", self.storage.query(Place).explain())
+
+    def test_geo(self):
+        for lat, lon in [(37.7749, -122.4194), (34.0522, -118.2437)]:
+            pl = Place()
+            pl.latitude, pl.longitude = lat, lon
+            self.storage.new(pl)
+        self.storage.save()
+        storage = self.reopen()
+        self.assertEqual([37.7749], [pl.latitude for pl in storage.within(
+            Place, 37, -123, 38, -122).values()])
+        self.assertEqual([34.0522], [pl.latitude for pl in storage.near(
+            Place, 34, -118, 50)])
+        self.assertEqual([34.0522, 37.7749], [pl.latitude for pl in
+                                              storage.nearest(Place, 0, 0, 2)])
+
+    def test_geo_includes_unsaved(self):
+        pl = Place()
+        pl.latitude, pl.longitude = 34.0522, -118.2437
+        self.storage.new(pl)
+        self.assertEqual([pl], self.storage.near(Place, 34, -118, 50))
+        self.assertEqual([pl], self.storage.nearest(Place, -34, 62))
+        self.storage.save()
+        self.storage.delete(pl)
+        self.assertEqual({}, self.storage.within(Place, 33, -119, 35, -118))
+
+    def test_geo_across_antimeridian(self):
+        pl = Place()
+        pl.latitude, pl.longitude = -17.7134, 178.065
+        self.storage.new(pl)
+        self.storage.save()
+        self.assertEqual(["Place." + pl.id], list(self.reopen().within(
+            Place, -18, 170, -17, -170).keys()))
+        self.assertEqual(1, len(self.storage.near(Place, -17.7, -179.9, 300)))
+
+    def test_geo_uses_index(self):
+        conn = self.storage._DBStorage__conn()
+        plan = conn.execute(
+            "EXPLAIN QUERY PLAN SELECT data FROM \"Place\" WHERE "
+            "json_extract(data, '$.latitude') BETWEEN ? AND ? AND "
+            "json_extract(data, '$.longitude') BETWEEN ? AND ?",
+            (33, 35, -119, -118)).fetchall()
+        self.assertIn("Place_latitude_longitude", str(plan))
+
+    def test_search(self):
+        for text in ["Quiet garden", "Garden, garden", "Noisy"]:
+            rv = Review()
+            rv.text = text
+            self.storage.new(rv)
+        self.storage.save()
+        storage = self.reopen()
+        self.assertEqual(["Garden, garden", "Quiet garden"],
+                         [rv.text for rv in storage.search(Review, "garden")])
+        self.assertEqual([], storage.search(User, "garden"))
+
+    def test_search_follows_saves(self):
+        reviews = []
+        for text in ["Quiet garden", "Noisy"]:
+            reviews.append(Review())
+            reviews[-1].text = text
+            self.storage.new(reviews[-1])
+        self.storage.save()
+        reviews[1].text = "Noisy garden"
+        self.storage.touch(reviews[1])
+        self.storage.delete(reviews[0])
+        self.assertEqual([], self.storage.search(Review, "garden"))
+        self.storage.save()
+        self.assertEqual([reviews[1]], self.storage.search(Review, "garden"))
+        self.assertEqual([], self.storage.search(Review, "quiet"))
+        self.assertEqual([], self.storage.search(Review, "?!"))
+
+    def test_search_table_filled_on_reload(self):
+        pl = Place()
+        pl.name = "Garden loft"
+        self.storage.new(pl)
+        self.storage.save()
+        conn = self.storage._DBStorage__conn()
+        with conn:
+            conn.execute('DROP TABLE "Place_text"')
+        self.assertEqual([pl.id], [obj.id for obj in self.reopen().search(
+            Place, "loft")])
+
+    def test_page(self):
+        states = []
+        for i in range(3):
+            states.append(State())
+            self.storage.new(states[-1])
+        self.storage.save()
+        storage = self.reopen()
+        ids = sorted(st.id for st in states)
+        objs, cursor = storage.page(State, 2)
+        self.assertEqual(ids[:2], [st.id for st in objs])
+        us = User()
+        storage.new(us)
+        storage.delete(storage.get(State, ids[2]))
+        objs, cursor = storage.page(limit=2, after=cursor)
+        self.assertEqual([us.id], [obj.id for obj in objs])
+        self.assertIsNone(cursor)
+
+    def test_stream(self):
+        states = [State() for i in range(3)]
+        for st in states:
+            self.storage.new(st)
+        self.storage.save()
+        self.assertEqual(sorted(st.id for st in states), [
+            st.id for st in self.reopen().stream(State, batch=2)])
+
+    def test_snapshot(self):
+        us = User()
+        self.storage.new(us)
+        snap = self.storage.snapshot()
+        self.assertIs(us, snap["User." + us.id])
+        with self.assertRaises(TypeError):
+            snap["User.1234"] = us
+
+    def test_save_with_arg(self):
+        with self.assertRaises(TypeError):
+            self.storage.save(None)
+
+
+if __name__ == "__main__":
+    unittest.main()
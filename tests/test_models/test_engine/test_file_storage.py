@@ -3,13 +3,41 @@
 Unittest classes:
     TestFileStorage_instantiation
     TestFileStorage_methods
+    TestFileStorage_journal
+    TestFileStorage_incremental_save
+    TestFileStorage_lookup
+    TestFileStorage_lazy
+    TestFileStorage_durability
+    TestFileStorage_write_behind
+    TestFileStorage_transaction
+    TestFileStorage_binary
+    TestFileStorage_compression
+    TestFileStorage_compaction
+    TestFileStorage_shared
+    TestFileStorage_threads
+    TestFileStorage_snapshot
+    TestFileStorage_query
+    TestFileStorage_geo
+    TestFileStorage_search
+    TestFileStorage_page
+    TestFileStorage_cache
+    TestFileStorage_columns
 """
+import gc
+import glob
 import os
 import json
 import models
+import subprocess
+import sys
+import threading
 import unittest
+from collections import OrderedDict
 from datetime import datetime
+from time import sleep
+from unittest.mock import patch
 from models.base_model import BaseModel
+from models.engine import indexes
 from models.engine.file_storage import FileStorage
 from models.user import User
 from models.state import State
@@ -18,6 +46,30 @@ from models.city import City
 from models.amenity import Amenity
 from models.review import Review
 
+suffixes = ["", ".log", ".log.1", ".lock", ".search"]
+
+
+def backup_files():
+    """Move file.json and the files kept next to it out of the way."""
+    for suffix in suffixes:
+        try:
+            os.rename("file.json" + suffix, "tmp" + suffix)
+        except IOError:
+            pass
+
+
+def restore_files():
+    """Remove the files written by a test and move the backups back."""
+    for suffix in suffixes:
+        try:
+            os.remove("file.json" + suffix)
+        except IOError:
+            pass
+        try:
+            os.rename("tmp" + suffix, "file.json" + suffix)
+        except IOError:
+            pass
+
 
 class TestFileStorage_instantiation(unittest.TestCase):
     """Unittests for testing instantiation of the FileStorage class."""
@@ -64,9 +116,35 @@ class TestFileStorage_methods(unittest.TestCase):
     def test_all(self):
         self.assertEqual(dict, type(models.storage.all()))
 
-    def test_all_with_arg(self):
-        with self.assertRaises(TypeError):
-            models.storage.all(None)
+    def test_all_with_None(self):
+        self.assertIs(models.storage.all(), models.storage.all(None))
+
+    def test_all_with_class(self):
+        us = User()
+        pl = Place()
+        self.assertEqual({"User." + us.id: us}, models.storage.all(User))
+        self.assertEqual({"Place." + pl.id: pl}, models.storage.all("Place"))
+        self.assertEqual({}, models.storage.all("MyModel"))
+
+    def test_all_with_class_after_delete(self):
+        us = User()
+        models.storage.delete(us)
+        self.assertNotIn("User." + us.id, models.storage.all(User))
+
+    def test_all_with_class_after_objects_replaced(self):
+        User()
+        FileStorage._FileStorage__objects = {}
+        us = User()
+        self.assertEqual({"User." + us.id: us}, models.storage.all(User))
+
+    def test_count(self):
+        User()
+        User()
+        Review()
+        self.assertEqual(3, models.storage.count())
+        self.assertEqual(2, models.storage.count(User))
+        self.assertEqual(1, models.storage.count("Review"))
+        self.assertEqual(0, models.storage.count("MyModel"))
 
     def test_new(self):
         bm = BaseModel()
@@ -155,6 +233,9 @@ class TestFileStorage_methods(unittest.TestCase):
         models.storage.save()
         models.storage.reload()
         objs = FileStorage._FileStorage__objects
+        self.assertEqual(1, models.storage.count(Review))
+        self.assertIs(objs["Review." + rv.id],
+                      models.storage.all(Review)["Review." + rv.id])
         self.assertIn("BaseModel." + bm.id, objs)
         self.assertIn("User." + us.id, objs)
         self.assertIn("State." + st.id, objs)
@@ -163,6 +244,15 @@ class TestFileStorage_methods(unittest.TestCase):
         self.assertIn("Amenity." + am.id, objs)
         self.assertIn("Review." + rv.id, objs)
 
+    def test_get(self):
+        us = User()
+        self.assertIs(us, models.storage.get(User, us.id))
+        self.assertIs(us, models.storage.get("User", us.id))
+
+    def test_get_missing(self):
+        self.assertIsNone(models.storage.get(User, "1234"))
+        self.assertIsNone(models.storage.get("MyModel", "1234"))
+
 import os
 
 def test_reload_no_file(self):
@@ -176,5 +266,1757 @@ def test_reload_no_file(self):
             models.storage.reload(None)
 
 
+class TestFileStorage_journal(unittest.TestCase):
+    """Unittests for testing the journaled save mode of FileStorage."""
+
+    def setUp(self):
+        backup_files()
+        FileStorage._FileStorage__objects = {}
+        FileStorage._FileStorage__changed = set()
+        FileStorage._FileStorage__journal = True
+
+    def tearDown(self):
+        FileStorage._FileStorage__journal = False
+        restore_files()
+        FileStorage._FileStorage__objects = {}
+        FileStorage._FileStorage__changed = set()
+
+    def read_log(self):
+        with open("file.json.log", "r") as f:
+            return [json.loads(line) for line in f]
+
+    def test_save_appends_only_changes(self):
+        BaseModel()
+        us = User()
+        models.storage.save()
+        self.assertFalse(os.path.exists("file.json"))
+        self.assertEqual(2, len(self.read_log()))
+        us.first_name = "Betty"
+        models.storage.save()
+        records = self.read_log()
+        self.assertEqual(3, len(records))
+        self.assertEqual("Betty", records[-1]["User." + us.id]["first_name"])
+
+    def test_save_without_changes_appends_nothing(self):
+        BaseModel()
+        models.storage.save()
+        models.storage.save()
+        self.assertEqual(1, len(self.read_log()))
+
+    def test_delete_appends_tombstone(self):
+        rv = Review()
+        models.storage.save()
+        models.storage.delete(rv)
+        models.storage.save()
+        self.assertEqual({"Review." + rv.id: None}, self.read_log()[-1])
+
+    def test_reload_replays_snapshot_and_log(self):
+        bm = BaseModel()
+        st = State()
+        FileStorage._FileStorage__journal = False
+        models.storage.save()
+        FileStorage._FileStorage__journal = True
+        st.name = "California"
+        models.storage.delete(bm)
+        cy = City()
+        models.storage.save()
+        FileStorage._FileStorage__objects = {}
+        models.storage.reload()
+        objs = FileStorage._FileStorage__objects
+        self.assertNotIn("BaseModel." + bm.id, objs)
+        self.assertEqual("California", objs["State." + st.id].name)
+        self.assertIn("City." + cy.id, objs)
+
+    def test_reload_does_not_mark_changes(self):
+        BaseModel()
+        models.storage.save()
+        models.storage.reload()
+        models.storage.save()
+        self.assertEqual(1, len(self.read_log()))
+
+    def test_full_save_folds_log(self):
+        pl = Place()
+        models.storage.save()
+        FileStorage._FileStorage__journal = False
+        models.storage.save()
+        self.assertFalse(os.path.exists("file.json.log"))
+        with open("file.json", "r") as f:
+            self.assertIn("Place." + pl.id, f.read())
+
+    def test_reload_cuts_torn_record(self):
+        am = Amenity()
+        models.storage.save()
+        with open("file.json.log", "a") as f:
+            f.write('{"Amenity.1234": {"id": "12')
+        FileStorage._FileStorage__objects = {}
+        models.storage.reload()
+        self.assertIn("Amenity." + am.id, models.storage.all())
+        self.assertEqual(1, len(self.read_log()))
+
+
+class TestFileStorage_incremental_save(unittest.TestCase):
+    """Unittests for testing that save only encodes changed objects."""
+
+    def setUp(self):
+        backup_files()
+        FileStorage._FileStorage__objects = {}
+        FileStorage._FileStorage__changed = set()
+        FileStorage._FileStorage__cache = {}
+
+    def tearDown(self):
+        restore_files()
+        FileStorage._FileStorage__objects = {}
+        FileStorage._FileStorage__changed = set()
+        FileStorage._FileStorage__cache = {}
+
+    def count_to_dict(self):
+        return patch.object(BaseModel, "to_dict", autospec=True,
+                            side_effect=BaseModel.to_dict)
+
+    def test_setattr_marks_object_changed(self):
+        us = User()
+        models.storage.save()
+        self.assertEqual(set(), FileStorage._FileStorage__changed)
+        us.email = "betty@holberton.com"
+        self.assertEqual({"User." + us.id},
+                         FileStorage._FileStorage__changed)
+
+    def test_setattr_on_unstored_object_is_ignored(self):
+        us = User()
+        models.storage.save()
+        User(**us.to_dict()).email = "betty@holberton.com"
+        self.assertEqual(set(), FileStorage._FileStorage__changed)
+
+    def test_save_encodes_only_changed_objects(self):
+        BaseModel()
+        st = State()
+        BaseModel()
+        models.storage.save()
+        st.name = "Nevada"
+        with self.count_to_dict() as to_dict:
+            models.storage.save()
+            self.assertEqual(1, to_dict.call_count)
+        with self.count_to_dict() as to_dict:
+            models.storage.save()
+            self.assertEqual(0, to_dict.call_count)
+
+    def test_save_output_is_valid_json(self):
+        bm = BaseModel()
+        pl = Place()
+        models.storage.save()
+        pl.name = "Loft"
+        models.storage.delete(bm)
+        models.storage.save()
+        with open("file.json", "r") as f:
+            objdict = json.load(f)
+        self.assertEqual(["Place." + pl.id], list(objdict.keys()))
+        self.assertEqual("Loft", objdict["Place." + pl.id]["name"])
+
+    def test_reload_drops_cached_text(self):
+        cy = City()
+        models.storage.save()
+        with open("file.json", "r") as f:
+            objdict = json.load(f)
+        objdict["City." + cy.id]["name"] = "Reno"
+        with open("file.json", "w") as f:
+            json.dump(objdict, f)
+        models.storage.reload()
+        models.storage.save()
+        with open("file.json", "r") as f:
+            self.assertIn("Reno", f.read())
+
+
+class TestFileStorage_lookup(unittest.TestCase):
+    """Unittests for testing foreign key lookups of FileStorage."""
+
+    def setUp(self):
+        backup_files()
+        FileStorage._FileStorage__objects = {}
+        self.st = State()
+        self.cy = City()
+        self.cy.state_id = self.st.id
+        self.pl = Place()
+        self.pl.city_id = self.cy.id
+        self.rv = Review()
+        self.rv.place_id = self.pl.id
+
+    def tearDown(self):
+        restore_files()
+        FileStorage._FileStorage__objects = {}
+
+    def test_lookup(self):
+        cy_key = "City." + self.cy.id
+        rv_key = "Review." + self.rv.id
+        self.assertEqual({cy_key: self.cy},
+                         models.storage.lookup(City, "state_id", self.st.id))
+        self.assertEqual({rv_key: self.rv},
+                         models.storage.lookup("Review", "place_id",
+                                               self.pl.id))
+        self.assertEqual({}, models.storage.lookup(City, "state_id", "1"))
+
+    def test_lookup_after_update(self):
+        st = State()
+        self.cy.state_id = st.id
+        self.assertEqual({}, models.storage.lookup(City, "state_id",
+                                                   self.st.id))
+        self.assertIn("City." + self.cy.id,
+                      models.storage.lookup(City, "state_id", st.id))
+
+    def test_lookup_after_delete(self):
+        models.storage.delete(self.rv)
+        self.assertEqual({}, models.storage.lookup(Review, "place_id",
+                                                   self.pl.id))
+
+    def test_lookup_after_reload(self):
+        models.storage.save()
+        models.storage.reload()
+        rv = models.storage.lookup(Review, "place_id", self.pl.id)
+        self.assertIs(models.storage.get(Review, self.rv.id),
+                      rv["Review." + self.rv.id])
+
+    def test_lookup_after_objects_replaced(self):
+        FileStorage._FileStorage__objects = {}
+        cy = City()
+        cy.state_id = self.st.id
+        self.assertEqual({"City." + cy.id: cy},
+                         models.storage.lookup(City, "state_id", self.st.id))
+
+    def test_lookup_unindexed_attribute(self):
+        self.pl.name = "Loft"
+        self.assertEqual({"Place." + self.pl.id: self.pl},
+                         models.storage.lookup(Place, "name", "Loft"))
+
+    def test_indexes_built_per_class(self):
+        self.assertEqual(1, models.storage.count(City))
+        objs, cursor = models.storage.page(Review)
+        self.assertEqual(1, len(objs))
+        self.assertEqual(set(), FileStorage._FileStorage__built)
+        models.storage.lookup(City, "state_id", self.st.id)
+        self.assertEqual({"City"}, FileStorage._FileStorage__built)
+
+
+class TestFileStorage_lazy(unittest.TestCase):
+    """Unittests for testing lazy reloading of FileStorage."""
+
+    def setUp(self):
+        backup_files()
+        FileStorage._FileStorage__objects = {}
+        self.us = User()
+        self.us.first_name = "Betty"
+        self.pl = Place()
+        self.rv = Review()
+        self.rv.place_id = self.pl.id
+        models.storage.save()
+        FileStorage._FileStorage__objects = {}
+        FileStorage._FileStorage__lazy = True
+        models.storage.reload()
+
+    def tearDown(self):
+        FileStorage._FileStorage__lazy = False
+        FileStorage._FileStorage__unloaded = {}
+        restore_files()
+        FileStorage._FileStorage__objects = {}
+
+    def test_reload_decodes_nothing(self):
+        self.assertEqual({}, FileStorage._FileStorage__objects)
+
+    def test_count_without_decoding(self):
+        self.assertEqual(3, models.storage.count())
+        self.assertEqual(1, models.storage.count(User))
+        self.assertEqual({}, FileStorage._FileStorage__objects)
+
+    def test_page_decodes_page_only(self):
+        objs, cursor = models.storage.page(limit=1)
+        self.assertEqual(["Place." + self.pl.id],
+                         list(FileStorage._FileStorage__objects.keys()))
+        self.assertEqual([self.pl.id], [obj.id for obj in objs])
+        objs, cursor = models.storage.page(limit=5, after=cursor)
+        self.assertEqual([self.rv.id, self.us.id], [obj.id for obj in objs])
+        self.assertIsNone(cursor)
+
+    def test_get_decodes_one_object(self):
+        us = models.storage.get(User, self.us.id)
+        self.assertEqual("Betty", us.first_name)
+        self.assertIs(us, models.storage.get(User, self.us.id))
+        self.assertEqual(["User." + self.us.id],
+                         list(FileStorage._FileStorage__objects.keys()))
+
+    def test_all_with_class_decodes_class(self):
+        self.assertIn("Place." + self.pl.id, models.storage.all(Place))
+        self.assertEqual(["Place." + self.pl.id],
+                         list(FileStorage._FileStorage__objects.keys()))
+        self.assertEqual(3, models.storage.count())
+
+    def test_all_decodes_everything(self):
+        objs = models.storage.all()
+        self.assertEqual(3, len(objs))
+        self.assertEqual({}, FileStorage._FileStorage__unloaded)
+
+    def test_lookup(self):
+        rv = models.storage.lookup(Review, "place_id", self.pl.id)
+        self.assertEqual(["Review." + self.rv.id], list(rv.keys()))
+
+    def test_save_keeps_undecoded_objects(self):
+        us = models.storage.get(User, self.us.id)
+        us.last_name = "Holberton"
+        models.storage.save()
+        FileStorage._FileStorage__lazy = False
+        FileStorage._FileStorage__objects = {}
+        FileStorage._FileStorage__unloaded = {}
+        models.storage.reload()
+        self.assertEqual(3, models.storage.count())
+        us = models.storage.get(User, self.us.id)
+        self.assertEqual("Holberton", us.last_name)
+
+    def test_new_replaces_undecoded_object(self):
+        pl = Place(**self.pl.to_dict())
+        models.storage.new(pl)
+        self.assertEqual(3, models.storage.count())
+        self.assertIs(pl, models.storage.get(Place, self.pl.id))
+
+    def test_log_overrides_undecoded_object(self):
+        with open("file.json.log", "w") as f:
+            f.write(json.dumps({"Review." + self.rv.id: None}) + "\n")
+        models.storage.reload()
+        self.assertEqual(2, models.storage.count())
+        self.assertIsNone(models.storage.get(Review, self.rv.id))
+
+    def test_reload_other_layout_decodes_everything(self):
+        with open("file.json", "r") as f:
+            objdict = json.load(f)
+        with open("file.json", "w") as f:
+            json.dump(objdict, f)
+        models.storage.reload()
+        self.assertEqual(3, len(FileStorage._FileStorage__objects))
+        self.assertEqual({}, FileStorage._FileStorage__unloaded)
+
+    def test_reload_truncated_file_decodes_everything(self):
+        with open("file.json", "r") as f:
+            text = f.read()
+        with open("file.json", "w") as f:
+            f.write(text[:-3])
+        with self.assertRaises(ValueError):
+            models.storage.reload()
+
+
+class TestFileStorage_durability(unittest.TestCase):
+    """Unittests for testing atomic and grouped saves of FileStorage."""
+
+    def setUp(self):
+        backup_files()
+        FileStorage._FileStorage__objects = {}
+
+    def tearDown(self):
+        FileStorage._FileStorage__sync = False
+        FileStorage._FileStorage__window = 0
+        restore_files()
+        FileStorage._FileStorage__objects = {}
+
+    def test_interrupted_save_keeps_file(self):
+        us = User()
+        models.storage.save()
+        with open("file.json", "r") as f:
+            saved = f.read()
+        us.first_name = "Betty"
+        with patch("os.replace", side_effect=OSError):
+            with self.assertRaises(OSError):
+                models.storage.save()
+        with open("file.json", "r") as f:
+            self.assertEqual(saved, f.read())
+
+    def test_no_fsync_by_default(self):
+        User()
+        with patch("os.fsync") as fsync:
+            models.storage.save()
+            self.assertEqual(0, fsync.call_count)
+
+    def test_sync_save(self):
+        FileStorage._FileStorage__sync = True
+        User()
+        with patch("os.fsync", wraps=os.fsync) as fsync:
+            models.storage.save()
+            self.assertEqual(2, fsync.call_count)
+        self.assertEqual([], glob.glob("file.json.*tmp"))
+
+    def test_temporary_files_are_unique(self):
+        User()
+        with patch("os.replace", wraps=os.replace) as replace:
+            models.storage.save()
+            User()
+            models.storage.save()
+        first, second = [c[0][0] for c in replace.call_args_list]
+        self.assertNotEqual(first, second)
+        self.assertTrue(first.startswith("file.json."))
+        self.assertNotEqual("file.json.tmp", first)
+
+    def test_interrupted_save_removes_temporary_file(self):
+        User()
+        with patch("os.replace", side_effect=OSError):
+            with self.assertRaises(OSError):
+                models.storage.save()
+        self.assertEqual([], glob.glob("file.json.*tmp"))
+
+    def test_sync_journal(self):
+        FileStorage._FileStorage__sync = True
+        FileStorage._FileStorage__journal = True
+        try:
+            User()
+            with patch("os.fsync", wraps=os.fsync) as fsync:
+                models.storage.save()
+                self.assertEqual(1, fsync.call_count)
+        finally:
+            FileStorage._FileStorage__journal = False
+
+    def test_group_commit(self):
+        FileStorage._FileStorage__window = 0.2
+        objs = [User() for i in range(5)]
+        threads = [threading.Thread(target=models.storage.save)
+                   for i in range(5)]
+        write = FileStorage._FileStorage__write
+        with patch.object(FileStorage, "_FileStorage__write",
+                          autospec=True, side_effect=write) as mock_write:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(1, mock_write.call_count)
+        with open("file.json", "r") as f:
+            text = f.read()
+        for obj in objs:
+            self.assertIn("User." + obj.id, text)
+        self.assertEqual(FileStorage._FileStorage__requested,
+                         FileStorage._FileStorage__committed)
+
+    def test_group_commit_single_save(self):
+        FileStorage._FileStorage__window = 0.01
+        us = User()
+        models.storage.save()
+        with open("file.json", "r") as f:
+            self.assertIn("User." + us.id, f.read())
+
+
+class TestFileStorage_write_behind(unittest.TestCase):
+    """Unittests for testing background writes of FileStorage."""
+
+    def setUp(self):
+        backup_files()
+        FileStorage._FileStorage__objects = {}
+        FileStorage._FileStorage__delay = 0.2
+
+    def tearDown(self):
+        FileStorage._FileStorage__delay = 0
+        models.storage.flush()
+        restore_files()
+        FileStorage._FileStorage__objects = {}
+
+    def test_save_returns_before_writing(self):
+        User()
+        models.storage.save()
+        self.assertFalse(os.path.exists("file.json"))
+
+    def test_background_write(self):
+        us = User()
+        models.storage.save()
+        sleep(0.5)
+        with open("file.json", "r") as f:
+            self.assertIn("User." + us.id, f.read())
+
+    def test_saves_are_coalesced(self):
+        write = FileStorage._FileStorage__write
+        with patch.object(FileStorage, "_FileStorage__write",
+                          autospec=True, side_effect=write) as mock_write:
+            for i in range(5):
+                State().save()
+            sleep(0.5)
+            self.assertEqual(1, mock_write.call_count)
+
+    def test_flush(self):
+        pl = Place()
+        models.storage.save()
+        models.storage.flush()
+        with open("file.json", "r") as f:
+            self.assertIn("Place." + pl.id, f.read())
+
+    def test_flush_without_save(self):
+        Place()
+        models.storage.flush()
+        self.assertFalse(os.path.exists("file.json"))
+
+    def test_flusher_is_daemon(self):
+        models.storage.save()
+        self.assertTrue(FileStorage._FileStorage__flusher.daemon)
+
+    def test_flush_waits_for_write(self):
+        replace = FileStorage._FileStorage__replace
+
+        def slow_replace(storage, text):
+            sleep(0.5)
+            replace(storage, text)
+
+        us = User()
+        with patch.object(FileStorage, "_FileStorage__replace",
+                          autospec=True, side_effect=slow_replace):
+            models.storage.save()
+            sleep(0.3)
+            models.storage.flush()
+            with open("file.json", "r") as f:
+                self.assertIn("User." + us.id, f.read())
+
+    def test_exit_during_write(self):
+        script = ("import time\n"
+                  "from models import storage\n"
+                  "from models.engine.file_storage import FileStorage\n"
+                  "from models.user import User\n"
+                  "replace = FileStorage._FileStorage__replace\n"
+                  "def slow_replace(self, text):\n"
+                  "    time.sleep(0.5)\n"
+                  "    replace(self, text)\n"
+                  "FileStorage._FileStorage__replace = slow_replace\n"
+                  "print(User().id)\n"
+                  "storage.save()\n"
+                  "time.sleep(0.15)\n")
+        env = dict(os.environ, HBNB_STORAGE_DELAY="0.1")
+        out = subprocess.run([sys.executable, "-c", script], env=env,
+                             stdout=subprocess.PIPE, timeout=10, check=True)
+        with open("file.json", "r") as f:
+            self.assertIn("User." + out.stdout.decode().strip(), f.read())
+
+    def test_failed_write_keeps_changes(self):
+        FileStorage._FileStorage__delay = 0
+        us = User()
+        with patch("os.replace", side_effect=OSError):
+            with self.assertRaises(OSError):
+                models.storage.save()
+        self.assertIn("User." + us.id, FileStorage._FileStorage__changed)
+
+
+class TestFileStorage_transaction(unittest.TestCase):
+    """Unittests for testing transactions of FileStorage."""
+
+    def setUp(self):
+        backup_files()
+        FileStorage._FileStorage__objects = {}
+        self.st = State()
+        self.st.name = "Nevada"
+        self.cy = City()
+        self.cy.state_id = self.st.id
+        models.storage.save()
+
+    def tearDown(self):
+        FileStorage._FileStorage__journal = False
+        restore_files()
+        FileStorage._FileStorage__objects = {}
+
+    def count_writes(self):
+        replace = FileStorage._FileStorage__replace
+        return patch.object(FileStorage, "_FileStorage__replace",
+                            autospec=True, side_effect=replace)
+
+    def abort(self):
+        raise RuntimeError("bulk load failed")
+
+    def test_writes_once(self):
+        with self.count_writes() as mock_write:
+            with models.storage.transaction():
+                for i in range(10):
+                    Place().save()
+                with open("file.json", "r") as f:
+                    self.assertEqual(2, len(json.load(f)))
+        self.assertEqual(1, mock_write.call_count)
+        with open("file.json", "r") as f:
+            self.assertEqual(12, len(json.load(f)))
+
+    def test_no_write_without_save(self):
+        with self.count_writes() as mock_write:
+            with models.storage.transaction():
+                Place()
+        self.assertEqual(0, mock_write.call_count)
+
+    def test_nested(self):
+        with self.count_writes() as mock_write:
+            with models.storage.transaction():
+                with models.storage.transaction():
+                    Place().save()
+                self.assertEqual(0, mock_write.call_count)
+        self.assertEqual(1, mock_write.call_count)
+
+    def test_rollback(self):
+        with self.assertRaises(RuntimeError):
+            with models.storage.transaction():
+                pl = Place()
+                pl.save()
+                self.st.name = "Utah"
+                models.storage.delete(self.cy)
+                self.abort()
+        self.assertIsNone(models.storage.get(Place, pl.id))
+        self.assertIs(self.st, models.storage.get(State, self.st.id))
+        self.assertEqual("Nevada", self.st.name)
+        self.assertEqual(self.st.id, models.storage.get(City,
+                                                        self.cy.id).state_id)
+        self.assertEqual(set(), FileStorage._FileStorage__changed)
+        with open("file.json", "r") as f:
+            self.assertNotIn("Place." + pl.id, f.read())
+
+    def test_rollback_restores_indexes(self):
+        st = State()
+        with self.assertRaises(RuntimeError):
+            with models.storage.transaction():
+                self.cy.state_id = st.id
+                self.abort()
+        self.assertIn("City." + self.cy.id,
+                      models.storage.lookup(City, "state_id", self.st.id))
+        self.assertEqual({}, models.storage.lookup(City, "state_id", st.id))
+
+    def test_rollback_keeps_changes_made_before(self):
+        self.st.name = "Utah"
+        us = User()
+        with self.assertRaises(RuntimeError):
+            with models.storage.transaction():
+                self.st.name = "Ohio"
+                us.first_name = "Betty"
+                self.abort()
+        self.assertEqual("Utah", self.st.name)
+        self.assertIs(us, models.storage.get(User, us.id))
+        self.assertNotIn("first_name", us.__dict__)
+        self.assertEqual({"State." + self.st.id, "User." + us.id},
+                         FileStorage._FileStorage__changed)
+
+    def test_other_threads(self):
+        us = User()
+        us.first_name = "orig"
+        models.storage.save()
+        opened, saved = threading.Event(), threading.Event()
+
+        def other():
+            opened.wait()
+            us.first_name = "Betty"
+            us.save()
+            saved.set()
+
+        thread = threading.Thread(target=other)
+        thread.start()
+        with self.assertRaises(RuntimeError):
+            with models.storage.transaction():
+                self.st.name = "Utah"
+                opened.set()
+                saved.wait()
+                with open("file.json", "r") as f:
+                    objs = json.load(f)
+                self.assertEqual("Betty", objs["User." + us.id]["first_name"])
+                self.abort()
+        thread.join()
+        self.assertEqual("Betty", us.first_name)
+        self.assertEqual("Nevada", self.st.name)
+        with open("file.json", "r") as f:
+            objs = json.load(f)
+        self.assertEqual("Betty", objs["User." + us.id]["first_name"])
+        self.assertEqual("Nevada", objs["State." + self.st.id]["name"])
+        self.assertEqual(set(), FileStorage._FileStorage__changed)
+
+    def test_other_thread_saves_not_deferred(self):
+        with models.storage.transaction():
+            thread = threading.Thread(target=Place().save)
+            thread.start()
+            thread.join()
+            with open("file.json", "r") as f:
+                self.assertEqual(3, len(json.load(f)))
+
+    def test_rollback_reads_stored_objects(self):
+        FileStorage._FileStorage__journal = True
+        self.st.name = "Utah"
+        models.storage.save()
+        FileStorage._FileStorage__objects = {}
+        FileStorage._FileStorage__cache = {}
+        models.storage.reload()
+        st = models.storage.get(State, self.st.id)
+        with self.assertRaises(RuntimeError):
+            with models.storage.transaction():
+                st.name = "Ohio"
+                self.abort()
+        self.assertEqual("Utah", st.name)
+
+
+class TestFileStorage_binary(unittest.TestCase):
+    """Unittests for testing binary snapshots of FileStorage."""
+
+    def setUp(self):
+        backup_files()
+        FileStorage._FileStorage__objects = {}
+        FileStorage._FileStorage__format = "binary"
+        self.us = User()
+        self.us.first_name = "Betty"
+        self.pl = Place()
+        self.pl.number_rooms = 3
+        self.pl.latitude = 37.77
+        self.pl.amenity_ids = ["a", "b"]
+        models.storage.save()
+
+    def tearDown(self):
+        FileStorage._FileStorage__format = "json"
+        FileStorage._FileStorage__lazy = False
+        FileStorage._FileStorage__schemas = {}
+        FileStorage._FileStorage__packed = {}
+        restore_files()
+        FileStorage._FileStorage__objects = {}
+
+    def test_save_writes_binary(self):
+        with open("file.json", "rb") as f:
+            self.assertEqual(b"\x89HBNB", f.read(5))
+
+    def test_reload(self):
+        FileStorage._FileStorage__objects = {}
+        models.storage.reload()
+        us = models.storage.get(User, self.us.id)
+        pl = models.storage.get(Place, self.pl.id)
+        self.assertEqual("Betty", us.first_name)
+        self.assertEqual(self.us.created_at, us.created_at)
+        self.assertEqual(self.us.updated_at, us.updated_at)
+        self.assertEqual(3, pl.number_rooms)
+        self.assertEqual(37.77, pl.latitude)
+        self.assertEqual(["a", "b"], pl.amenity_ids)
+
+    def test_save_after_change(self):
+        FileStorage._FileStorage__objects = {}
+        models.storage.reload()
+        models.storage.get(User, self.us.id).last_name = "Holberton"
+        models.storage.delete(models.storage.get(Place, self.pl.id))
+        models.storage.save()
+        FileStorage._FileStorage__objects = {}
+        models.storage.reload()
+        self.assertEqual(["User." + self.us.id],
+                         list(models.storage.all().keys()))
+        us = models.storage.get(User, self.us.id)
+        self.assertEqual("Betty", us.first_name)
+        self.assertEqual("Holberton", us.last_name)
+
+    def test_unchanged_records_not_packed_again(self):
+        FileStorage._FileStorage__objects = {}
+        models.storage.reload()
+        with open("file.json", "rb") as f:
+            data = f.read()
+        Amenity()
+        with patch.object(User, "to_dict") as mock_to_dict:
+            models.storage.save()
+        mock_to_dict.assert_not_called()
+        with open("file.json", "rb") as f:
+            self.assertGreater(len(f.read()), len(data))
+
+    def test_json_reads_binary_and_back(self):
+        FileStorage._FileStorage__format = "json"
+        FileStorage._FileStorage__objects = {}
+        models.storage.reload()
+        models.storage.all()["User." + self.us.id].first_name = "Bob"
+        models.storage.save()
+        with open("file.json", "r") as f:
+            self.assertIn("User." + self.us.id, json.load(f))
+        FileStorage._FileStorage__format = "binary"
+        FileStorage._FileStorage__objects = {}
+        models.storage.reload()
+        models.storage.save()
+        FileStorage._FileStorage__objects = {}
+        models.storage.reload()
+        self.assertEqual("Bob",
+                         models.storage.get(User, self.us.id).first_name)
+
+    def test_lazy_falls_back_to_eager(self):
+        FileStorage._FileStorage__objects = {}
+        FileStorage._FileStorage__lazy = True
+        models.storage.reload()
+        self.assertEqual({}, FileStorage._FileStorage__unloaded)
+        self.assertEqual(2, len(FileStorage._FileStorage__objects))
+
+    def test_journal_replayed_over_binary(self):
+        FileStorage._FileStorage__journal = True
+        try:
+            self.us.first_name = "Bob"
+            models.storage.save()
+        finally:
+            FileStorage._FileStorage__journal = False
+        FileStorage._FileStorage__objects = {}
+        models.storage.reload()
+        self.assertEqual("Bob",
+                         models.storage.get(User, self.us.id).first_name)
+
+
+class TestFileStorage_compression(unittest.TestCase):
+    """Unittests for testing compressed snapshots of FileStorage."""
+
+    def setUp(self):
+        backup_files()
+        FileStorage._FileStorage__objects = {}
+        self.us = User()
+        self.us.first_name = "Betty"
+        self.pl = Place()
+
+    def tearDown(self):
+        FileStorage._FileStorage__codec = ""
+        FileStorage._FileStorage__level = None
+        FileStorage._FileStorage__format = "json"
+        FileStorage._FileStorage__lazy = False
+        FileStorage._FileStorage__schemas = {}
+        FileStorage._FileStorage__packed = {}
+        restore_files()
+        FileStorage._FileStorage__objects = {}
+
+    def reload(self):
+        FileStorage._FileStorage__objects = {}
+        models.storage.reload()
+        return models.storage.all()
+
+    def test_codecs(self):
+        for codec, magic in [("zlib", b"\x78"), ("bz2", b"BZh"),
+                             ("lzma", b"\xfd7zXZ")]:
+            FileStorage._FileStorage__codec = codec
+            models.storage.save()
+            with open("file.json", "rb") as f:
+                self.assertEqual(magic, f.read(len(magic)))
+            FileStorage._FileStorage__codec = ""
+            objs = self.reload()
+            self.assertEqual(2, len(objs))
+            self.assertEqual("Betty", objs["User." + self.us.id].first_name)
+
+    def test_level(self):
+        FileStorage._FileStorage__codec = "zlib"
+        FileStorage._FileStorage__level = 0
+        models.storage.save()
+        stored = os.path.getsize("file.json")
+        FileStorage._FileStorage__level = 9
+        models.storage.save()
+        self.assertLess(os.path.getsize("file.json"), stored)
+        self.assertEqual(2, len(self.reload()))
+
+    def test_binary(self):
+        FileStorage._FileStorage__codec = "lzma"
+        FileStorage._FileStorage__format = "binary"
+        models.storage.save()
+        self.assertIn("Place." + self.pl.id, self.reload())
+
+    def test_lazy_falls_back_to_eager(self):
+        FileStorage._FileStorage__codec = "bz2"
+        models.storage.save()
+        FileStorage._FileStorage__lazy = True
+        FileStorage._FileStorage__objects = {}
+        models.storage.reload()
+        self.assertEqual({}, FileStorage._FileStorage__unloaded)
+        self.assertEqual(2, len(FileStorage._FileStorage__objects))
+
+    def test_journal_replayed_over_compressed(self):
+        FileStorage._FileStorage__codec = "zlib"
+        models.storage.save()
+        FileStorage._FileStorage__journal = True
+        try:
+            self.us.first_name = "Bob"
+            models.storage.save()
+        finally:
+            FileStorage._FileStorage__journal = False
+        objs = self.reload()
+        self.assertEqual("Bob", objs["User." + self.us.id].first_name)
+
+    def test_rollback_reads_compressed(self):
+        FileStorage._FileStorage__codec = "zlib"
+        models.storage.save()
+        self.reload()
+        with self.assertRaises(RuntimeError):
+            with models.storage.transaction():
+                models.storage.get(User, self.us.id).first_name = "Bob"
+                raise RuntimeError
+        self.assertEqual("Betty",
+                         models.storage.get(User, self.us.id).first_name)
+
+
+class TestFileStorage_compaction(unittest.TestCase):
+    """Unittests for testing log compaction of FileStorage."""
+
+    def setUp(self):
+        backup_files()
+        FileStorage._FileStorage__objects = {}
+        self.us = User()
+        self.us.first_name = "Betty"
+        self.pl = Place()
+        models.storage.save()
+        FileStorage._FileStorage__journal = True
+
+    def tearDown(self):
+        compactor = FileStorage._FileStorage__compactor
+        if compactor is not None:
+            compactor.join()
+        FileStorage._FileStorage__journal = False
+        FileStorage._FileStorage__compact_size = 1048576
+        FileStorage._FileStorage__compact_ratio = 1.0
+        FileStorage._FileStorage__format = "json"
+        FileStorage._FileStorage__codec = ""
+        FileStorage._FileStorage__schemas = {}
+        FileStorage._FileStorage__packed = {}
+        restore_files()
+        FileStorage._FileStorage__objects = {}
+
+    def change(self):
+        self.us.last_name = "Holberton"
+        models.storage.delete(self.pl)
+        self.am = Amenity()
+        models.storage.save()
+
+    def reload(self):
+        FileStorage._FileStorage__objects = {}
+        models.storage.reload()
+        return models.storage.all()
+
+    def check(self, objs):
+        self.assertEqual({"User." + self.us.id, "Amenity." + self.am.id},
+                         set(objs.keys()))
+        us = objs["User." + self.us.id]
+        if type(us) is dict:
+            us = User(**us)
+        self.assertEqual("Holberton", us.last_name)
+
+    def test_compact(self):
+        self.change()
+        self.assertTrue(models.storage.compact())
+        self.assertFalse(os.path.exists("file.json.log"))
+        self.assertFalse(os.path.exists("file.json.log.1"))
+        with open("file.json", "r") as f:
+            self.check(json.load(f))
+        self.check(self.reload())
+
+    def test_nothing_to_compact(self):
+        self.assertFalse(models.storage.compact())
+
+    def test_saves_during_compaction(self):
+        self.change()
+        iter_stored = FileStorage._FileStorage__iter_stored
+
+        def save_meanwhile(storage):
+            self.us.first_name = "Bob"
+            models.storage.save()
+            return iter_stored(storage)
+        with patch.object(FileStorage, "_FileStorage__iter_stored",
+                          autospec=True, side_effect=save_meanwhile):
+            self.assertTrue(models.storage.compact())
+        self.assertTrue(os.path.exists("file.json.log"))
+        objs = self.reload()
+        self.check(objs)
+        self.assertEqual("Bob", objs["User." + self.us.id].first_name)
+
+    def test_interrupted_compaction(self):
+        self.change()
+        with patch.object(FileStorage, "_FileStorage__replace",
+                          side_effect=OSError):
+            with self.assertRaises(OSError):
+                models.storage.compact()
+        self.assertTrue(os.path.exists("file.json.log.1"))
+        self.check(self.reload())
+        self.assertTrue(models.storage.compact())
+        self.check(self.reload())
+
+    def test_full_save_wins(self):
+        self.change()
+        iter_stored = FileStorage._FileStorage__iter_stored
+
+        def save_meanwhile(storage):
+            FileStorage._FileStorage__journal = False
+            self.us.first_name = "Bob"
+            models.storage.save()
+            return iter_stored(storage)
+        with patch.object(FileStorage, "_FileStorage__iter_stored",
+                          autospec=True, side_effect=save_meanwhile):
+            self.assertFalse(models.storage.compact())
+        self.assertEqual("Bob",
+                         self.reload()["User." + self.us.id].first_name)
+
+    def test_binary_compressed(self):
+        FileStorage._FileStorage__format = "binary"
+        FileStorage._FileStorage__codec = "zlib"
+        self.change()
+        self.assertTrue(models.storage.compact())
+        self.check(self.reload())
+        self.assertFalse(models.storage.compact())
+
+    def test_threshold_starts_compaction(self):
+        FileStorage._FileStorage__compact_size = 0
+        FileStorage._FileStorage__compact_ratio = 1000.0
+        compactor = FileStorage._FileStorage__compactor
+        self.change()
+        self.assertIs(compactor, FileStorage._FileStorage__compactor)
+        FileStorage._FileStorage__compact_ratio = 0.0
+        self.us.save()
+        self.assertIsNot(compactor, FileStorage._FileStorage__compactor)
+        FileStorage._FileStorage__compactor.join()
+        self.assertFalse(os.path.exists("file.json.log"))
+        self.check(self.reload())
+
+    def test_log_stays_bounded(self):
+        FileStorage._FileStorage__compact_size = 4096
+        for i in range(300):
+            self.us.number = i
+            models.storage.save()
+        FileStorage._FileStorage__compactor.join()
+        if os.path.exists("file.json.log"):
+            self.assertLess(os.path.getsize("file.json.log"), 8192)
+        self.assertEqual(299, self.reload()["User." + self.us.id].number)
+
+
+@unittest.skipIf(sys.platform == "win32", "fcntl is not available")
+class TestFileStorage_shared(unittest.TestCase):
+    """Unittests for testing FileStorage shared between processes."""
+
+    def setUp(self):
+        backup_files()
+        FileStorage._FileStorage__objects = {}
+        FileStorage._FileStorage__shared = True
+        self.us = User()
+        self.us.first_name = "Betty"
+        self.pl = Place()
+        models.storage.save()
+
+    def tearDown(self):
+        FileStorage._FileStorage__shared = False
+        FileStorage._FileStorage__journal = False
+        FileStorage._FileStorage__seen = None
+        restore_files()
+        FileStorage._FileStorage__objects = {}
+
+    def other(self, code, wait=True):
+        env = dict(os.environ, HBNB_STORAGE_SHARED="1")
+        if FileStorage._FileStorage__journal:
+            env["HBNB_STORAGE_JOURNAL"] = "1"
+        script = "from models import storage\n" + code
+        proc = subprocess.Popen([sys.executable, "-c", script], env=env)
+        if wait:
+            self.assertEqual(0, proc.wait(10))
+        return proc
+
+    def test_refresh_replays_log_tail(self):
+        FileStorage._FileStorage__journal = True
+        self.other("storage.get('User', '{}').first_name = 'Bob'\n"
+                   "storage.save()".format(self.us.id))
+        with patch.object(FileStorage, "_FileStorage__merge_all") as mock:
+            us = models.storage.get(User, self.us.id)
+        mock.assert_not_called()
+        self.assertIs(self.us, us)
+        self.assertEqual("Bob", us.first_name)
+
+    def test_refresh_after_full_save(self):
+        self.other("from models.state import State\n"
+                   "State().save()\n"
+                   "storage.delete(storage.get('Place', '{}'))\n"
+                   "storage.save()".format(self.pl.id))
+        self.assertEqual(1, models.storage.count(State))
+        self.assertIsNone(models.storage.get(Place, self.pl.id))
+        self.assertIs(self.us, models.storage.get(User, self.us.id))
+
+    def test_no_refresh_when_unchanged(self):
+        with patch.object(FileStorage, "_FileStorage__catch_up") as mock:
+            models.storage.all()
+            models.storage.get(User, self.us.id)
+        mock.assert_not_called()
+
+    def test_unsaved_changes_kept(self):
+        for journal in [False, True]:
+            FileStorage._FileStorage__journal = journal
+            self.us.first_name = "Alice"
+            self.other("storage.get('User', '{}').first_name = 'Bob'\n"
+                       "storage.save()".format(self.us.id))
+            self.assertEqual("Alice",
+                             models.storage.get(User, self.us.id).first_name)
+
+    def test_no_lost_update(self):
+        for journal in [False, True]:
+            FileStorage._FileStorage__journal = journal
+            self.us.last_name = "Holberton"
+            self.other("from models.state import State\n"
+                       "State().save()")
+            models.storage.save()
+            FileStorage._FileStorage__objects = {}
+            models.storage.reload()
+            self.assertEqual("Holberton", models.storage.get(
+                User, self.us.id).last_name)
+            self.assertEqual(1 + journal, models.storage.count(State))
+
+    def test_lock_file_serializes_saves(self):
+        with models.storage._FileStorage__file_lock(True):
+            proc = self.other("from models.state import State\n"
+                              "State().save()", False)
+            sleep(0.5)
+            self.assertIsNone(proc.poll())
+        self.assertEqual(0, proc.wait(10))
+        self.assertEqual(1, models.storage.count(State))
+
+
+class TestFileStorage_threads(unittest.TestCase):
+    """Unittests for testing FileStorage used by concurrent threads."""
+
+    def setUp(self):
+        FileStorage._FileStorage__objects = {}
+        self.st = State()
+        self.errors = []
+
+    def tearDown(self):
+        FileStorage._FileStorage__objects = {}
+
+    def repeat(self, target, times=300):
+        def run():
+            try:
+                for i in range(times):
+                    target()
+            except Exception as e:
+                self.errors.append(e)
+        thread = threading.Thread(target=run)
+        thread.start()
+        return thread
+
+    def test_all_returns_frozen_dict(self):
+        objs = models.storage.all()
+        cy = City()
+        self.assertNotIn("City." + cy.id, objs)
+        self.assertIn("City." + cy.id, models.storage.all())
+        self.assertIsNot(objs, models.storage.all())
+
+    def test_copy_keeps_indexes(self):
+        cy = City()
+        cy.state_id = self.st.id
+        models.storage.count(City)
+        models.storage.all()
+        City()
+        self.assertIs(FileStorage._FileStorage__objects,
+                      FileStorage._FileStorage__indexed)
+        self.assertEqual(["City." + cy.id], list(
+            models.storage.lookup(City, "state_id", self.st.id).keys()))
+
+    def test_concurrent_reads_and_writes(self):
+        def write():
+            cy = City()
+            cy.state_id = self.st.id
+            models.storage.delete(cy)
+            City().state_id = self.st.id
+
+        def scan():
+            for key, obj in models.storage.all().items():
+                obj.to_dict()
+
+        def scan_class():
+            for obj in models.storage.all(City).values():
+                str(obj)
+
+        def lookup():
+            models.storage.lookup(City, "state_id", self.st.id)
+            models.storage.lookup(City, "name", "")
+            models.storage.count(City)
+        threads = [self.repeat(write), self.repeat(write),
+                   self.repeat(scan), self.repeat(scan_class),
+                   self.repeat(lookup)]
+        for thread in threads:
+            thread.join()
+        self.assertEqual([], self.errors)
+        self.assertEqual(600, models.storage.count(City))
+        self.assertEqual(600, len(
+            models.storage.lookup(City, "state_id", self.st.id)))
+
+
+class TestFileStorage_snapshot(unittest.TestCase):
+    """Unittests for testing snapshots of FileStorage."""
+
+    def setUp(self):
+        FileStorage._FileStorage__objects = {}
+        self.us = User()
+        self.us.first_name = "Betty"
+        self.pl = Place()
+        self.keys = {"User." + self.us.id, "Place." + self.pl.id}
+
+    def tearDown(self):
+        FileStorage._FileStorage__objects = {}
+
+    def test_snapshot(self):
+        snap = models.storage.snapshot()
+        self.assertEqual(self.keys, set(snap.keys()))
+        self.assertEqual(2, len(snap))
+        self.assertIs(self.us, snap["User." + self.us.id])
+
+    def test_read_only(self):
+        snap = models.storage.snapshot()
+        with self.assertRaises(TypeError):
+            snap["User.1234"] = self.us
+
+    def test_unchanged_by_writes(self):
+        snap = models.storage.snapshot()
+        am = Amenity()
+        models.storage.delete(self.pl)
+        self.us.first_name = "Bob"
+        self.us.last_name = "Holberton"
+        self.assertEqual(self.keys, set(snap.keys()))
+        self.assertEqual(2, len(snap))
+        self.assertNotIn("Amenity." + am.id, snap)
+        self.assertIs(self.pl, snap["Place." + self.pl.id])
+        us = snap["User." + self.us.id]
+        self.assertIsNot(self.us, us)
+        self.assertEqual("Betty", us.first_name)
+        self.assertNotIn("last_name", us.__dict__)
+        self.assertEqual("Bob", models.storage.get(User, self.us.id)
+                         .first_name)
+
+    def test_copies_only_on_change(self):
+        with patch("copy.copy", side_effect=lambda obj: obj) as mock_copy:
+            snap = models.storage.snapshot()
+            mock_copy.assert_not_called()
+            self.us.first_name = "Bob"
+            self.us.last_name = "Holberton"
+            mock_copy.assert_called_once_with(self.us)
+        self.assertEqual(2, len(snap))
+
+    def test_several_snapshots(self):
+        first = models.storage.snapshot()
+        self.us.first_name = "Bob"
+        second = models.storage.snapshot()
+        self.us.first_name = "Alice"
+        self.assertEqual("Betty", first["User." + self.us.id].first_name)
+        self.assertEqual("Bob", second["User." + self.us.id].first_name)
+
+    def test_dropped_snapshot_costs_nothing(self):
+        snap = models.storage.snapshot()
+        del snap
+        gc.collect()
+        self.assertEqual(0, len(FileStorage._FileStorage__snapshots))
+
+    def test_rollback(self):
+        snap = models.storage.snapshot()
+        with self.assertRaises(RuntimeError):
+            with models.storage.transaction():
+                self.us.first_name = "Bob"
+                raise RuntimeError
+        self.assertEqual("Betty", snap["User." + self.us.id].first_name)
+
+    def test_concurrent_writes(self):
+        for i in range(100):
+            Place().number_rooms = 0
+        snap = models.storage.snapshot()
+        done = threading.Event()
+
+        def write():
+            while not done.is_set():
+                for obj in list(models.storage.all(Place).values()):
+                    obj.number_rooms += 1
+                models.storage.delete(Place())
+        thread = threading.Thread(target=write)
+        thread.start()
+        try:
+            for i in range(20):
+                rooms = [getattr(obj, "number_rooms", 0)
+                         for obj in snap.values()]
+                self.assertEqual(102, len(rooms))
+                self.assertEqual(0, sum(rooms))
+        finally:
+            done.set()
+            thread.join()
+
+
+class TestFileStorage_query(unittest.TestCase):
+    """Unittests for testing queries of FileStorage."""
+
+    def setUp(self):
+        backup_files()
+        FileStorage._FileStorage__objects = {}
+        self.cities = [City(), City()]
+        self.places = []
+        for i in range(12):
+            pl = Place()
+            pl.city_id = self.cities[i % 4 == 0].id
+            pl.price_by_night = 50 + 10 * i
+            pl.max_guest = i % 6
+            self.places.append(pl)
+
+    def tearDown(self):
+        FileStorage._FileStorage__objects = {}
+        restore_files()
+
+    def test_query(self):
+        q = models.storage.query(Place).where(
+            city_id=self.cities[0].id, price_by_night__lt=100, max_guest__ge=3)
+        self.assertEqual([self.places[3]], q.all())
+        self.assertEqual(2, models.storage.query("City").count())
+
+    def test_scan(self):
+        q = models.storage.query(Place).where(name="")
+        self.assertEqual("scan Place (12 objects)", q.explain())
+        self.assertEqual(12, q.count())
+
+    def test_uses_most_selective_index(self):
+        q = models.storage.query(Place).where(city_id=self.cities[1].id)
+        self.assertEqual("index Place.city_id in {!r} (3 objects)".format(
+            [self.cities[1].id]), q.explain())
+        self.assertEqual({self.places[i] for i in [0, 4, 8]}, set(q))
+        q = q.where(user_id="1234")
+        self.assertEqual("index Place.user_id in ['1234'] (0 objects)",
+                         q.explain())
+        self.assertEqual([], q.all())
+
+    def test_membership_uses_index(self):
+        for i in range(4):
+            Place().city_id = "1234"
+        q = models.storage.query(Place).where(
+            city_id__in=[self.cities[1].id, "5678"], max_guest=0)
+        self.assertTrue(q.explain().startswith("index Place.city_id in"))
+        self.assertEqual({self.places[0]}, set(q))
+
+    def test_index_follows_updates(self):
+        self.places[1].city_id = self.cities[1].id
+        models.storage.delete(self.places[0])
+        q = models.storage.query(Place).where(city_id=self.cities[1].id)
+        self.assertEqual({self.places[i] for i in [1, 4, 8]}, set(q))
+
+    def test_order_by_and_limit(self):
+        q = models.storage.query(Place).where(max_guest__ge=4)
+        self.assertEqual([self.places[i] for i in [11, 10, 5]],
+                         q.order_by("-price_by_night").limit(3).all())
+
+    def test_unknown_class(self):
+        self.assertEqual([], models.storage.query("MyModel").all())
+
+    def test_range(self):
+        q = models.storage.query(Place).where(max_guest__ge=4)
+        self.assertEqual("range Place.max_guest [4, inf) (4 objects)",
+                         q.explain())
+        self.assertEqual({self.places[i] for i in [4, 5, 10, 11]}, set(q))
+        q = q.where(max_guest__lt=5, price_by_night__gt=60)
+        self.assertEqual("range Place.max_guest [4, 5) (2 objects)",
+                         q.explain())
+        self.assertEqual({self.places[i] for i in [4, 10]}, set(q))
+
+    def test_range_follows_updates(self):
+        self.places[0].max_guest = 9
+        self.places[4].max_guest = 1.5
+        models.storage.delete(self.places[5])
+        q = models.storage.query(Place).where(max_guest__gt=1, max_guest__le=4)
+        self.assertEqual({self.places[i] for i in [2, 3, 4, 8, 9, 10]},
+                         set(q))
+        self.assertEqual([self.places[0]],
+                         models.storage.query(Place).where(max_guest=9).all())
+
+    def test_range_after_reload(self):
+        models.storage.save()
+        FileStorage._FileStorage__objects = {}
+        models.storage.reload()
+        q = models.storage.query(Place).where(price_by_night__ge=150)
+        self.assertEqual("range Place.price_by_night [150, inf) (2 objects)",
+                         q.explain())
+        self.assertEqual({self.places[10].id, self.places[11].id},
+                         {pl.id for pl in q})
+
+    def test_walk_in_order(self):
+        self.places[3].price_by_night = None
+        q = models.storage.query(Place).where(max_guest__ge=1)
+        q = q.order_by("price_by_night").limit(4)
+        self.assertEqual("walk Place.price_by_night (-inf, inf)", q.explain())
+        self.assertEqual([self.places[i] for i in [1, 2, 4, 5]], q.all())
+        q = models.storage.query(Place).where(max_guest__ge=1)
+        q = q.order_by("-price_by_night").limit(4)
+        self.assertEqual([self.places[i] for i in [11, 10, 9, 8]], q.all())
+
+    def test_no_walk_past_selective_index(self):
+        q = models.storage.query(Place).where(city_id=self.cities[1].id)
+        q = q.order_by("price_by_night").limit(2)
+        self.assertTrue(q.explain().startswith("index Place.city_id"))
+        self.assertEqual([self.places[0], self.places[4]], q.all())
+
+    def test_walk_puts_non_numbers_last(self):
+        for pl in self.places[2:]:
+            pl.price_by_night = "n/a"
+        q = models.storage.query(Place).where(max_guest__ge=1)
+        q = q.order_by("price_by_night").limit(3)
+        self.assertEqual(self.places[1], q.first())
+        self.assertEqual(3, len(q.all()))
+
+
+class TestFileStorage_geo(unittest.TestCase):
+    """Unittests for testing spatial searches of FileStorage."""
+
+    def setUp(self):
+        backup_files()
+        FileStorage._FileStorage__objects = {}
+        self.places = {}
+        for name, lat, lon in [("sf", 37.7749, -122.4194),
+                               ("oakland", 37.8044, -122.2712),
+                               ("la", 34.0522, -118.2437)]:
+            pl = Place()
+            pl.latitude, pl.longitude = lat, lon
+            self.places[name] = pl
+        self.places["nowhere"] = Place()
+        self.places["nowhere"].latitude = None
+
+    def tearDown(self):
+        FileStorage._FileStorage__objects = {}
+        restore_files()
+
+    def names(self, objs):
+        return [name for obj in objs
+                for name, pl in self.places.items() if pl is obj]
+
+    def test_within(self):
+        objs = models.storage.within(Place, 37, -123, 38, -122)
+        self.assertEqual({"sf", "oakland"}, set(self.names(objs.values())))
+        self.assertIn("Place." + self.places["sf"].id, objs)
+
+    def test_near(self):
+        self.assertEqual(["oakland", "sf"], self.names(
+            models.storage.near(Place, 37.81, -122.27, 20)))
+        self.assertEqual([], models.storage.near(Place, 0, 0, 20))
+
+    def test_nearest(self):
+        self.assertEqual(["la"], self.names(
+            models.storage.nearest("Place", 33, -117)))
+        self.assertEqual(["la", "oakland", "sf"], self.names(
+            models.storage.nearest(Place, 33, -117, 5)))
+
+    def test_follows_updates(self):
+        self.places["la"].latitude = 37.78
+        self.places["la"].longitude = -122.41
+        models.storage.delete(self.places["oakland"])
+        self.assertEqual({"sf", "la"}, set(self.names(
+            models.storage.within(Place, 37, -123, 38, -122).values())))
+
+    def test_after_reload(self):
+        models.storage.save()
+        FileStorage._FileStorage__objects = {}
+        models.storage.reload()
+        objs = models.storage.within(Place, 37, -123, 38, -122)
+        self.assertEqual({self.places["sf"].id, self.places["oakland"].id},
+                         {pl.id for pl in objs.values()})
+
+    def test_class_without_index(self):
+        us = User()
+        us.latitude, us.longitude = 37.8, -122.3
+        self.assertEqual([us], models.storage.near(User, 37.8, -122.3, 1))
+        self.assertEqual({}, models.storage.within(City, -90, -180, 90, 180))
+
+
+class TestFileStorage_search(unittest.TestCase):
+    """Unittests for testing full-text searches of FileStorage."""
+
+    def setUp(self):
+        backup_files()
+        FileStorage._FileStorage__objects = {}
+        self.reviews = []
+        for text in ["Quiet garden", "Garden, garden, garden", "Noisy"]:
+            rv = Review()
+            rv.text = text
+            self.reviews.append(rv)
+
+    def tearDown(self):
+        FileStorage._FileStorage__objects = {}
+        restore_files()
+
+    def test_search(self):
+        self.assertEqual([self.reviews[1], self.reviews[0]],
+                         models.storage.search(Review, "garden"))
+        self.assertEqual([self.reviews[1]],
+                         models.storage.search("Review", "garden", 1))
+        self.assertEqual([], models.storage.search(User, "garden"))
+
+    def test_follows_updates(self):
+        pl = Place()
+        pl.name = "Garden loft"
+        self.reviews[2].text = "Noisy garden"
+        models.storage.delete(self.reviews[1])
+        self.assertEqual({self.reviews[0], self.reviews[2]},
+                         set(models.storage.search(Review, "garden")))
+        self.assertEqual([pl], models.storage.search(Place, "loft"))
+
+    def test_saved_with_store(self):
+        models.storage.search(Review, "garden")
+        models.storage.save()
+        self.assertTrue(os.path.isfile("file.json.search"))
+        self.reviews[2].text = "Garden view"
+        with open("file.json", "r") as f:
+            stored = json.load(f)
+        stored["Review." + self.reviews[2].id]["text"] = "Garden view"
+        with open("file.json", "w") as f:
+            json.dump(stored, f)
+        FileStorage._FileStorage__objects = {}
+        models.storage.reload()
+        self.assertEqual(3, len(models.storage.search(Review, "garden")))
+        self.assertEqual([], models.storage.search(Review, "noisy"))
+
+    def test_not_saved_when_empty(self):
+        FileStorage._FileStorage__objects = {}
+        models.storage.search(Review, "garden")
+        models.storage.save()
+        self.assertFalse(os.path.isfile("file.json.search"))
+
+    def test_saved_when_built(self):
+        models.storage.search(Review, "garden")
+        self.assertTrue(os.path.isfile("file.json.search"))
+
+    def test_kept_by_other_saves(self):
+        models.storage.search(Review, "garden")
+        models.storage.save()
+        FileStorage._FileStorage__objects = {}
+        models.storage.reload()
+        models.storage.count(User)
+        models.storage.save()
+        with patch.object(indexes, "tokenize",
+                          wraps=indexes.tokenize) as tokenize:
+            self.assertEqual(2, len(models.storage.search(Review, "garden")))
+        tokenize.assert_called_once_with("garden")
+
+
+class TestFileStorage_page(unittest.TestCase):
+    """Unittests for testing pagination and streaming of FileStorage."""
+
+    def setUp(self):
+        FileStorage._FileStorage__objects = {}
+        self.states = sorted([State() for i in range(5)],
+                             key=lambda st: st.id)
+        self.us = User()
+
+    def tearDown(self):
+        FileStorage._FileStorage__objects = {}
+
+    def test_pages(self):
+        objs, cursor = models.storage.page(State, 2)
+        self.assertEqual(self.states[:2], objs)
+        self.assertEqual("State." + self.states[1].id, cursor)
+        objs, cursor = models.storage.page(State, 2, cursor)
+        self.assertEqual(self.states[2:4], objs)
+        objs, cursor = models.storage.page("State", 2, cursor)
+        self.assertEqual(self.states[4:], objs)
+        self.assertIsNone(cursor)
+
+    def test_exact_last_page(self):
+        objs, cursor = models.storage.page(State, 5)
+        self.assertEqual(self.states, objs)
+        self.assertIsNone(cursor)
+
+    def test_all_classes(self):
+        objs, cursor = models.storage.page(limit=6)
+        self.assertEqual(self.states + [self.us], objs)
+        self.assertIsNone(cursor)
+
+    def test_stable_across_changes(self):
+        objs, cursor = models.storage.page(State, 2)
+        models.storage.delete(self.states[1])
+        models.storage.delete(self.states[2])
+        objs, cursor = models.storage.page(State, 2, cursor)
+        self.assertEqual(self.states[3:5], objs)
+        self.assertIsNone(cursor)
+
+    def test_empty(self):
+        self.assertEqual(([], None), models.storage.page(City))
+        self.assertEqual(([], None), models.storage.page(
+            State, after="State." + self.states[4].id))
+
+    def test_stream(self):
+        stream = models.storage.stream(State, batch=2)
+        self.assertEqual(self.states[0], next(stream))
+        self.assertEqual(self.states[1:], list(stream))
+        self.assertEqual(self.states + [self.us],
+                         list(models.storage.stream(batch=4)))
+
+    def test_stream_sees_later_changes(self):
+        stream = models.storage.stream(State, batch=2)
+        self.assertEqual(self.states[:2], [next(stream), next(stream)])
+        models.storage.delete(self.states[3])
+        st = State()
+        expected = sorted([obj for obj in self.states[2:3] +
+                           self.states[4:] + [st]
+                           if obj.id > self.states[1].id],
+                          key=lambda obj: obj.id)
+        self.assertEqual(expected, list(stream))
+
+    def test_stream_after(self):
+        cursor = "State." + self.states[2].id
+        self.assertEqual(self.states[3:], list(models.storage.stream(
+            State, cursor)))
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            models.storage.page(State, 0)
+        with self.assertRaises(ValueError):
+            models.storage.page(State, "2")
+        with self.assertRaises(ValueError):
+            models.storage.page(State, 2, 12)
+
+
+class TestFileStorage_cache(unittest.TestCase):
+    """Unittests for testing the bounded cache of decoded objects."""
+
+    def setUp(self):
+        backup_files()
+        FileStorage._FileStorage__objects = {}
+        FileStorage._FileStorage__unloaded = {}
+        FileStorage._FileStorage__recent = OrderedDict()
+        FileStorage._FileStorage__capacity = 2
+        self.users = [User() for i in range(5)]
+        for i, us in enumerate(self.users):
+            us.number = i
+        models.storage.save()
+
+    def tearDown(self):
+        FileStorage._FileStorage__capacity = 0
+        FileStorage._FileStorage__objects = {}
+        FileStorage._FileStorage__unloaded = {}
+        restore_files()
+
+    def decoded(self):
+        return FileStorage._FileStorage__objects
+
+    def test_evicts_least_recent(self):
+        self.assertEqual(2, len(self.decoded()))
+        for us in self.users[3:]:
+            self.assertIs(us, self.decoded()["User." + us.id])
+        unloaded = FileStorage._FileStorage__unloaded["User"]
+        for us in self.users[:3]:
+            o = json.loads(unloaded["User." + us.id])
+            self.assertEqual(us.number, o["number"])
+        self.assertEqual(5, models.storage.count(User))
+
+    def test_get_decodes_again(self):
+        key = "User." + self.users[0].id
+        self.users = None
+        gc.collect()
+        us = models.storage.get(User, key.split(".")[1])
+        self.assertEqual(0, us.number)
+        self.assertIs(us, self.decoded()[key])
+        self.assertIs(us, models.storage.get(User, us.id))
+
+    def test_get_keeps_identity(self):
+        us = models.storage.get(User, self.users[0].id)
+        self.assertIs(self.users[0], us)
+
+    def test_get_is_recent(self):
+        models.storage.get(User, self.users[0].id)
+        models.storage.count()
+        self.assertEqual(["User." + self.users[4].id,
+                          "User." + self.users[0].id],
+                         list(self.decoded().keys())[-2:])
+        self.assertEqual(2, len(self.decoded()))
+
+    def test_all(self):
+        objs = models.storage.all(User)
+        self.assertEqual(5, len(objs))
+        for us in self.users:
+            self.assertIs(us, objs["User." + us.id])
+        self.assertEqual(5, len(models.storage.all()))
+        models.storage.count()
+        self.assertEqual(2, len(self.decoded()))
+
+    def test_change_evicted(self):
+        key = "User." + self.users[0].id
+        self.users[0].number = 10
+        self.assertIs(self.users[0], self.decoded()[key])
+        self.assertEqual(3, len(self.decoded()))
+        models.storage.save()
+        self.assertEqual(2, len(self.decoded()))
+        with open("file.json", "r") as f:
+            self.assertEqual(10, json.load(f)[key]["number"])
+        self.assertEqual(10, models.storage.get(User, self.users[0].id).number)
+
+    def test_keeps_unsaved(self):
+        users = [User() for i in range(3)]
+        self.assertEqual(5, models.storage.count(User) - 3)
+        for us in users:
+            self.assertIs(us, self.decoded()["User." + us.id])
+
+    def test_delete_evicted(self):
+        models.storage.delete(self.users[0])
+        self.assertIsNone(models.storage.get(User, self.users[0].id))
+        self.assertEqual(4, models.storage.count(User))
+        models.storage.save()
+        FileStorage._FileStorage__objects = {}
+        FileStorage._FileStorage__unloaded = {}
+        models.storage.reload()
+        self.assertEqual(4, models.storage.count(User))
+
+    def test_save_keeps_evicted(self):
+        self.users[4].number = 40
+        models.storage.save()
+        FileStorage._FileStorage__capacity = 0
+        FileStorage._FileStorage__objects = {}
+        FileStorage._FileStorage__unloaded = {}
+        models.storage.reload()
+        objs = models.storage.all(User)
+        self.assertEqual([0, 1, 2, 3, 40],
+                         sorted(us.number for us in objs.values()))
+
+    def test_delete_evicted_journal(self):
+        FileStorage._FileStorage__journal = True
+        try:
+            models.storage.delete(self.users[0])
+            models.storage.save()
+            with open("file.json.log", "r") as f:
+                records = [json.loads(line) for line in f]
+        finally:
+            FileStorage._FileStorage__journal = False
+            os.remove("file.json.log")
+        self.assertEqual({"User." + self.users[0].id: None}, records[-1])
+
+    def test_delete_evicted_rolled_back(self):
+        with self.assertRaises(KeyError):
+            with models.storage.transaction():
+                models.storage.delete(self.users[0])
+                raise KeyError
+        us = models.storage.get(User, self.users[0].id)
+        self.assertEqual(0, us.number)
+        self.assertEqual(5, models.storage.count(User))
+
+    def test_page(self):
+        objs, cursor = models.storage.page(User, 5)
+        self.assertEqual(sorted(us.id for us in self.users),
+                         [us.id for us in objs])
+
+
+class TestFileStorage_columns(unittest.TestCase):
+    """Unittests for testing aggregates over the columns of FileStorage."""
+
+    def setUp(self):
+        FileStorage._FileStorage__objects = {}
+        self.cities = [City(), City()]
+        self.places = []
+        for i in range(12):
+            pl = Place()
+            pl.city_id = self.cities[i % 4 == 0].id
+            pl.price_by_night = 50 + 10 * i
+            pl.max_guest = i % 6
+            self.places.append(pl)
+
+    def tearDown(self):
+        FileStorage._FileStorage__objects = {}
+
+    def test_aggregate(self):
+        q = models.storage.query(Place)
+        self.assertEqual(12, q.aggregate("count"))
+        self.assertEqual({self.cities[0].id: 110.0, self.cities[1].id: 90.0},
+                         q.aggregate("avg", "price_by_night", by="city_id"))
+        self.assertEqual(1, q.where(city_id=self.cities[1].id,
+                                    max_guest__ge=3).aggregate("count"))
+        self.assertEqual([2, 4, 6], q.histogram("max_guest", [0, 1, 3, 6]))
+
+    def test_in_sync(self):
+        q = models.storage.query(Place)
+        self.places[0].price_by_night = 250
+        models.storage.delete(self.places[1])
+        pl = Place()
+        pl.price_by_night = 10
+        self.assertEqual(12, q.aggregate("count"))
+        self.assertEqual(10.0, q.aggregate("min", "price_by_night"))
+        self.assertEqual(250.0, q.aggregate("max", "price_by_night"))
+        self.assertEqual(1, q.where(city_id="").aggregate("count"))
+
+    def test_same_as_objects(self):
+        self.places[2].price_by_night = "free"
+        self.places[3].city_id = None
+        for q in [models.storage.query(Place),
+                  models.storage.query(Place).where(max_guest__lt=4)]:
+            self.assertEqual(q.limit(99).aggregate("avg", "price_by_night"),
+                             q.aggregate("avg", "price_by_night"))
+            self.assertEqual(
+                q.limit(99).aggregate("sum", "max_guest", by="city_id"),
+                q.aggregate("sum", "max_guest", by="city_id"))
+            self.assertEqual(q.limit(99).histogram("max_guest", [0, 2, 5]),
+                             q.histogram("max_guest", [0, 2, 5]))
+
+    def test_other_class(self):
+        q = models.storage.query(City)
+        self.assertEqual(2, q.aggregate("count"))
+        self.assertEqual({"": 2}, q.aggregate("count", by="state_id"))
+
+
 if __name__ == "__main__":
     unittest.maim()
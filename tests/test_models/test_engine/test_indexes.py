@@ -0,0 +1,516 @@
+#!/usr/bin/python3
+"""Defines unittests for models/engine/indexes.py.
+Unittest classes:
+    TestForeignKeyIndex
+    TestSortedList
+    TestRangeIndex
+    TestGeoIndex
+    TestTextIndex
+    TestColumnStore
+"""
+import marshal
+import random
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+from models.city import City
+from models.engine import indexes
+from models.engine.indexes import ColumnStore, ForeignKeyIndex, GeoIndex
+from models.engine.indexes import RangeIndex
+from models.engine.indexes import SortedList
+from models.engine.indexes import foreign_keys, is_number, range_keys
+from models.engine.indexes import TextIndex, haversine, spatial_keys
+from models.engine.indexes import text_keys, tokenize, histogram
+
+
+class TestForeignKeyIndex(unittest.TestCase):
+    """Unittests for testing the ForeignKeyIndex class."""
+
+    def setUp(self):
+        self.index = ForeignKeyIndex("state_id")
+        self.cy = City()
+        self.cy.state_id = "1234"
+        self.key = "City." + self.cy.id
+
+    def test_foreign_keys(self):
+        self.assertEqual(["state_id"], foreign_keys["City"])
+        self.assertEqual(["city_id", "user_id"], foreign_keys["Place"])
+        self.assertEqual(["place_id", "user_id"], foreign_keys["Review"])
+
+    def test_attr(self):
+        self.assertEqual("state_id", self.index.attr)
+
+    def test_add_and_lookup(self):
+        self.index.add(self.key, self.cy)
+        self.assertEqual({self.key: self.cy}, self.index.lookup("1234"))
+        self.assertEqual({}, self.index.lookup("5678"))
+
+    def test_add_moves_changed_object(self):
+        self.index.add(self.key, self.cy)
+        self.cy.state_id = "5678"
+        self.index.add(self.key, self.cy)
+        self.assertEqual({}, self.index.lookup("1234"))
+        self.assertEqual({self.key: self.cy}, self.index.lookup("5678"))
+
+    def test_remove(self):
+        self.index.add(self.key, self.cy)
+        self.index.remove(self.key)
+        self.index.remove(self.key)
+        self.assertEqual({}, self.index.lookup("1234"))
+
+    def test_clear(self):
+        self.index.add(self.key, self.cy)
+        self.index.clear()
+        self.assertEqual({}, self.index.lookup("1234"))
+
+    def test_lookup_returns_copy(self):
+        self.index.add(self.key, self.cy)
+        self.index.lookup("1234").clear()
+        self.assertEqual({self.key: self.cy}, self.index.lookup("1234"))
+
+    def test_class_default_is_indexed(self):
+        self.index.add("City.1", City())
+        self.assertIn("City.1", self.index.lookup(""))
+
+
+class TestSortedList(unittest.TestCase):
+    """Unittests for testing the SortedList class."""
+
+    def test_sorted(self):
+        rand = random.Random(0)
+        items = rand.sample(range(10000), 3000)
+        sl = SortedList()
+        for item in items:
+            sl.add(item)
+        for item in items[:1000]:
+            sl.remove(item)
+        expected = sorted(items[1000:])
+        self.assertEqual(2000, len(sl))
+        self.assertEqual(expected, sl.slice(0, len(sl)))
+        self.assertEqual(expected[500:510], sl.slice(500, 510))
+        self.assertEqual(sum(1 for i in expected if i < 5000),
+                         sl.position(5000))
+
+    def test_clear(self):
+        sl = SortedList()
+        sl.add("b")
+        sl.add("a")
+        self.assertEqual(["a", "b"], sl.slice(0, 2))
+        sl.clear()
+        self.assertEqual(0, len(sl))
+        self.assertEqual([], sl.slice(0, 2))
+
+
+class TestRangeIndex(unittest.TestCase):
+    """Unittests for testing the RangeIndex class."""
+
+    def setUp(self):
+        self.index = RangeIndex("price")
+        self.objs = {}
+        for i, price in enumerate([30, 10, 20, 10.5, 40]):
+            self.add(str(i), price)
+
+    def add(self, key, price):
+        self.objs[key] = SimpleNamespace(price=price)
+        self.index.add(key, self.objs[key])
+
+    def keys(self, page):
+        return [entry[1] for entry, obj in page]
+
+    def test_range_keys(self):
+        self.assertEqual(["price_by_night", "max_guest", "number_rooms",
+                          "number_bathrooms", "latitude", "longitude"],
+                         range_keys["Place"])
+
+    def test_is_number(self):
+        self.assertTrue(is_number(1))
+        self.assertTrue(is_number(1.5))
+        self.assertFalse(is_number(True))
+        self.assertFalse(is_number("1"))
+        self.assertFalse(is_number(float("nan")))
+
+    def test_page_in_order(self):
+        self.assertEqual(["1", "3", "2", "0", "4"],
+                         self.keys(self.index.page()))
+        self.assertEqual(["4", "0", "2"],
+                         self.keys(self.index.page(reverse=True, n=3)))
+
+    def test_page_bounds(self):
+        self.assertEqual(["3", "2", "0"], self.keys(self.index.page(10, 30,
+                                                                    True)))
+        self.assertEqual(["3", "2"],
+                         self.keys(self.index.page(10.5, 30, hi_open=True)))
+        self.assertEqual(["4"], self.keys(self.index.page(lo=35)))
+
+    def test_page_after(self):
+        first = self.index.page(n=2)
+        self.assertEqual(["2", "0"], self.keys(
+            self.index.page(after=first[-1][0], n=2)))
+        self.index.remove("3")
+        self.assertEqual(["2", "0"], self.keys(
+            self.index.page(after=first[-1][0], n=2)))
+        self.assertEqual(["1"], self.keys(
+            self.index.page(reverse=True, after=(20, "2"))))
+
+    def test_count_range(self):
+        self.assertEqual(5, self.index.count_range())
+        self.assertEqual(3, self.index.count_range(10, 20))
+        self.assertEqual(1, self.index.count_range(10, 20, True, True))
+        self.assertEqual(0, self.index.count_range(50))
+        self.assertEqual(0, self.index.count_range(30, 20))
+
+    def test_add_moves_changed_object(self):
+        self.objs["1"].price = 35
+        self.index.add("1", self.objs["1"])
+        self.assertEqual(["3", "2", "0", "1", "4"],
+                         self.keys(self.index.page()))
+
+    def test_remove(self):
+        self.index.remove("0")
+        self.index.remove("0")
+        self.assertEqual(4, self.index.count_range())
+        self.assertEqual({}, self.index.lookup(30))
+
+    def test_clear(self):
+        self.index.clear()
+        self.assertEqual([], self.index.page())
+
+    def test_non_numbers_kept_apart(self):
+        self.add("5", None)
+        self.add("6", "cheap")
+        self.assertEqual(5, self.index.count_range())
+        self.assertEqual({"5", "6"}, set(self.index.others()))
+        self.assertEqual({"6": self.objs["6"]}, self.index.lookup("cheap"))
+        self.objs["6"].price = 5
+        self.index.add("6", self.objs["6"])
+        self.assertEqual({"5"}, set(self.index.others()))
+        self.assertEqual("6", self.keys(self.index.page())[0])
+
+    def test_lookup(self):
+        self.add("5", 10)
+        self.assertEqual({"1", "5"}, set(self.index.lookup(10)))
+        self.assertEqual(2, self.index.count(10))
+
+    def test_many(self):
+        rand = random.Random(0)
+        values = {}
+        for i in range(5000):
+            key = str(rand.randrange(3000))
+            if rand.random() < 0.2:
+                self.index.remove(key)
+                self.objs.pop(key, None)
+                values.pop(key, None)
+            else:
+                values[key] = rand.randrange(1000)
+                self.add(key, values[key])
+        for key, obj in self.objs.items():
+            values.setdefault(key, obj.price)
+        expected = sorted((v, k) for k, v in values.items()
+                          if 100 <= v < 700)
+        self.assertEqual(expected, [entry for entry, obj in
+                                    self.index.page(100, 700, hi_open=True)])
+        self.assertEqual(len(expected), self.index.count_range(100, 700,
+                                                               hi_open=True))
+
+
+class TestGeoIndex(unittest.TestCase):
+    """Unittests for testing the GeoIndex class."""
+
+    cities = {"sf": (37.7749, -122.4194), "oakland": (37.8044, -122.2712),
+              "la": (34.0522, -118.2437), "suva": (-18.1248, 178.4501),
+              "apia": (-13.8507, -171.7514), "alert": (82.5018, -62.3481)}
+
+    def setUp(self):
+        self.index = GeoIndex("lat", "lon")
+        self.objs = {}
+        for key, (lat, lon) in self.cities.items():
+            self.objs[key] = SimpleNamespace(lat=lat, lon=lon)
+            self.index.add(key, self.objs[key])
+
+    def test_spatial_keys(self):
+        self.assertEqual(("latitude", "longitude"), spatial_keys["Place"])
+
+    def test_haversine(self):
+        self.assertAlmostEqual(559, haversine(*self.cities["sf"],
+                                              *self.cities["la"]), delta=1)
+        self.assertEqual(0, haversine(10, 20, 10, 20))
+
+    def test_within(self):
+        self.assertEqual({"sf", "oakland"},
+                         set(self.index.within(37, -123, 38, -122)))
+        self.assertEqual({}, self.index.within(38, -123, 37, -122))
+
+    def test_within_across_antimeridian(self):
+        self.assertEqual({"suva", "apia"},
+                         set(self.index.within(-20, 170, -10, -170)))
+
+    def test_near(self):
+        found = self.index.near(*self.cities["sf"], 20)
+        self.assertEqual(["sf", "oakland"], [key for d, key, o in found])
+        self.assertEqual(0, found[0][0])
+        self.assertIs(self.objs["oakland"], found[1][2])
+        self.assertEqual(["suva"], [key for d, key, o in
+                                    self.index.near(-18, 179.9, 200)])
+
+    def test_near_pole(self):
+        self.assertEqual(["alert"], [key for d, key, o in
+                                     self.index.near(90, 0, 1000)])
+
+    def test_nearest(self):
+        found = self.index.nearest(34, -118, 2)
+        self.assertEqual(["la", "oakland"], [key for d, key, o in found])
+        self.assertEqual(6, len(self.index.nearest(0, 0, 10)))
+
+    def test_add_moves_changed_object(self):
+        self.objs["la"].lat, self.objs["la"].lon = 37.78, -122.41
+        self.index.add("la", self.objs["la"])
+        self.assertEqual({"sf", "oakland", "la"},
+                         set(self.index.within(37, -123, 38, -122)))
+
+    def test_invalid_positions_not_indexed(self):
+        self.objs["sf"].lat = None
+        self.index.add("sf", self.objs["sf"])
+        self.index.add("x", SimpleNamespace(lat=95.0, lon=0.0))
+        self.index.add("y", SimpleNamespace(lat="1", lon=0.0))
+        self.assertEqual(5, len(self.index))
+
+    def test_remove_and_clear(self):
+        self.index.remove("sf")
+        self.index.remove("sf")
+        self.assertEqual({"oakland"},
+                         set(self.index.within(37, -123, 38, -122)))
+        self.index.clear()
+        self.assertEqual(0, len(self.index))
+
+    def test_many(self):
+        rand = random.Random(0)
+        points = {}
+        for i in range(2000):
+            points[str(i)] = (rand.uniform(-90, 90), rand.uniform(-180, 180))
+            self.index.add(str(i), SimpleNamespace(lat=points[str(i)][0],
+                                                   lon=points[str(i)][1]))
+        expected = sorted((haversine(-45, 100, *p), key)
+                          for key, p in points.items())[:10]
+        self.assertEqual([key for d, key in expected],
+                         [key for d, key, o in
+                          self.index.nearest(-45, 100, 10)])
+
+
+class TestTextIndex(unittest.TestCase):
+    """Unittests for testing the TextIndex class."""
+
+    texts = {"1": ("Loft", "Quiet loft with a garden"),
+             "2": ("Garden house", "A garden, a garden and a garden"),
+             "3": ("Studio", "Noisy studio downtown"),
+             "4": ("Shack", None)}
+
+    def setUp(self):
+        self.index = TextIndex(["name", "description"])
+        self.objs = {}
+        for key, (name, description) in self.texts.items():
+            self.objs[key] = SimpleNamespace(name=name,
+                                             description=description)
+            self.index.add(key, self.objs[key])
+
+    def keys(self, found):
+        return [key for score, key, obj in found]
+
+    def test_text_keys(self):
+        self.assertEqual(["name", "description"], text_keys["Place"])
+        self.assertEqual(["text"], text_keys["Review"])
+
+    def test_tokenize(self):
+        self.assertEqual(["quiet", "loft", "n", "1"],
+                         tokenize("Quiet LOFT, n°1!"))
+
+    def test_search_ranks(self):
+        found = self.index.search("garden")
+        self.assertEqual(["2", "1"], self.keys(found))
+        self.assertGreater(found[0][0], found[1][0])
+        self.assertIs(self.objs["2"], found[0][2])
+
+    def test_search_words(self):
+        self.assertEqual(["1", "2"], self.keys(self.index.search(
+            "quiet garden")))
+        self.assertEqual(["4"], self.keys(self.index.search("SHACK")))
+        self.assertEqual([], self.index.search("castle"))
+        self.assertEqual(["1"], self.keys(self.index.search("quiet garden",
+                                                            1)))
+
+    def test_add_moves_changed_object(self):
+        self.objs["3"].description = "Studio with a garden"
+        self.index.add("3", self.objs["3"])
+        self.assertEqual({"1", "2", "3"},
+                         set(self.keys(self.index.search("garden"))))
+        self.assertEqual([], self.index.search("noisy"))
+
+    def test_remove_and_clear(self):
+        self.index.remove("2")
+        self.index.remove("2")
+        self.assertEqual(["1"], self.keys(self.index.search("garden")))
+        self.assertEqual(3, len(self.index))
+        self.index.clear()
+        self.assertEqual(0, len(self.index))
+
+    def test_no_words_not_indexed(self):
+        self.index.add("5", SimpleNamespace(name="", description=None))
+        self.assertEqual(4, len(self.index))
+
+    def test_version(self):
+        version = self.index.version
+        self.index.add("1", self.objs["1"])
+        self.assertEqual(version, self.index.version)
+        self.index.remove("1")
+        self.assertNotEqual(version, self.index.version)
+
+    def test_reuses_numbers(self):
+        self.index.remove("2")
+        self.index.add("5", SimpleNamespace(name="Garden", description=None))
+        self.assertEqual(["5", "1"], self.keys(self.index.search("garden")))
+        self.assertEqual(4, len(self.index.dump()["keys"]))
+
+    def test_restore(self):
+        state = marshal.loads(marshal.dumps(self.index.dump()))
+        index = TextIndex(["name", "description"])
+        index.restore(state)
+        self.objs["3"].description = "Garden studio"
+        for key in ["1", "2", "3"]:
+            index.add(key, self.objs[key])
+        index.prune()
+        self.assertEqual(3, len(index))
+        self.assertEqual(["2", "3", "1"], self.keys(index.search("garden")))
+        self.assertEqual([], index.search("shack"))
+
+
+class TestColumnStore(unittest.TestCase):
+    """Unittests for testing the ColumnStore class."""
+
+    def setUp(self):
+        self.store = ColumnStore(["price", "guests"], ["city_id"])
+        self.objs = {}
+        for key, city, price, guests in [("1", "a", 120, 4), ("2", "b", 80, 2),
+                                         ("3", "a", 60, 6), ("4", "b", 80, 5),
+                                         ("5", "c", 40, 1)]:
+            self.objs[key] = SimpleNamespace(city_id=city, price=price,
+                                             guests=guests)
+            self.store.add(key, self.objs[key])
+
+    def run_both(self, check):
+        check()
+        with patch.object(indexes, "numpy", None):
+            check()
+
+    def aggregate(self, filters, fn, attr=None, by=None):
+        self.assertTrue(self.store.supports(filters, [attr, by]))
+        return self.store.aggregate(self.store.select(filters), fn, attr, by)
+
+    def test_aggregates(self):
+        def check():
+            self.assertEqual(5, self.aggregate([], "count"))
+            self.assertEqual(380.0, self.aggregate([], "sum", "price"))
+            self.assertEqual(76.0, self.aggregate([], "avg", "price"))
+            self.assertEqual(1.0, self.aggregate([], "min", "guests"))
+            self.assertEqual(6.0, self.aggregate([], "max", "guests"))
+        self.run_both(check)
+
+    def test_filters(self):
+        def check():
+            self.assertEqual(3, self.aggregate([("guests", "ge", 4)],
+                                               "count"))
+            self.assertEqual(160.0, self.aggregate(
+                [("price", "eq", 80)], "sum", "price"))
+            self.assertEqual(2, self.aggregate(
+                [("price", "in", [40, 120]), ("guests", "ne", 3)], "count"))
+            self.assertEqual(2, self.aggregate([("city_id", "eq", "a")],
+                                               "count"))
+            self.assertEqual(3, self.aggregate([("city_id", "ne", "a")],
+                                               "count"))
+            self.assertEqual(4, self.aggregate(
+                [("city_id", "in", ["a", "b", "z"])], "count"))
+            self.assertEqual(0, self.aggregate([("city_id", "eq", "z")],
+                                               "count"))
+            self.assertEqual(0.0, self.aggregate([("price", "gt", 500)],
+                                                 "sum", "price"))
+            self.assertIsNone(self.aggregate([("price", "gt", 500)],
+                                             "avg", "price"))
+        self.run_both(check)
+
+    def test_group_by(self):
+        def check():
+            self.assertEqual({"a": 90.0, "b": 80.0, "c": 40.0},
+                             self.aggregate([], "avg", "price", "city_id"))
+            self.assertEqual({"a": 1, "b": 2}, self.aggregate(
+                [("guests", "ge", 2), ("guests", "lt", 6)], "count", None,
+                "city_id"))
+            self.assertEqual({"a": 6.0, "b": 5.0, "c": 1.0},
+                             self.aggregate([], "max", "guests", "city_id"))
+            self.assertEqual({"a": 60.0, "b": 80.0, "c": 40.0},
+                             self.aggregate([], "min", "price", "city_id"))
+        self.run_both(check)
+
+    def test_histogram(self):
+        def check():
+            rows = self.store.select([])
+            self.assertEqual([1, 1, 1, 2], self.store.histogram(
+                rows, "guests", [1, 2, 4, 5, 6]))
+            self.assertEqual([1, 2], self.store.histogram(
+                rows, "guests", [2, 4, 5]))
+            rows = self.store.select([("city_id", "eq", "b")])
+            self.assertEqual([1, 1], self.store.histogram(
+                rows, "guests", [0, 4, 8]))
+        self.run_both(check)
+
+    def test_histogram_function(self):
+        self.assertEqual([1, 2, 2], histogram([0, 1, 2, 5, 3, 7, 9],
+                                              [1, 2, 5, 7]))
+
+    def test_change_and_remove(self):
+        self.objs["1"].price = 20
+        self.objs["1"].city_id = "c"
+        self.store.add("1", self.objs["1"])
+        self.store.remove("2")
+        self.store.remove("2")
+        self.assertEqual(4, len(self.store))
+        self.store.add("6", SimpleNamespace(city_id="d", price=10, guests=3))
+        self.assertEqual(5, len(self.store))
+
+        def check():
+            self.assertEqual({"a": 60.0, "b": 80.0, "c": 30.0, "d": 10.0},
+                             self.aggregate([], "avg", "price", "city_id"))
+            self.assertEqual(1, self.aggregate([("city_id", "eq", "b")],
+                                               "count"))
+        self.run_both(check)
+        self.store.clear()
+        self.assertEqual(0, len(self.store))
+        self.assertEqual(0, self.aggregate([], "count"))
+
+    def test_supports(self):
+        self.assertTrue(self.store.supports([("price", "lt", 100)],
+                                            ["guests", None]))
+        self.assertFalse(self.store.supports([("price", "lt", "100")], []))
+        self.assertFalse(self.store.supports([("price", "in", "12")], []))
+        self.assertFalse(self.store.supports([("city_id", "lt", "b")], []))
+        self.assertFalse(self.store.supports([("city_id", "in", "ab")], []))
+        self.assertFalse(self.store.supports([("name", "eq", "a")], []))
+        self.assertFalse(self.store.supports([], ["name"]))
+        self.assertFalse(self.store.supports([("price", "eq", True)], []))
+
+    def test_not_numbers(self):
+        self.objs["1"].price = "120"
+        self.store.add("1", self.objs["1"])
+        self.store.add("6", SimpleNamespace(city_id=["a"], price=10,
+                                            guests=3))
+        self.assertFalse(self.store.supports([("price", "lt", 100)], []))
+        self.assertFalse(self.store.supports([], ["price"]))
+        self.assertFalse(self.store.supports([], ["city_id"]))
+        self.assertTrue(self.store.supports([("guests", "gt", 1)],
+                                            ["guests"]))
+        self.store.remove("6")
+        self.objs["1"].price = 120
+        self.store.add("1", self.objs["1"])
+        self.assertTrue(self.store.supports([("city_id", "eq", "a")],
+                                            ["price"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+#!/usr/bin/python3
+"""Defines unittests for models/engine/json_stream.py.
+Unittest classes:
+    TestIterObject
+"""
+import json
+import unittest
+from io import StringIO
+from models.engine.json_stream import iter_object
+
+
+class TestIterObject(unittest.TestCase):
+    """Unittests for testing the iter_object function."""
+
+    objdict = {
+        "User.1": {"id": "1", "first_name": "Betty"},
+        "Place.2": {"id": "2", "name": "{\"Loft\": [1, 2]}, ",
+                    "amenity_ids": ["a", "b"], "latitude": 37.77},
+        "Review.3": None
+    }
+
+    def items(self, text, chunk_size=65536):
+        return list(iter_object(StringIO(text), chunk_size))
+
+    def test_compact(self):
+        text = json.dumps(self.objdict, separators=(",", ":"))
+        self.assertEqual(list(self.objdict.items()), self.items(text))
+
+    def test_indented(self):
+        text = json.dumps(self.objdict, indent=4)
+        self.assertEqual(list(self.objdict.items()), self.items(text))
+
+    def test_small_chunks(self):
+        text = json.dumps(self.objdict)
+        for chunk_size in [1, 2, 7, 16]:
+            self.assertEqual(list(self.objdict.items()),
+                             self.items(text, chunk_size))
+
+    def test_number_split_across_chunks(self):
+        text = '{"a": 12345, "b": 6}'
+        self.assertEqual([("a", 12345), ("b", 6)], self.items(text, 9))
+
+    def test_empty_object(self):
+        self.assertEqual([], self.items(" {\n} "))
+
+    def test_is_lazy(self):
+        it = iter_object(StringIO('{"a": 1, "b": ]'))
+        self.assertEqual(("a", 1), next(it))
+        with self.assertRaises(ValueError):
+            next(it)
+
+    def test_empty_file(self):
+        with self.assertRaises(ValueError):
+            self.items("")
+
+    def test_not_an_object(self):
+        with self.assertRaises(ValueError):
+            self.items("[1, 2]")
+
+    def test_truncated(self):
+        with self.assertRaises(ValueError):
+            self.items('{"a": {"id": "1"}, "b": {"id"')
+
+    def test_non_string_key(self):
+        with self.assertRaises(ValueError):
+            self.items('{1: 2}')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,164 @@
+#!/usr/bin/python3
+"""Defines unittests for models/engine/query.py.
+Unittest classes:
+    TestQuery
+"""
+import unittest
+from models.engine.query import Query
+from models.place import Place
+
+
+class TestQuery(unittest.TestCase):
+    """Unittests for testing the Query class."""
+
+    def setUp(self):
+        self.places = []
+        for price, guests in [(120, 4), (80, 2), (60, 6), (80, 5)]:
+            pl = Place()
+            pl.price_by_night = price
+            pl.max_guest = guests
+            self.places.append(pl)
+        self.places[1].nickname = "Loft"
+        del self.places[2].__dict__["id"]
+        self.plans = []
+
+    def planner(self, cls_name, filters, order, limit):
+        self.plans.append((cls_name, list(filters), list(order)))
+        return "scan", list(self.places), False
+
+    def query(self):
+        return Query("Place", self.planner)
+
+    def test_all(self):
+        self.assertEqual(self.places, self.query().all())
+
+    def test_where_eq(self):
+        self.assertEqual([self.places[1], self.places[3]],
+                         self.query().where(price_by_night=80).all())
+
+    def test_where_operators(self):
+        q = self.query()
+        self.assertEqual([self.places[0], self.places[2], self.places[3]],
+                         q.where(max_guest__ge=4).all())
+        self.assertEqual([self.places[2]], q.where(price_by_night__lt=80,
+                                                   max_guest__gt=4).all())
+        self.assertEqual([self.places[0], self.places[2]],
+                         q.where(price_by_night__ne=80).all())
+        self.assertEqual([self.places[0], self.places[2]],
+                         q.where(price_by_night__in=[60, 120]).all())
+        self.assertEqual([self.places[1]], q.where(nickname__le="M").all())
+
+    def test_where_chained(self):
+        q = self.query().where(max_guest__ge=4).where(price_by_night=80)
+        self.assertEqual([self.places[3]], q.all())
+        self.assertEqual([("Place", [("max_guest", "ge", 4),
+                                     ("price_by_night", "eq", 80)], [])],
+                         self.plans)
+
+    def test_where_incomparable(self):
+        self.assertEqual([], self.query().where(nickname__gt=1).all())
+
+    def test_where_unknown_operator(self):
+        with self.assertRaises(ValueError):
+            self.query().where(max_guest__between=(1, 2))
+
+    def test_builder_is_immutable(self):
+        q = self.query()
+        q.where(max_guest=4)
+        q.order_by("max_guest")
+        q.limit(1)
+        self.assertEqual(self.places, q.all())
+
+    def test_order_by(self):
+        q = self.query().order_by("price_by_night", "-max_guest")
+        self.assertEqual([2, 3, 1, 0], [self.places.index(pl) for pl in q])
+        q = self.query().order_by("-price_by_night", "max_guest")
+        self.assertEqual([0, 1, 3, 2], [self.places.index(pl) for pl in q])
+
+    def test_order_by_missing_last(self):
+        q = self.query()
+        self.assertEqual(self.places[1], q.order_by("nickname").first())
+        self.assertEqual(self.places[2], q.order_by("-id").all()[-1])
+
+    def test_limit(self):
+        q = self.query().order_by("price_by_night")
+        self.assertEqual([self.places[2], self.places[1]], q.limit(2).all())
+        self.assertEqual([], q.limit(0).all())
+        with self.assertRaises(ValueError):
+            q.limit(-1)
+
+    def test_first(self):
+        self.assertEqual(self.places[2],
+                         self.query().order_by("price_by_night").first())
+        self.assertIsNone(self.query().where(max_guest=10).first())
+
+    def test_count(self):
+        self.assertEqual(2, self.query().where(price_by_night=80).count())
+
+    def test_explain(self):
+        self.assertEqual("scan", self.query().explain())
+
+    def test_ordered_candidates_not_sorted_again(self):
+        def planner(cls_name, filters, order, limit):
+            return "ordered", list(reversed(self.places)), True
+        q = Query("Place", planner).order_by("price_by_night")
+        self.assertEqual(list(reversed(self.places)), q.all())
+
+    def test_aggregate(self):
+        q = self.query()
+        self.assertEqual(4, q.aggregate("count"))
+        self.assertEqual(340.0, q.aggregate("sum", "price_by_night"))
+        self.assertEqual(85.0, q.aggregate("avg", "price_by_night"))
+        self.assertEqual(2.0, q.aggregate("min", "max_guest"))
+        self.assertEqual(6.0, q.where(price_by_night=60).aggregate(
+            "max", "max_guest"))
+        self.assertEqual(1, q.aggregate("count", "nickname") + 1)
+        self.assertIsNone(q.where(max_guest__gt=9).aggregate(
+            "avg", "max_guest"))
+        self.assertEqual(0, q.where(max_guest__gt=9).aggregate("count"))
+
+    def test_aggregate_by(self):
+        self.places[1].city_id = "1234"
+        q = self.query()
+        self.assertEqual({"": 86.66666666666667, "1234": 80.0},
+                         q.aggregate("avg", "price_by_night", by="city_id"))
+        self.assertEqual({80: 2, 120: 1, 60: 1},
+                         q.aggregate("count", by="price_by_night"))
+
+    def test_aggregate_invalid(self):
+        with self.assertRaises(ValueError):
+            self.query().aggregate("median", "max_guest")
+        with self.assertRaises(ValueError):
+            self.query().aggregate("sum")
+
+    def test_histogram(self):
+        q = self.query()
+        self.assertEqual([1, 3], q.histogram("max_guest", [2, 4, 6]))
+        self.assertEqual([0, 3], q.histogram("price_by_night", [0, 50, 80]))
+        for edges in [[1], [2, 1], [1, "2"]]:
+            with self.assertRaises(ValueError):
+                q.histogram("max_guest", edges)
+
+    def test_aggregator(self):
+        calls = []
+
+        def aggregator(cls_name, filters, fn, attr, by, edges):
+            calls.append((cls_name, list(filters), fn, attr, by, edges))
+            return NotImplemented if fn == "min" else 42
+
+        q = Query("Place", self.planner, aggregator).where(max_guest=4)
+        self.assertEqual(42, q.aggregate("avg", "price_by_night", "city_id"))
+        self.assertEqual(42, q.histogram("price_by_night", [0, 100]))
+        self.assertEqual(120.0, q.aggregate("min", "price_by_night"))
+        self.assertEqual(1, q.limit(1).aggregate("count"))
+        self.assertEqual([
+            ("Place", [("max_guest", "eq", 4)], "avg", "price_by_night",
+             "city_id", None),
+            ("Place", [("max_guest", "eq", 4)], "histogram",
+             "price_by_night", None, [0, 100]),
+            ("Place", [("max_guest", "eq", 4)], "min", "price_by_night",
+             None, None)], calls)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+#!/usr/bin/python3
+"""Defines unittests for models/engine/rwlock.py.
+Unittest classes:
+    TestRWLock
+"""
+import threading
+import unittest
+from time import sleep
+from models.engine.rwlock import RWLock
+
+
+class TestRWLock(unittest.TestCase):
+    """Unittests for testing the RWLock class."""
+
+    def setUp(self):
+        self.lock = RWLock()
+        self.events = []
+
+    def run_thread(self, target):
+        thread = threading.Thread(target=target)
+        thread.start()
+        return thread
+
+    def test_readers_share(self):
+        inside = threading.Barrier(3, timeout=5)
+
+        def read():
+            with self.lock.read():
+                inside.wait()
+        threads = [self.run_thread(read) for i in range(2)]
+        inside.wait()
+        for thread in threads:
+            thread.join()
+
+    def test_writer_excludes_readers(self):
+        def read():
+            with self.lock.read():
+                self.events.append("read")
+        with self.lock.write():
+            thread = self.run_thread(read)
+            sleep(0.1)
+            self.events.append("write")
+        thread.join()
+        self.assertEqual(["write", "read"], self.events)
+
+    def test_readers_exclude_writer(self):
+        def write():
+            with self.lock.write():
+                self.events.append("write")
+        with self.lock.read():
+            thread = self.run_thread(write)
+            sleep(0.1)
+            self.events.append("read")
+        thread.join()
+        self.assertEqual(["read", "write"], self.events)
+
+    def test_waiting_writer_goes_first(self):
+        def write():
+            with self.lock.write():
+                self.events.append("write")
+
+        def read():
+            with self.lock.read():
+                self.events.append("read")
+        with self.lock.read():
+            writer = self.run_thread(write)
+            sleep(0.1)
+            reader = self.run_thread(read)
+            sleep(0.1)
+            self.assertEqual([], self.events)
+        writer.join()
+        reader.join()
+        self.assertEqual(["write", "read"], self.events)
+
+    def test_reentrant(self):
+        with self.lock.write():
+            with self.lock.write():
+                with self.lock.read():
+                    pass
+        with self.lock.read():
+            with self.lock.read():
+                pass
+        with self.lock.write():
+            pass
+
+    def test_reentrant_read_with_waiting_writer(self):
+        def write():
+            with self.lock.write():
+                self.events.append("write")
+        with self.lock.read():
+            writer = self.run_thread(write)
+            sleep(0.1)
+            with self.lock.read():
+                self.events.append("read")
+        writer.join()
+        self.assertEqual(["read", "write"], self.events)
+
+    def test_no_upgrade(self):
+        with self.lock.read():
+            with self.assertRaises(RuntimeError):
+                with self.lock.write():
+                    pass
+        with self.lock.write():
+            pass
+
+
+if __name__ == "__main__":
+    unittest.main()
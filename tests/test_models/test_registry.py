@@ -0,0 +1,31 @@
+#!/usr/bin/python3
+"""Defines unittests for models/registry.py.
+Unittest classes:
+    TestRegistry
+"""
+import unittest
+from models.registry import classes
+from models.base_model import BaseModel
+from models.user import User
+from models.state import State
+from models.city import City
+from models.place import Place
+from models.amenity import Amenity
+from models.review import Review
+
+
+class TestRegistry(unittest.TestCase):
+    """Unittests for testing the registry of model classes."""
+
+    def test_classes_by_name(self):
+        for cls in [BaseModel, User, State, City, Place, Amenity, Review]:
+            self.assertIs(cls, classes[cls.__name__])
+
+    def test_only_models(self):
+        self.assertEqual(7, len(classes))
+        for cls in classes.values():
+            self.assertTrue(issubclass(cls, BaseModel))
+
+
+if __name__ == "__main__":
+    unittest.main()